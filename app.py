@@ -1,4 +1,5 @@
 import streamlit as st
+from components.telemetry import METRICS_PORT, span, start_metrics_server
 # Remove the direct import of streamlit_oauth as it's now handled in the component
 # import streamlit_oauth
 from components.auth import authenticate_google # Import the new function
@@ -23,73 +24,145 @@ from components.auth import authenticate_google # Import the new function
 # user_info = streamlit_oauth.google_oauth(...)
 # user_info = authenticate_google()
 
+# --- Telemetry ---
+# Serve Prometheus metrics when LEARNIFY_METRICS_PORT is set
+if METRICS_PORT:
+    start_metrics_server(int(METRICS_PORT))
+
 # --- App Logic ---
 st.title("Learnify Your Personal Tutor")
 
 # --- Tabbed Interface ---
 tab1, tab2, tab3 = st.tabs(["📄 Document Uploader", "⚙️ Settings", "📚 Learn"])
 
-with tab1:
+with tab1, span("render.uploader"):
     st.header("Document Uploader")
     st.write("Upload your PDF documents here for analysis.")
     
-    # File uploader
-    uploaded_file = st.file_uploader("Choose a PDF file", type="pdf")
+    # Workspace of the documents uploaded in this session
+    from components.workspace import Workspace
+    if 'workspace' not in st.session_state:
+        st.session_state.workspace = Workspace()
+    workspace = st.session_state.workspace
     
-    # Store uploaded file in session state
-    if uploaded_file is not None:
-        # Read the file content
-        file_content = uploaded_file.read()
-        
-        # Store both the file content and name in session state
-        st.session_state.uploaded_file = {
-            "content": file_content,
-            "name": uploaded_file.name
-        }
-        
-        # Display file info
-        st.success(f"File '{uploaded_file.name}' uploaded successfully!")
-        
-        # Display PDF statistics
-        from components.pdf_stats import display_pdf_statistics
-        try:
-            display_pdf_statistics(file_content)
-        except Exception as e:
-            st.error(f"Error analyzing PDF: {str(e)}")
-        
-        # Reset the file uploader
-        uploaded_file = None
+    # File uploader; its key changes when documents are removed, which empties
+    # it so the removed files are not added again on the next run
+    uploader_round = st.session_state.get("uploader_round", 0)
+    uploaded_files = st.file_uploader(
+        "Choose PDF files", type="pdf", accept_multiple_files=True, key=f"uploader_{uploader_round}"
+    )
+    
+    # Ingest every new file in the background: hashing, statistics and page text
+    for uploaded_file in uploaded_files or []:
+        workspace.add(uploaded_file, uploaded_file.name, uploaded_file.size)
     
-    # Display current file info if exists
-    if 'uploaded_file' in st.session_state:
-        st.info(f"Current file: {st.session_state.uploaded_file['name']}")
+    from components.pdf_stats import display_pdf_statistics
+    
+    @st.fragment(run_every=1)
+    def show_ingestion_progress():
+        pending = workspace.pending
+        if pending:
+            total = len(workspace.documents)
+            st.progress((total - pending) / total, text=f"Processing {pending} of {total} documents...")
+            # Show the statistics of each document as its pages are analyzed
+            for document in list(workspace.documents.values()):
+                if document["status"] == "ingesting":
+                    st.write(f"📄 {document['name']}")
+                    if document["statistics"]:
+                        display_pdf_statistics(document["statistics"])
+        elif st.session_state.get("ingestion_pending"):
+            # Let the other tabs see the newly ingested documents
+            st.session_state.ingestion_pending = False
+            st.rerun()
+        st.session_state.ingestion_pending = bool(pending)
+    
+    show_ingestion_progress()
+    
+    # Display the documents of the workspace and their statistics
+    for document in list(workspace.documents.values()):
+        if document["status"] == "failed":
+            st.error(f"Error processing '{document['name']}': {document['error']}")
+            remove = st.button("Remove", key=f"remove_{document['key']}")
+        elif document["status"] == "ready":
+            with st.expander(f"📄 {document['name']} ({document['pages']} pages)"):
+                # Statistics were computed by the background ingestion
+                display_pdf_statistics(document["statistics"])
+                remove = st.button("Remove", key=f"remove_{document['key']}")
+        else:
+            remove = False
+        if remove:
+            workspace.remove(document["key"])
+            st.session_state.uploader_round = uploader_round + 1
+            st.rerun()
     
     # Add a clear button
-    if st.button("Clear Uploaded File"):
-        if 'uploaded_file' in st.session_state:
-            del st.session_state.uploaded_file
-            st.success("File cleared successfully!")
+    if st.button("Clear All Documents"):
+        workspace.clear()
+        st.session_state.uploader_round = uploader_round + 1
+        st.toast("Documents cleared successfully!")
+        st.rerun()
 
-with tab2:
+with tab2, span("render.settings"):
     st.header("Settings")
     st.subheader("LLM Provider")
-    st.info("Currently using OpenAI GPT-4 Turbo for content generation.")
+    provider_labels = {
+        "auto": "Automatic (route to the fastest healthy provider)",
+        "openai": "OpenAI preferred (fails over to Groq)",
+        "groq": "Groq preferred (fails over to OpenAI)"
+    }
+    st.session_state.llm_provider = st.selectbox(
+        "Provider",
+        list(provider_labels),
+        index=list(provider_labels).index(st.session_state.get("llm_provider", "auto")),
+        format_func=provider_labels.get
+    )
     
-    # Check if a file is uploaded
-    if 'uploaded_file' not in st.session_state:
+    # Check if a document is ready
+    documents = st.session_state.workspace.ready_documents() if 'workspace' in st.session_state else []
+    if not documents:
         st.warning("Please upload a PDF file in the Document Uploader tab first.")
         st.stop()
     
-    # Page numbers of interest
+    # Documents and page numbers of interest
     st.subheader("Pages of Interest")
-    page_numbers = st.text_input(
-        "Enter page numbers (e.g., '1-5' or '1,3,5' or '1-3,5-7')",
-        help="Specify the pages you want to focus on. Use ranges with '-' or individual pages with ','"
-    )
+    from components.pdf_extractor import get_named_ranges, resolve_page_range
+    selected_documents = documents
+    if len(documents) > 1:
+        selected_names = st.multiselect(
+            "Documents to generate from",
+            [document["name"] for document in documents],
+            default=[document["name"] for document in documents[:1]]
+        )
+        selected_documents = [document for document in documents if document["name"] in selected_names]
     
-    # Store page numbers in session state
-    if page_numbers:
-        st.session_state.page_numbers = page_numbers
+    selections = []
+    for document in selected_documents:
+        page_numbers = st.text_input(
+            f"Pages of {document['name']} (e.g., '1-5' or '1,3,5' or '1-3,5-7')",
+            key=f"pages_{document['key']}",
+            help="Specify the pages you want to focus on. Use ranges with '-' or individual pages with ','. "
+                 "'10-' selects page 10 to the end"
+        )
+        
+        # Chapters from the table of contents of the document
+        named_ranges = get_named_ranges(document["hash"])
+        if named_ranges:
+            chapters = st.multiselect(
+                "Or select chapters from the table of contents",
+                list(named_ranges),
+                key=f"chapters_{document['key']}"
+            )
+            chapter_pages = [f"{named_ranges[chapter][0]}-{named_ranges[chapter][1]}" for chapter in chapters]
+            page_numbers = ",".join(part for part in [page_numbers, *chapter_pages] if part)
+        
+        # Check the selection against the document without extracting anything
+        if page_numbers:
+            try:
+                selected_pages = resolve_page_range(document["hash"], page_numbers)
+                st.caption(f"Selected {selected_pages.describe()} ({len(selected_pages)} pages)")
+                selections.append({"hash": document["hash"], "name": document["name"], "pages": page_numbers})
+            except ValueError as e:
+                st.error(str(e))
     
     # Content Generation Options
     st.subheader("Content Generation")
@@ -98,49 +171,134 @@ with tab2:
         ["Generate a quick summary", "Create a quick Quiz", "Create a set of analytics questions"],
         default=["Generate a quick summary"]
     )
+    stream_summary_output = st.checkbox(
+        "Stream the summary in the Learn tab",
+        value=True,
+        help="Show the summary token by token as it is generated instead of waiting for the full response"
+    )
+    st.session_state.use_retrieval = st.checkbox(
+        "Use only the most relevant passages for quizzes and analytics questions",
+        value=st.session_state.get("use_retrieval", False),
+        help="Builds a local search index of the document and sends the top passages instead of every page"
+    )
+    if st.session_state.use_retrieval:
+        st.session_state.retrieval_top_k = st.slider(
+            "Passages per prompt", min_value=2, max_value=30,
+            value=st.session_state.get("retrieval_top_k", 8)
+        )
+    run_in_background = st.checkbox(
+        "Run generation in background workers",
+        value=False,
+        help="Queue the generation as a job so it survives reruns and reloads. Requires workers started with `python -m components.jobs`"
+    )
     
     # Generate Content Button
     if st.button("Generate Content"):
-        if not page_numbers:
+        if not selections:
             st.warning("Please enter page numbers first.")
         elif not options:
             st.warning("Please select at least one content type to generate.")
         else:
             try:
-                # Extract text from PDF
-                from components.pdf_extractor import extract_text_from_pages
-                extracted_text = extract_text_from_pages(
-                    st.session_state.uploaded_file["content"],
-                    st.session_state.page_numbers
-                )
+                # Map the selected options to generator content types
+                option_types = {
+                    "Generate a quick summary": "summary",
+                    "Create a quick Quiz": "quiz",
+                    "Create a set of analytics questions": "analytics"
+                }
+                content_types = [option_types[option] for option in options]
                 
-                # Initialize content dictionary
-                generated_content = {}
+                # Send only the top passages to the quiz and analytics generators
+                retrieval_top_k = st.session_state.retrieval_top_k if st.session_state.use_retrieval else None
                 
-                # Generate content based on selected options
-                if "Generate a quick summary" in options:
-                    from components.summarizer import generate_summary
-                    summary = generate_summary(extracted_text)
-                    generated_content["summary"] = summary
-                
-                if "Create a quick Quiz" in options:
-                    from components.quiz_generator import generate_quiz
-                    quiz = generate_quiz(extracted_text)
-                    generated_content["quiz"] = quiz
-                
-                if "Create a set of analytics questions" in options:
-                    from components.analytics_questions import generate_analytics_questions
-                    analytics = generate_analytics_questions(extracted_text)
-                    generated_content["analytics"] = analytics
-                
-                # Store in session state
-                st.session_state.generated_content = generated_content
-                st.success("Content generated successfully! Check the Learn tab to view the results.")
+                st.session_state.generated_content = {}
+                st.session_state.generation_selections = selections
+                st.session_state.pop("pending_summary_text", None)
+                st.session_state.pop("pending_generation", None)
+                st.session_state.pop("generation_job", None)
                 
+                if run_in_background:
+                    # Queue the job for the worker processes; the Learn tab polls it
+                    from components.jobs import JobQueue
+                    st.session_state.generation_job = JobQueue().submit(
+                        selections[0]["hash"],
+                        selections[0]["pages"],
+                        content_types,
+                        st.session_state.llm_provider,
+                        retrieval_top_k,
+                        selections
+                    )
+                    st.success("Generation queued! Check the Learn tab for progress.")
+                else:
+                    # Extract the text of the selected pages from the stored documents
+                    from components.generation import build_selection_text, text_for
+                    generation_text = build_selection_text(selections, retrieval_top_k)
+                    
+                    if stream_summary_output and "summary" in content_types:
+                        # Start the other generators in the background and let the
+                        # Learn tab stream the summary while they run
+                        from components.generation import submit_generation
+                        content_types.remove("summary")
+                        st.session_state.pending_summary_text = text_for(generation_text, "summary")
+                        st.session_state.pending_generation = submit_generation(
+                            generation_text, content_types, st.session_state.llm_provider
+                        )
+                        st.success("Generation started! The summary is streaming in the Learn tab.")
+                    else:
+                        # Run the generators concurrently, storing each result as it finishes
+                        from components.generation import iter_generated_content
+                        failed = False
+                        with st.spinner("Generating content..."):
+                            for content_type, result, error in iter_generated_content(generation_text, content_types, st.session_state.llm_provider):
+                                if error is not None:
+                                    failed = True
+                                    st.error(f"Error generating {content_type}: {str(error)}")
+                                else:
+                                    st.session_state.generated_content[content_type] = result
+                                    st.write(f"✅ {content_type.capitalize()} ready")
+                        
+                        if not failed:
+                            st.success("Content generated successfully! Check the Learn tab to view the results.")
+                        elif st.session_state.generated_content:
+                            st.warning("Some content could not be generated. Check the Learn tab for the rest.")
+            
             except Exception as e:
                 st.error(f"Error generating content: {str(e)}")
+    
+    # Display generation cache statistics
+    from components.cache import get_cache
+    cache_stats = get_cache().stats()
+    st.caption(
+        f"Generation cache: {cache_stats['entries']} entries, "
+        f"{cache_stats['hits']} hits, {cache_stats['misses']} misses"
+    )
+    
+    # Display LLM scheduler metrics
+    from components.scheduler import get_scheduler
+    scheduler_metrics = get_scheduler().metrics()
+    st.caption(
+        f"LLM queue: {sum(scheduler_metrics['queue_depth'].values())} waiting, "
+        f"{scheduler_metrics['admitted']} admitted, {scheduler_metrics['retries']} retries, "
+        f"p95 wait {scheduler_metrics['wait_p95']:.1f}s"
+    )
+    
+    # Display where the time goes, slowest spans first
+    with st.expander("Performance"):
+        from components.telemetry import get_telemetry
+        from components.text_compaction import compaction_stats
+        compaction = compaction_stats()
+        if compaction["extracted_tokens"]:
+            st.caption(
+                f"Prompt compaction saved {compaction['tokens_saved']:,} of "
+                f"{compaction['extracted_tokens']:,} tokens ({compaction['saved_ratio']:.0%})"
+            )
+        span_summary = get_telemetry().span_summary()
+        if span_summary:
+            st.dataframe(span_summary, hide_index=True)
+        else:
+            st.caption("No timings recorded yet.")
 
-with tab3:
+with tab3, span("render.learn"):
     st.header("Learn")
     st.write("Explore and interact with your learning materials here.")
     
@@ -149,14 +307,60 @@ with tab3:
     
     # Display generated content
     if 'generated_content' in st.session_state:
+        # Stream a pending summary and store the assembled result
+        if "pending_summary_text" in st.session_state:
+            from components.summarizer import stream_summary
+            st.markdown("### Summary")
+            try:
+                summary_content = {}
+                st.write_stream(stream_summary(
+                    st.session_state.pending_summary_text,
+                    st.session_state.get("llm_provider", "auto"),
+                    summary_content
+                ))
+                st.session_state.generated_content["summary"] = summary_content
+                st.info(f"Generated using {summary_content['metadata']['provider'].capitalize()} ({summary_content['metadata']['model']})")
+            except Exception as e:
+                st.error(f"Error generating summary: {str(e)}")
+            del st.session_state.pending_summary_text
+            st.markdown("---")
+        
         # Display summary if available
-        if "summary" in st.session_state.generated_content:
+        elif "summary" in st.session_state.generated_content:
             summary_content = st.session_state.generated_content["summary"]
             st.markdown("### Summary")
             st.write(summary_content["content"])
             st.info(f"Generated using {summary_content['metadata'].get('provider', 'unknown').capitalize()} ({summary_content['metadata'].get('model', 'unknown')})")
             st.markdown("---")
         
+        # Collect generators that ran in the background while the summary streamed
+        if "pending_generation" in st.session_state:
+            from components.generation import iter_completed
+            with st.spinner("Waiting for the remaining content..."):
+                for content_type, result, error in iter_completed(st.session_state.pending_generation):
+                    if error is not None:
+                        st.error(f"Error generating {content_type}: {str(error)}")
+                    else:
+                        st.session_state.generated_content[content_type] = result
+            del st.session_state.pending_generation
+        
+        # Poll a background generation job until the workers finish it
+        if "generation_job" in st.session_state:
+            @st.fragment(run_every=2)
+            def poll_generation_job():
+                from components.jobs import display_job_status
+                job = display_job_status(st.session_state.generation_job)
+                if job is None or job["status"] in ("done", "failed"):
+                    if job is not None:
+                        st.session_state.generated_content.update(job["results"])
+                        st.session_state.generation_errors = job["errors"]
+                    del st.session_state.generation_job
+                    st.rerun()
+            
+            poll_generation_job()
+        for content_type, error in st.session_state.pop("generation_errors", {}).items():
+            st.error(f"Error generating {content_type}: {error}")
+        
         # Display quiz if available
         if "quiz" in st.session_state.generated_content:
             quiz_content = st.session_state.generated_content["quiz"]
@@ -170,12 +374,15 @@ with tab3:
             for i, question in enumerate(quiz_content["content"]["questions"]):
                 st.markdown(f"#### Question {i + 1}")
                 st.write(question["question"])
+                if "difficulty" in question:
+                    page = f"Page {question['page']} · " if question.get("page") else ""
+                    st.caption(f"{page}{question['difficulty'].capitalize()}")
                 
                 # Create radio buttons for options
                 answer = st.radio(
                     "Select your answer:",
                     options=question["options"],
-                    key=f"quiz_question_{i}",
+                    key=f"quiz_question_{st.session_state.get('quiz_round', 0)}_{i}",
                     index=None
                 )
                 
@@ -188,6 +395,18 @@ with tab3:
                 from components.quiz_generator import evaluate_quiz
                 results = evaluate_quiz(quiz_content["content"], st.session_state.quiz_answers)
                 
+                # Keep the submission for the quiz analytics
+                from components.quiz_analytics import get_quiz_result_store, responses_frame
+                from components.scheduler import current_session_id
+                try:
+                    get_quiz_result_store().save(responses_frame(
+                        quiz_content["content"],
+                        [{"user_id": current_session_id(), "answers": st.session_state.quiz_answers}],
+                        quiz_content["metadata"].get("bank_key")
+                    ))
+                except Exception as e:
+                    st.warning(f"Could not save the quiz results: {str(e)}")
+                
                 # Display results
                 st.markdown("### Quiz Results")
                 st.write(f"Total Questions: {results['total_questions']}")
@@ -199,6 +418,48 @@ with tab3:
                 for i, question in enumerate(quiz_content["content"]["questions"]):
                     st.write(f"Question {i + 1}: {question['correct_answer']}")
             
+            # Retake with new questions sampled from the question bank
+            bank_key = quiz_content["metadata"].get("bank_key")
+            if bank_key and st.button("New Quiz"):
+                from components.question_bank import sample_quiz_from_bank
+                try:
+                    with st.spinner("Preparing new questions..."):
+                        st.session_state.generated_content["quiz"] = sample_quiz_from_bank(bank_key)
+                    st.session_state.quiz_answers = {}
+                    st.session_state.quiz_round = st.session_state.get("quiz_round", 0) + 1
+                    st.rerun()
+                except Exception as e:
+                    st.error(str(e))
+            if bank_key:
+                st.caption(
+                    f"Question bank: {quiz_content['metadata']['remaining']} of "
+                    f"{quiz_content['metadata']['bank_size']} questions not seen yet"
+                )
+            
+            # Aggregate results of every submission to this quiz or question bank
+            with st.expander("Quiz Analytics"):
+                from components.quiz_analytics import (
+                    distractor_rates, get_quiz_result_store, grade_responses, make_question_id, make_quiz_id,
+                    question_statistics, score_distribution, score_submissions
+                )
+                responses = get_quiz_result_store().load(bank_key or make_quiz_id(quiz_content["content"]))
+                if responses.empty:
+                    st.caption("No submissions yet.")
+                else:
+                    graded = grade_responses(responses)
+                    distribution = score_distribution(score_submissions(graded))
+                    st.write(
+                        f"{distribution['count']} submissions, mean score {distribution['mean']:.1f}%, "
+                        f"median {distribution['median']:.1f}%"
+                    )
+                    st.bar_chart(distribution["histogram"], x="bin", y="count")
+                    
+                    # Label questions by their text instead of their id
+                    texts = {make_question_id(question): question["question"] for question in quiz_content["content"]["questions"]}
+                    statistics = question_statistics(graded).join(distractor_rates(graded))
+                    statistics.index = [texts.get(question_id, question_id) for question_id in statistics.index]
+                    st.dataframe(statistics)
+            
             st.info(f"Generated using {quiz_content['metadata'].get('provider', 'unknown').capitalize()} ({quiz_content['metadata'].get('model', 'unknown')})")
             st.markdown("---")
         
@@ -235,22 +496,45 @@ with tab3:
             
             # Submit button for analytics questions
             if st.button("Submit Answers"):
-                from components.analytics_questions import evaluate_answer
-                provider = st.session_state.get('llm_provider', 'openai')
+                from components.analytics_questions import evaluate_answers
+                provider = st.session_state.get('llm_provider', 'auto')
                 
-                # Evaluate each answer
-                for i, answer_data in st.session_state.analytics_answers.items():
-                    question = analytics_content["content"]["questions"][int(i)]["question"]
-                    evaluation = evaluate_answer(
-                        question,
-                        answer_data["answer"],
-                        answer_data["criteria"],
-                        provider
-                    )
+                # Evaluate all answers together
+                answers = {
+                    i: {
+                        "question": analytics_content["content"]["questions"][int(i)]["question"],
+                        "answer": answer_data["answer"],
+                        "criteria": answer_data["criteria"]
+                    }
+                    for i, answer_data in st.session_state.analytics_answers.items()
+                }
+                
+                # Add supporting passages from the document to each question
+                if st.session_state.get("use_retrieval") and st.session_state.get("generation_selections"):
+                    from components.generation import build_selection_context
+                    for answer_data in answers.values():
+                        answer_data["context"] = build_selection_context(
+                            st.session_state.generation_selections,
+                            answer_data["question"],
+                            k=3
+                        )
+                with st.spinner("Evaluating answers..."):
+                    evaluations = evaluate_answers(answers, provider)
+                
+                for i in sorted(evaluations, key=int):
+                    evaluation = evaluations[i]
                     
                     # Display evaluation results
                     st.markdown(f"### Evaluation for Question {int(i) + 1}")
+                    if "error" in evaluation:
+                        st.error(evaluation["error"])
+                        st.markdown("---")
+                        continue
                     st.write(f"Score: {evaluation['score']}/100")
+                    if evaluation.get("cached") and evaluation.get("similarity", 1.0) < 1.0:
+                        st.caption(f"Reused the evaluation of a near-identical answer (similarity {evaluation['similarity']:.0%})")
+                    elif evaluation.get("cached"):
+                        st.caption("Reused the evaluation of an identical answer")
                     st.markdown("#### Feedback")
                     st.write(evaluation["feedback"])
                     st.markdown("#### Suggestions for Improvement")
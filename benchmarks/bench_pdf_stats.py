@@ -0,0 +1,90 @@
+"""
+Benchmark get_pdf_statistics against the original span-walking implementation.
+
+Usage:
+    python -m benchmarks.bench_pdf_stats --pages 800 --repeat 3
+"""
+import argparse
+import os
+import time
+from typing import Any, Dict
+
+import fitz  # PyMuPDF
+
+from components.document_store import get_document_store
+from components.pdf_stats import clear_statistics_cache, get_pdf_statistics
+
+
+def make_text_pdf(pages: int) -> bytes:
+    """
+    Create a synthetic text-heavy PDF.
+
+    Args:
+        pages: Number of pages to generate
+
+    Returns:
+        The PDF file content as bytes
+    """
+    doc = fitz.open()
+    line = "Learnify benchmark text with several words per line of the page. "
+    for page_number in range(pages):
+        page = doc.new_page()
+        page.insert_text((40, 40), f"Chapter {page_number // 20 + 1} - Page {page_number + 1}", fontsize=12)
+        page.insert_textbox(fitz.Rect(40, 60, 560, 800), line * 60, fontsize=8)
+    content = doc.tobytes()
+    doc.close()
+    return content
+
+
+def legacy_pdf_statistics(pdf_content: bytes) -> Dict[str, Any]:
+    """The original implementation walking every span of get_text("dict")."""
+    doc = fitz.open(stream=pdf_content, filetype="pdf")
+    stats = {"total_pages": len(doc), "total_images": 0, "total_text_blocks": 0,
+             "total_lines": 0, "total_words": 0, "total_characters": 0}
+    for page in doc:
+        stats["total_images"] += len(page.get_images())
+        blocks = page.get_text("dict")["blocks"]
+        stats["total_text_blocks"] += len(blocks)
+        for block in blocks:
+            if "lines" in block:
+                stats["total_lines"] += len(block["lines"])
+                for line in block["lines"]:
+                    for span in line.get("spans", []):
+                        stats["total_words"] += len(span["text"].split())
+                        stats["total_characters"] += len(span["text"])
+    doc.close()
+    return stats
+
+
+def best_of(repeat: int, func, *args, **kwargs) -> float:
+    """Return the best wall-clock time of several runs in seconds."""
+    timings = []
+    for _ in range(repeat):
+        clear_statistics_cache()
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=800, help="Number of pages in the synthetic PDF")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs per implementation")
+    args = parser.parse_args()
+
+    pdf_content = make_text_pdf(args.pages)
+    doc_hash = get_document_store().put(pdf_content)
+
+    legacy = best_of(args.repeat, legacy_pdf_statistics, pdf_content)
+    serial = best_of(args.repeat, get_pdf_statistics, doc_hash, max_workers=1)
+    parallel = best_of(args.repeat, get_pdf_statistics, doc_hash)
+
+    print(f"{args.pages} pages, best of {args.repeat}, {os.cpu_count()} CPUs")
+    print(f"  legacy (dict spans): {legacy:8.3f}s")
+    print(f"  blocks, 1 process:   {serial:8.3f}s  ({legacy / serial:.1f}x)")
+    print(f"  blocks, process pool:{parallel:8.3f}s  ({legacy / parallel:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
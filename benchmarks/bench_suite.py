@@ -0,0 +1,276 @@
+"""
+Benchmark page parsing and resolution, text extraction, PDF statistics and the generators.
+
+Synthetic text-heavy and image-heavy PDFs are generated locally. The generators
+run against fake chat models with a fixed latency, so only our own overhead and
+concurrency are measured. Every case reports p50/p95 latency, throughput and
+peak Python memory, and can be compared against a saved baseline.
+
+Usage:
+    python -m benchmarks.bench_suite --sizes 10,100,1000 --save-baseline baseline.json
+    python -m benchmarks.bench_suite --baseline baseline.json --fail-on-regression
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+# Keep caches, stores and traces of benchmark runs out of the app's cache
+os.environ.setdefault("LEARNIFY_CACHE_DIR", tempfile.mkdtemp(prefix="learnify-bench-"))
+
+import fitz  # PyMuPDF
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from benchmarks.bench_pdf_stats import make_text_pdf
+from components.analytics_questions import generate_analytics_questions
+from components.document_store import get_document_store
+from components.page_store import clear_page_stores
+from components.pdf_extractor import extract_text_from_pages, parse_page_numbers, resolve_page_range
+from components.pdf_stats import clear_statistics_cache, get_pdf_statistics
+from components.question_bank import BANK_BATCH_SIZE, sample_quiz
+from components.router import ProviderRouter, set_router
+from components.scheduler import LLMScheduler
+from components.summarizer import generate_summary
+
+# Relative p50 slowdown against the baseline reported as a regression
+REGRESSION_THRESHOLD = 0.2
+
+FAKE_RESPONSES = {
+    "summary": "A concise summary of the benchmark text covering its main concepts.",
+    "quiz": json.dumps({"questions": [
+        {
+            "question": f"Benchmark question {i}?",
+            "options": ["A. first", "B. second", "C. third", "D. fourth"],
+            "correct_answer": "A",
+            "difficulty": "medium",
+            "page": 1
+        }
+        for i in range(BANK_BATCH_SIZE)
+    ]}),
+    "analytics": json.dumps({"questions": [
+        {"question": f"Analyze benchmark topic {i}.", "evaluation_criteria": ["depth", "accuracy", "clarity"]}
+        for i in range(3)
+    ]}),
+}
+
+
+def make_image_pdf(pages: int) -> bytes:
+    """
+    Create a synthetic image-heavy PDF with a few images and a caption per page.
+
+    Args:
+        pages: Number of pages to generate
+
+    Returns:
+        The PDF file content as bytes
+    """
+    # Encode a few distinct images once; re-encoding per page dominates otherwise
+    images = []
+    for shade in range(0, 256, 32):
+        pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 256, 256), False)
+        pixmap.set_rect(pixmap.irect, (shade, 128, 255 - shade))
+        images.append(pixmap.tobytes("png"))
+
+    doc = fitz.open()
+    for page_number in range(pages):
+        page = doc.new_page()
+        page.insert_text((40, 40), f"Figure page {page_number + 1}", fontsize=12)
+        for i in range(4):
+            image = images[(page_number + i) % len(images)]
+            page.insert_image(fitz.Rect(40 + 130 * i, 60, 160 + 130 * i, 180), stream=image)
+    content = doc.tobytes()
+    doc.close()
+    return content
+
+
+def measure(func: Callable[[int], Any], repeat: int, setup: Optional[Callable[[], None]] = None) -> Dict[str, float]:
+    """
+    Time repeated runs of a function and track its peak Python memory.
+
+    Peak memory is measured in one extra run, because tracing allocations
+    slows the code down. Memory allocated by MuPDF itself is not seen by
+    tracemalloc.
+
+    Args:
+        func: Function taking the run number
+        repeat: Number of runs
+        setup: Function run before every run, outside the measurement
+
+    Returns:
+        Dictionary with p50, p95, mean and total seconds and peak memory in MiB
+    """
+    timings = []
+    for run in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func(run)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        func(repeat)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "p50": statistics.median(timings),
+        "p95": timings[min(len(timings) - 1, int(0.95 * len(timings)))],
+        "mean": statistics.fmean(timings),
+        "total": sum(timings),
+        "peak_mib": peak / 2 ** 20
+    }
+
+
+def use_fake_model(response: str, latency: float) -> None:
+    """
+    Route every LLM call to a fake chat model answering after ``latency`` seconds.
+
+    Args:
+        response: The text the fake model answers with
+        latency: Seconds every fake call takes
+    """
+    def factory(provider: str, model: Optional[str] = None, **kwargs: Any) -> Any:
+        return FakeListChatModel(responses=[response], sleep=latency)
+
+    set_router(ProviderRouter(
+        providers=["openai"], llm_factory=factory, hedge_delay=None, scheduler=LLMScheduler(limits={})
+    ))
+
+
+def clear_document_caches() -> None:
+    clear_page_stores()
+    clear_statistics_cache()
+
+
+def run_suite(sizes: List[int], kinds: List[str], repeat: int, latency: float) -> Dict[str, Dict[str, Any]]:
+    """
+    Run every benchmark case.
+
+    Args:
+        sizes: Page counts of the synthetic PDFs
+        kinds: "text" and/or "image"
+        repeat: Runs per case
+        latency: Seconds every fake LLM call takes
+
+    Returns:
+        Dictionary mapping case name to its measurements
+    """
+    makers = {"text": make_text_pdf, "image": make_image_pdf}
+    results = {}
+
+    def record(name: str, measurement: Dict[str, float], units: int, unit: str) -> None:
+        measurement["throughput"] = units / measurement["p50"] if measurement["p50"] else 0.0
+        measurement["unit"] = unit
+        results[name] = measurement
+        print(f"{name:<36} p50 {measurement['p50'] * 1000:9.2f}ms  p95 {measurement['p95'] * 1000:9.2f}ms  "
+              f"{measurement['throughput']:12.1f} {unit}/s  peak {measurement['peak_mib']:7.2f}MiB")
+
+    for size in sizes:
+        spec = ",".join(f"{start}-{start + 4}" for start in range(1, size + 1, 10))
+        record(f"parse_page_numbers/{size}",
+               measure(lambda run: parse_page_numbers(f"1-{size},{spec}"), repeat * 20), 1, "calls")
+
+        for kind in kinds:
+            doc_hash = get_document_store().put(makers[kind](size))
+            record(f"resolve_page_range/{kind}/{size}",
+                   measure(lambda run: resolve_page_range(doc_hash, "1-10000000,5-"), repeat * 20), 1, "calls")
+            record(f"extract_text_from_pages/{kind}/{size}",
+                   measure(lambda run: extract_text_from_pages(doc_hash, f"1-{size}"), repeat, clear_document_caches),
+                   size, "pages")
+            record(f"get_pdf_statistics/{kind}/{size}",
+                   measure(lambda run: get_pdf_statistics(doc_hash), repeat, clear_document_caches),
+                   size, "pages")
+
+    # Generators, with unique text per run so the generation cache never hits
+    text = make_benchmark_text()
+    generators = {
+        "summary": generate_summary,
+        "quiz": sample_quiz,
+        "analytics": generate_analytics_questions,
+    }
+    for name, generator in generators.items():
+        use_fake_model(FAKE_RESPONSES[name], latency)
+        record(f"generate/{name}",
+               measure(lambda run: generator(f"{text}\n\nRun {time.time_ns()} {run}", "openai"), repeat),
+               1, "calls")
+    return results
+
+
+def make_benchmark_text(pages: int = 5) -> str:
+    """Extracted-style text of a few synthetic pages."""
+    doc_hash = get_document_store().put(make_text_pdf(pages))
+    return extract_text_from_pages(doc_hash, f"1-{pages}")
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """
+    Compare results with a baseline and print the relative change of every case.
+
+    Args:
+        results: Results from ``run_suite``
+        baseline: Results saved by an earlier run
+        threshold: Relative p50 slowdown counted as a regression
+
+    Returns:
+        Names of the regressed cases
+    """
+    regressions = []
+    print(f"\nCompared with baseline (regression above +{threshold:.0%} p50):")
+    for name, measurement in results.items():
+        if name not in baseline:
+            print(f"  {name:<36} new")
+            continue
+        change = measurement["p50"] / baseline[name]["p50"] - 1 if baseline[name]["p50"] else 0.0
+        memory_change = measurement["peak_mib"] - baseline[name]["peak_mib"]
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"  {name:<36} p50 {change:+7.1%}  peak {memory_change:+8.2f}MiB{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000", help="Comma-separated page counts")
+    parser.add_argument("--kinds", default="text,image", help="Comma-separated PDF kinds: text, image")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds every fake LLM call takes")
+    parser.add_argument("--baseline", help="Baseline JSON file to compare against")
+    parser.add_argument("--save-baseline", help="Write the results to this JSON file")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Relative p50 slowdown reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on a regression")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    kinds = [kind.strip() for kind in args.kinds.split(",")]
+    print(f"Python {platform.python_version()}, PyMuPDF {fitz.VersionBind}, {os.cpu_count()} CPUs, "
+          f"{args.repeat} runs per case\n")
+    results = run_suite(sizes, kinds, args.repeat, args.latency)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,101 +1,189 @@
-from typing import Dict, Any, List
+import time
+from typing import Dict, Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_groq import ChatGroq
-import streamlit as st
-import json
+from components.cache import get_cache, make_cache_key
+from components.llm import resolve_model
+from components.router import cached_as, model_for
+from components.structured_output import invoke_structured
+from components.telemetry import collect_usage, generation_metadata, mark_cached, traced
+from components.text_compaction import fit_to_budget
+from components.evaluation_cache import (
+    SIMILARITY_THRESHOLD, SimilarityIndex, get_evaluation_cache, make_question_key, normalize_answer
+)
+from components.scheduler import bind_session
 
-def get_llm(provider: str = "openai") -> Any:
-    """
-    Get the appropriate LLM based on the provider.
-    
-    Args:
-        provider: Either "openai" or "groq"
-        
-    Returns:
-        The configured LLM instance
-    """
-    try:
-        if provider == "openai":
-            api_key = st.secrets["openai"]["api_key"]
-            return ChatOpenAI(temperature=0, api_key=api_key)
-        elif provider == "groq":
-            api_key = st.secrets["groq"]["api_key"]
-            return ChatGroq(temperature=0, api_key=api_key)
-        else:
-            raise ValueError(f"Unsupported provider: {provider}")
-    except KeyError:
-        raise Exception(f"API key not found in secrets.toml for provider: {provider}")
+ANALYTICS_PROMPT = """You are an expert at creating analytical questions that test deep understanding.
+            Create 3 analytical questions based on the given text. These should be open-ended questions that require
+            critical thinking and analysis. Format the response as a JSON object with the following structure:
+            {
+                "questions": [
+                    {
+                        "question": "question text",
+                        "evaluation_criteria": ["criterion1", "criterion2", "criterion3"]
+                    },
+                    ...
+                ]
+            }"""
+
+BATCH_EVALUATION_PROMPT = """You are an expert at evaluating analytical answers.
+            You will receive several numbered questions, each with its evaluation criteria and a student's answer.
+            Evaluate every answer independently against its own criteria.
+            
+            For each answer provide:
+            1. A score from 0-100
+            2. Specific feedback on how well the answer addresses each criterion
+            3. Suggestions for improvement
+            4. A model answer that demonstrates the best way to address the question
+            
+            Format your response as a JSON object with the following structure:
+            {
+                "evaluations": [
+                    {
+                        "index": "question index exactly as given",
+                        "score": score,
+                        "feedback": "detailed feedback",
+                        "suggestions": ["suggestion1", "suggestion2", "suggestion3"],
+                        "model_answer": "example of a good answer"
+                    },
+                    ...
+                ]
+            }"""
+
+ANALYTICS_SCHEMA = {
+    "type": "object",
+    "required": ["questions"],
+    "properties": {
+        "questions": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["question", "evaluation_criteria"],
+                "properties": {
+                    "question": {"type": "string"},
+                    "evaluation_criteria": {"type": "array", "items": {"type": "string"}}
+                }
+            }
+        }
+    }
+}
+
+EVALUATION_SCHEMA = {
+    "type": "object",
+    "required": ["score", "feedback", "suggestions", "model_answer"],
+    "properties": {
+        "score": {"type": "number", "minimum": 0, "maximum": 100},
+        "feedback": {"type": "string"},
+        "suggestions": {"type": "array", "items": {"type": "string"}},
+        "model_answer": {"type": "string"}
+    }
+}
 
+BATCH_EVALUATION_SCHEMA = {
+    "type": "object",
+    "required": ["evaluations"],
+    "properties": {
+        "evaluations": {
+            "type": "array",
+            "items": {
+                **EVALUATION_SCHEMA,
+                "required": ["index"] + EVALUATION_SCHEMA["required"]
+            }
+        }
+    }
+}
+
+# Maximum number of concurrent evaluation requests
+MAX_EVALUATION_CONCURRENCY = 4
+
+@traced("generate.analytics")
 def generate_analytics_questions(text: str, provider: str = "openai") -> Dict[str, Any]:
     """
     Generate analytical questions from the given text.
     
     Args:
         text: The text to generate questions from
-        provider: The LLM provider to use ("openai" or "groq")
+        provider: The LLM provider to use ("auto", "openai" or "groq")
         
     Returns:
         Dictionary containing the questions and evaluation criteria
     """
     try:
+        # Keep the text within the prompt budget of the model
+        model = model_for(provider)
+        text = fit_to_budget(text, model)
+        
+        # Return cached content for identical text and settings
+        cache = get_cache()
+        cache_key = make_cache_key(text, ANALYTICS_PROMPT, provider, model)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return mark_cached(cached)
+        
         # Create a prompt template for question generation
         prompt = ChatPromptTemplate.from_messages([
-            SystemMessage(content="""You are an expert at creating analytical questions that test deep understanding.
-            Create 3 analytical questions based on the given text. These should be open-ended questions that require
-            critical thinking and analysis. Format the response as a JSON object with the following structure:
-            {
-                "questions": [
-                    {
-                        "question": "question text",
-                        "evaluation_criteria": ["criterion1", "criterion2", "criterion3"]
-                    },
-                    ...
-                ]
-            }"""),
+            SystemMessage(content=ANALYTICS_PROMPT),
             HumanMessage(content=text)
         ])
         
-        # Get the appropriate LLM
-        llm = get_llm(provider)
-        
-        # Create the chain
-        chain = prompt | llm
-        
-        # Generate the questions
-        response = chain.invoke({})
+        # Generate the questions on the best available provider and validate them
+        start = time.perf_counter()
+        with collect_usage() as usage:
+            questions_data, provider_used = invoke_structured(prompt, ANALYTICS_SCHEMA, provider)
         
-        # Parse the JSON response
-        questions_data = json.loads(response.content)
-        
-        return {
+        result = {
             "type": "analytics_questions",
             "content": questions_data,
-            "metadata": {
-                "model": "gpt-4" if provider == "openai" else "mixtral-8x7b-32768",
-                "provider": provider,
-                "timestamp": "current_time"
-            }
+            "metadata": generation_metadata(
+                provider_used, resolve_model(provider_used), usage, time.perf_counter() - start
+            )
         }
+        cache.set(make_cache_key(text, ANALYTICS_PROMPT, *cached_as(provider, provider_used)), result)
+        return result
         
     except Exception as e:
         raise Exception(f"Error generating analytics questions: {str(e)}")
 
-def evaluate_answer(question: str, answer: str, evaluation_criteria: List[str], provider: str = "openai") -> Dict[str, Any]:
+def evaluate_answer(question: str, answer: str, evaluation_criteria: List[str], provider: str = "openai",
+                    context: Optional[str] = None, similarity_threshold: Optional[float] = None,
+                    check_cache: bool = True) -> Dict[str, Any]:
     """
     Evaluate the user's answer to an analytical question.
     
+    The evaluation of an identical or near-identical earlier answer to the
+    same question is reused instead of calling the model.
+    
     Args:
         question: The question text
         answer: The user's answer
         evaluation_criteria: List of criteria to evaluate against
-        provider: The LLM provider to use ("openai" or "groq")
+        provider: The LLM provider to use ("auto", "openai" or "groq")
+        context: Optional supporting passages from the document
+        similarity_threshold: Minimum similarity for reusing an evaluation,
+            or None for SIMILARITY_THRESHOLD
+        check_cache: Look for a reusable evaluation first; False when the
+            caller already looked the answer up
         
     Returns:
-        Dictionary containing evaluation results and suggestions
+        Dictionary containing evaluation results and suggestions, with
+        "cached" set when the evaluation was reused
     """
     try:
+        # Reuse the evaluation of the same or a near-identical answer
+        cache = get_evaluation_cache()
+        question_key = make_question_key(question, evaluation_criteria, context)
+        if check_cache:
+            cached = cache.lookup(question_key, answer, similarity_threshold)
+            if cached is not None:
+                return cached
+        
+        # Include supporting passages from the document when available
+        message = f"Question: {question}\n\nAnswer: {answer}"
+        if context:
+            message = f"Reference material:\n{context}\n\n{message}"
+        
         # Create a prompt template for answer evaluation
         prompt = ChatPromptTemplate.from_messages([
             SystemMessage(content=f"""You are an expert at evaluating analytical answers.
@@ -114,22 +202,186 @@ def evaluate_answer(question: str, answer: str, evaluation_criteria: List[str],
                 "suggestions": ["suggestion1", "suggestion2", "suggestion3"],
                 "model_answer": "example of a good answer"
             }}"""),
-            HumanMessage(content=f"Question: {question}\n\nAnswer: {answer}")
+            HumanMessage(content=message)
         ])
         
-        # Get the appropriate LLM
-        llm = get_llm(provider)
+        # Generate the evaluation on the best available provider and validate it
+        evaluation, _ = invoke_structured(prompt, EVALUATION_SCHEMA, provider)
+        
+        cache.store(question_key, answer, evaluation)
+        return {**evaluation, "cached": False}
+        
+    except Exception as e:
+        raise Exception(f"Error evaluating answer: {str(e)}")
+
+def evaluate_answers_parallel(answers: Dict[str, Dict[str, Any]], provider: str = "openai",
+                              max_concurrency: int = MAX_EVALUATION_CONCURRENCY,
+                              similarity_threshold: Optional[float] = None,
+                              check_cache: bool = True) -> Dict[str, Dict[str, Any]]:
+    """
+    Evaluate several answers with one request per answer, run concurrently.
+    
+    A failed evaluation is returned as {"error": message} without affecting the others.
+    
+    Args:
+        answers: Question index -> {"question", "answer", "criteria"} with an
+            optional "context" of supporting passages
+        provider: The LLM provider to use ("auto", "openai" or "groq")
+        max_concurrency: Maximum number of concurrent requests
+        similarity_threshold: Minimum similarity for reusing an evaluation,
+            or None for SIMILARITY_THRESHOLD
+        check_cache: Look for reusable evaluations first; False when the
+            caller already looked the answers up
+        
+    Returns:
+        Dictionary mapping question index to its evaluation
+    """
+    def evaluate(item):
+        index, answer_data = item
+        try:
+            return index, evaluate_answer(
+                answer_data["question"],
+                answer_data["answer"],
+                answer_data["criteria"],
+                provider,
+                answer_data.get("context"),
+                similarity_threshold,
+                check_cache
+            )
+        except Exception as e:
+            return index, {"error": str(e)}
+    
+    if not answers:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(answers))) as executor:
+        return dict(executor.map(bind_session(evaluate), answers.items()))
+
+def evaluate_answers_batch(answers: Dict[str, Dict[str, Any]], provider: str = "openai",
+                           max_concurrency: int = MAX_EVALUATION_CONCURRENCY) -> Dict[str, Dict[str, Any]]:
+    """
+    Evaluate several answers in a single structured request.
+    
+    Answers missing from the response are then graded in parallel requests.
+    The evaluation cache is not consulted; ``evaluate_answers`` serves cached
+    answers before sending the rest here.
+    
+    Args:
+        answers: Question index -> {"question", "answer", "criteria"} with an
+            optional "context" of supporting passages
+        provider: The LLM provider to use ("auto", "openai" or "groq")
+        max_concurrency: Maximum number of concurrent fallback requests
         
-        # Create the chain
-        chain = prompt | llm
+    Returns:
+        Dictionary mapping question index to its evaluation
+    """
+    evaluations = {}
+    try:
+        # Describe every question, its criteria and the answer in one message
+        sections = []
+        for index, answer_data in answers.items():
+            section = f"### Question index {index}\n"
+            if answer_data.get("context"):
+                section += f"Reference material:\n{answer_data['context']}\n"
+            section += (
+                f"Question: {answer_data['question']}\n"
+                f"Evaluation criteria: {', '.join(answer_data['criteria'])}\n"
+                f"Answer: {answer_data['answer']}"
+            )
+            sections.append(section)
         
-        # Generate the evaluation
-        response = chain.invoke({})
+        prompt = ChatPromptTemplate.from_messages([
+            SystemMessage(content=BATCH_EVALUATION_PROMPT),
+            HumanMessage(content="\n\n".join(sections))
+        ])
         
-        # Parse the JSON response
-        evaluation = json.loads(response.content)
+        # Generate all evaluations in one round trip
+        batch, _ = invoke_structured(prompt, BATCH_EVALUATION_SCHEMA, provider)
         
-        return evaluation
+        # Key the evaluations by question index and cache them
+        cache = get_evaluation_cache()
+        for evaluation in batch["evaluations"]:
+            index = str(evaluation.pop("index"))
+            if index in answers:
+                answer_data = answers[index]
+                cache.store(
+                    make_question_key(answer_data["question"], answer_data["criteria"], answer_data.get("context")),
+                    answer_data["answer"],
+                    evaluation
+                )
+                evaluations[index] = {**evaluation, "cached": False}
+    except Exception:
+        # Fall back to one request per answer below
+        evaluations = {}
+    
+    # Grade answers the batch response did not cover
+    missing = {index: answers[index] for index in answers if index not in evaluations}
+    evaluations.update(evaluate_answers_parallel(missing, provider, max_concurrency, check_cache=False))
+    return evaluations
+
+@traced("evaluate.answers")
+def evaluate_answers(answers: Dict[str, Dict[str, Any]], provider: str = "openai",
+                     mode: str = "batch", max_concurrency: int = MAX_EVALUATION_CONCURRENCY,
+                     similarity_threshold: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Evaluate the user's answers to several analytical questions at once.
+    
+    Answers whose identical or near-identical copy was evaluated before reuse
+    that evaluation, and near-identical answers to the same question within
+    ``answers`` are sent to the model only once, so grading a whole class
+    needs one request per distinct answer at most.
+    
+    In "batch" mode the remaining answers are graded in a single structured
+    request; answers missing from the response are then graded in parallel
+    requests. In "parallel" mode each answer gets its own request, run
+    concurrently.
+    
+    Args:
+        answers: Question index -> {"question", "answer", "criteria"} with an
+            optional "context" of supporting passages
+        provider: The LLM provider to use ("auto", "openai" or "groq")
+        mode: Either "batch" or "parallel"
+        max_concurrency: Maximum number of concurrent requests
+        similarity_threshold: Minimum similarity for reusing an evaluation,
+            or None for SIMILARITY_THRESHOLD
         
-    except Exception as e:
-        raise Exception(f"Error evaluating answer: {str(e)}") 
\ No newline at end of file
+    Returns:
+        Dictionary mapping question index to its evaluation, with "cached"
+        set on reused evaluations
+    """
+    if mode not in ("batch", "parallel"):
+        raise ValueError(f"Unsupported evaluation mode: {mode}")
+    threshold = SIMILARITY_THRESHOLD if similarity_threshold is None else similarity_threshold
+    
+    # Serve cached answers and send only one of each group of near-duplicates
+    cache = get_evaluation_cache()
+    pending_index = SimilarityIndex()
+    evaluations = {}
+    pending = {}
+    duplicates = {}
+    for index, answer_data in answers.items():
+        question_key = make_question_key(answer_data["question"], answer_data["criteria"], answer_data.get("context"))
+        cached = cache.lookup(question_key, answer_data["answer"], threshold)
+        if cached is not None:
+            evaluations[index] = cached
+            continue
+        normalized = normalize_answer(answer_data["answer"])
+        match = pending_index.find(question_key, normalized, threshold)
+        if match is not None:
+            duplicates[index] = match
+            continue
+        pending_index.add(question_key, index, normalized)
+        pending[index] = answer_data
+    
+    if mode == "parallel" or len(pending) <= 1:
+        # The pending answers were looked up above, so misses are counted once
+        evaluations.update(evaluate_answers_parallel(pending, provider, max_concurrency, threshold, check_cache=False))
+    else:
+        evaluations.update(evaluate_answers_batch(pending, provider, max_concurrency))
+    
+    # Near-duplicates share the evaluation of the answer that was sent
+    for index, (sent_index, similarity) in duplicates.items():
+        evaluation = evaluations[sent_index]
+        if "error" not in evaluation:
+            evaluation = {**evaluation, "cached": True, "similarity": round(similarity, 3)}
+        evaluations[index] = evaluation
+    return evaluations
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# Directory used for all local on-disk state (caches, indexes, stores)
+CACHE_DIR = os.environ.get("LEARNIFY_CACHE_DIR", ".learnify_cache")
+
+# Defaults for the generation cache
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60  # 30 days
+
+
+def make_cache_key(text: str, prompt: str, provider: str, model: str) -> str:
+    """
+    Build a content-addressed cache key for a generation request.
+
+    Args:
+        text: The extracted text sent to the model
+        prompt: The system prompt used for the generation
+        provider: The LLM provider ("openai" or "groq")
+        model: The model name
+
+    Returns:
+        Hex SHA-256 digest identifying the request
+    """
+    digest = hashlib.sha256()
+    for part in (provider, model, prompt, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class GenerationCache:
+    """
+    Persistent SQLite cache for generated content.
+
+    Entries expire after ``ttl_seconds`` and the least recently used entries
+    are evicted once the cache holds more than ``max_entries`` rows.
+    """
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS generations (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_generations_accessed ON generations (accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached generation.
+
+        Args:
+            key: Cache key from ``make_cache_key``
+
+        Returns:
+            The cached result, or None on a miss or expired entry
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM generations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            value, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM generations WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE generations SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(value)
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """
+        Store a generation result and evict old entries if needed.
+
+        Args:
+            key: Cache key from ``make_cache_key``
+            value: JSON-serializable result to store
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO generations (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        """Remove expired entries and trim the cache to ``max_entries``."""
+        if self.ttl_seconds is not None:
+            self._conn.execute(
+                "DELETE FROM generations WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+        if self.max_entries is not None:
+            self._conn.execute(
+                """DELETE FROM generations WHERE key IN (
+                    SELECT key FROM generations ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )""",
+                (self.max_entries,)
+            )
+
+    def clear(self) -> None:
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._conn.execute("DELETE FROM generations")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dictionary with entry count, hits, misses and hit rate
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+_cache: Optional[GenerationCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> GenerationCache:
+    """
+    Get the process-wide generation cache, creating it on first use.
+
+    Returns:
+        The shared GenerationCache instance
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = GenerationCache(os.path.join(CACHE_DIR, "generations.sqlite3"))
+        return _cache
@@ -0,0 +1,122 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from typing import BinaryIO, Optional
+
+import fitz  # PyMuPDF
+
+from components.cache import CACHE_DIR
+
+DOCUMENTS_DIR = os.path.join(CACHE_DIR, "documents")
+
+# Size of the blocks read when storing a file object
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+class DocumentStore:
+    """
+    Content-addressed store of uploaded PDF files on local disk.
+
+    Documents are identified by the SHA-256 of their content, so the same file
+    uploaded by many sessions is stored once. Sessions, jobs and workers only
+    pass the hash around and open the file from its path when needed.
+    """
+
+    def __init__(self, root: str = DOCUMENTS_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, doc_hash: str) -> str:
+        """Path of a stored document."""
+        return os.path.join(self.root, doc_hash[:2], f"{doc_hash}.pdf")
+
+    def __contains__(self, doc_hash: str) -> bool:
+        return os.path.exists(self.path(doc_hash))
+
+    def put(self, pdf_content: bytes) -> str:
+        """
+        Store a document if it is not stored yet.
+
+        Args:
+            pdf_content: The PDF file content as bytes
+
+        Returns:
+            The document hash
+        """
+        return self.put_file(io.BytesIO(pdf_content))
+
+    def put_file(self, file: BinaryIO) -> str:
+        """
+        Store a document from a file object without reading it into one buffer.
+
+        Args:
+            file: A binary file object, e.g. a Streamlit UploadedFile
+
+        Returns:
+            The document hash
+        """
+        file.seek(0)
+        digest = hashlib.sha256()
+        os.makedirs(self.root, exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as f:
+                for chunk in iter(lambda: file.read(READ_CHUNK_BYTES), b""):
+                    digest.update(chunk)
+                    f.write(chunk)
+            doc_hash = digest.hexdigest()
+            if doc_hash in self:
+                os.remove(temporary_path)
+            else:
+                os.makedirs(os.path.dirname(self.path(doc_hash)), exist_ok=True)
+                os.replace(temporary_path, self.path(doc_hash))
+        except Exception:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        return doc_hash
+
+    def open(self, doc_hash: str) -> fitz.Document:
+        """
+        Open a stored document with PyMuPDF.
+
+        The file is read from disk by MuPDF on demand instead of from a copy
+        of its bytes in Python memory.
+
+        Args:
+            doc_hash: The document hash
+
+        Returns:
+            The open PyMuPDF document
+
+        Raises:
+            FileNotFoundError: If the document is not in the store
+        """
+        path = self.path(doc_hash)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Document {doc_hash} not found in the document store")
+        return fitz.open(path, filetype="pdf")
+
+    def size(self, doc_hash: str) -> int:
+        """Size of a stored document in bytes."""
+        return os.path.getsize(self.path(doc_hash))
+
+
+_document_store: Optional[DocumentStore] = None
+_document_store_lock = threading.Lock()
+
+
+def get_document_store() -> DocumentStore:
+    """
+    Get the shared document store.
+
+    Returns:
+        The DocumentStore under CACHE_DIR
+    """
+    global _document_store
+    with _document_store_lock:
+        if _document_store is None:
+            _document_store = DocumentStore()
+        return _document_store
@@ -0,0 +1,325 @@
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from components.cache import CACHE_DIR
+from components.telemetry import get_telemetry
+
+EVALUATIONS_DB = os.path.join(CACHE_DIR, "evaluations.sqlite3")
+
+# Cosine similarity above which an answer reuses the evaluation of an earlier
+# one that differs in filler words only; 1.0 reuses identical answers only
+SIMILARITY_THRESHOLD = float(os.environ.get("LEARNIFY_EVALUATION_SIMILARITY", "0.95"))
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Words a near-identical answer may add or leave out. Negations and content
+# words are never among them, so "is not" or "biased" for "unbiased" always
+# needs its own evaluation
+FILLER_WORDS = frozenset({
+    "a", "an", "the", "this", "that", "these", "those", "it", "its", "is", "are", "was", "were", "be",
+    "been", "of", "so", "then", "thus", "therefore", "hence", "also", "just", "basically", "i", "think",
+    "we", "you", "my", "our"
+})
+
+
+def normalize_answer(text: str) -> str:
+    """
+    Normalize an answer so trivially different copies compare equal.
+
+    Args:
+        text: The answer text
+
+    Returns:
+        Lowercase words separated by single spaces, without punctuation
+    """
+    return " ".join(WORD_PATTERN.findall(unicodedata.normalize("NFKC", text).lower()))
+
+
+def make_question_key(question: str, criteria: Iterable[str], context: Optional[str] = None) -> str:
+    """
+    Build the key evaluations of one question are cached under.
+
+    Args:
+        question: The question text
+        criteria: The evaluation criteria
+        context: Supporting passages sent with the question, if any
+
+    Returns:
+        Hex SHA-256 digest identifying the question
+    """
+    digest = hashlib.sha256()
+    for part in (normalize_answer(question), *sorted(normalize_answer(c) for c in criteria), context or ""):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def answer_hash(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def only_filler_differs(normalized: str, other: str) -> bool:
+    """
+    Check that two normalized answers differ in filler words only.
+
+    Args:
+        normalized: An answer after ``normalize_answer``
+        other: Another answer after ``normalize_answer``
+
+    Returns:
+        True if every word one answer has more often than the other is in FILLER_WORDS
+    """
+    words, other_words = Counter(normalized.split()), Counter(other.split())
+    return all(word in FILLER_WORDS for word in (words - other_words) + (other_words - words))
+
+
+def answer_vector(normalized: str) -> Counter:
+    """
+    Term vector of a normalized answer.
+
+    Word pairs are included next to single words, so answers with the same
+    words in a different order or with a negation added stay apart.
+    """
+    words = normalized.split()
+    return Counter(words) + Counter(zip(words, words[1:]))
+
+
+class SimilarityIndex:
+    """
+    In-memory index of near-identical answers, grouped by question key.
+
+    An answer matches an indexed one when their cosine similarity reaches the
+    threshold and they differ in filler words only.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, List[Tuple[Any, str, Counter, float]]] = {}
+
+    def __contains__(self, question_key: str) -> bool:
+        return question_key in self._entries
+
+    def load(self, question_key: str, answers: Iterable[Tuple[Any, str]]) -> None:
+        """
+        Index the answers of a question, marking it as loaded even without answers.
+
+        Args:
+            question_key: Key from ``make_question_key``
+            answers: (item, normalized answer) pairs
+        """
+        self._entries.setdefault(question_key, [])
+        for item, normalized in answers:
+            self.add(question_key, item, normalized)
+
+    def add(self, question_key: str, item: Any, normalized: str) -> None:
+        """
+        Add an answer to the index.
+
+        Args:
+            question_key: Key from ``make_question_key``
+            item: Value returned by ``find`` for this answer
+            normalized: The answer after ``normalize_answer``
+        """
+        vector = answer_vector(normalized)
+        norm = math.sqrt(sum(count * count for count in vector.values()))
+        entries = self._entries.setdefault(question_key, [])
+        if norm:
+            entries.append((item, normalized, vector, norm))
+
+    def find(self, question_key: str, normalized: str, threshold: float) -> Optional[Tuple[Any, float]]:
+        """
+        Find the most similar indexed answer to the same question.
+
+        Args:
+            question_key: Key from ``make_question_key``
+            normalized: The answer after ``normalize_answer``
+            threshold: Minimum cosine similarity
+
+        Returns:
+            (item, similarity) of the best match, or None if no indexed
+            answer is similar enough and differs in filler words only
+        """
+        vector = answer_vector(normalized)
+        norm = math.sqrt(sum(count * count for count in vector.values()))
+        if not norm:
+            return None
+        best = None
+        for item, other_normalized, other, other_norm in self._entries.get(question_key, ()):
+            if other_normalized == normalized:
+                return item, 1.0
+            small, large = (vector, other) if len(vector) <= len(other) else (other, vector)
+            similarity = sum(count * large.get(term, 0) for term, count in small.items()) / (norm * other_norm)
+            if similarity >= threshold and (best is None or similarity > best[1]) \
+                    and only_filler_differs(normalized, other_normalized):
+                best = (item, similarity)
+        return best
+
+
+class EvaluationCache:
+    """
+    Persistent cache of answer evaluations per question.
+
+    Exact duplicates are found by the hash of the normalized answer. With a
+    similarity threshold below 1.0, near duplicates are found by the cosine
+    similarity of their words and word pairs, as long as they differ in
+    filler words only.
+    """
+
+    def __init__(self, path: str = EVALUATIONS_DB):
+        self.path = path
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._index = SimilarityIndex()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS evaluations (
+                question_key TEXT NOT NULL,
+                answer_hash TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                evaluation TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (question_key, answer_hash)
+            )"""
+        )
+        self._conn.commit()
+
+    def _load(self, question_key: str) -> None:
+        """Index the stored answers of a question on first use."""
+        if question_key in self._index:
+            return
+        rows = self._conn.execute(
+            "SELECT answer_hash, answer FROM evaluations WHERE question_key = ?", (question_key,)
+        ).fetchall()
+        self._index.load(question_key, rows)
+
+    def lookup(self, question_key: str, answer: str,
+               threshold: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find a cached evaluation of the same or a near-identical answer.
+
+        Args:
+            question_key: Key from ``make_question_key``
+            answer: The answer text
+            threshold: Minimum similarity of near duplicates, or None for
+                SIMILARITY_THRESHOLD
+
+        Returns:
+            The evaluation with "cached" set and the "similarity" of the
+            matched answer, or None on a miss
+        """
+        threshold = SIMILARITY_THRESHOLD if threshold is None else threshold
+        normalized = normalize_answer(answer)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT evaluation FROM evaluations WHERE question_key = ? AND answer_hash = ?",
+                (question_key, answer_hash(normalized))
+            ).fetchone()
+            similarity = 1.0
+            if row is None and threshold < 1.0:
+                self._load(question_key)
+                match = self._index.find(question_key, normalized, threshold)
+                if match is not None:
+                    matched_hash, similarity = match
+                    row = self._conn.execute(
+                        "SELECT evaluation FROM evaluations WHERE question_key = ? AND answer_hash = ?",
+                        (question_key, matched_hash)
+                    ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                result = "miss"
+            elif similarity < 1.0:
+                self.similar_hits += 1
+                result = "similar"
+            else:
+                self.hits += 1
+                result = "exact"
+        get_telemetry().increment("learnify_evaluation_cache_lookups_total", result=result)
+        if row is None:
+            return None
+        return {**json.loads(row[0]), "cached": True, "similarity": round(similarity, 3)}
+
+    def store(self, question_key: str, answer: str, evaluation: Dict[str, Any]) -> None:
+        """
+        Cache the evaluation of an answer.
+
+        Args:
+            question_key: Key from ``make_question_key``
+            answer: The answer text
+            evaluation: The evaluation returned by the model
+        """
+        normalized = normalize_answer(answer)
+        stored_hash = answer_hash(normalized)
+        evaluation = {key: value for key, value in evaluation.items() if key not in ("cached", "similarity")}
+        with self._lock:
+            existing = self._conn.execute(
+                "SELECT 1 FROM evaluations WHERE question_key = ? AND answer_hash = ?", (question_key, stored_hash)
+            ).fetchone()
+            self._conn.execute(
+                """INSERT OR REPLACE INTO evaluations (question_key, answer_hash, answer, evaluation, created_at)
+                VALUES (?, ?, ?, ?, ?)""",
+                (question_key, stored_hash, normalized, json.dumps(evaluation), time.time())
+            )
+            self._conn.commit()
+            if existing is None and question_key in self._index:
+                self._index.add(question_key, stored_hash, normalized)
+
+    def clear(self) -> None:
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._conn.execute("DELETE FROM evaluations")
+            self._conn.commit()
+            self._index = SimilarityIndex()
+            self.hits = self.similar_hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dictionary with entry count, exact and similar hits, misses and hit rate
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM evaluations").fetchone()[0]
+        lookups = self.hits + self.similar_hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.similar_hits) / lookups if lookups else 0.0
+        }
+
+
+_cache: Optional[EvaluationCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_evaluation_cache() -> EvaluationCache:
+    """
+    Get the process-wide evaluation cache, creating it on first use.
+
+    Returns:
+        The shared EvaluationCache instance
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EvaluationCache()
+        return _cache
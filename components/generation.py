@@ -0,0 +1,221 @@
+import math
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from components.analytics_questions import generate_analytics_questions
+from components.pdf_extractor import iter_page_texts, resolve_page_range
+from components.scheduler import bind_session
+from components.telemetry import traced
+from components.text_compaction import compact_text
+from components.question_bank import sample_quiz
+from components.retrieval import build_context
+from components.summarizer import generate_summary
+
+# Content types that can be generated, keyed by the name used in generated_content
+GENERATORS: Dict[str, Callable[[str, str], Dict[str, Any]]] = {
+    "summary": generate_summary,
+    "quiz": sample_quiz,
+    "analytics": generate_analytics_questions,
+}
+
+# Text for all content types, or a dictionary of text per content type
+GenerationText = Union[str, Dict[str, str]]
+
+# Shared pool for generations that outlive a single call
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="generation")
+
+
+def text_for(text: GenerationText, content_type: str) -> str:
+    """
+    Get the text a content type is generated from.
+
+    Args:
+        text: The text for all content types, or a dictionary keyed by content
+            type with an optional "default" entry
+        content_type: Key of GENERATORS
+
+    Returns:
+        The text to pass to the generator
+    """
+    if isinstance(text, str):
+        return text
+    return text.get(content_type, text.get("default", ""))
+
+
+@traced("prompt.build_text")
+def build_generation_text(doc_hash: str, page_numbers: str, retrieval_top_k: Optional[int] = None) -> GenerationText:
+    """
+    Extract and compact the text of the selected pages of a stored document.
+
+    Args:
+        doc_hash: Hash of the document in the document store
+        page_numbers: String containing page numbers (e.g., '1-5' or '1,3,5')
+        retrieval_top_k: If set, quizzes and analytics questions get only this
+            many of the most relevant passages instead of every page
+
+    Returns:
+        The text for all content types, or a dictionary of text per content type
+    """
+    # Pages are compacted as they are streamed, keeping the extracted pages for later generations
+    pages = resolve_page_range(doc_hash, page_numbers)
+    extracted_text = compact_text(iter_page_texts(doc_hash, pages, cache=True))["text"]
+    if retrieval_top_k is None:
+        return extracted_text
+
+    context = build_context(doc_hash, pages, k=retrieval_top_k)
+    context = compact_text(context)["text"]
+    return {"default": extracted_text, "quiz": context, "analytics": context}
+
+
+@traced("prompt.build_selection_text")
+def build_selection_text(selections: List[Dict[str, str]], retrieval_top_k: Optional[int] = None) -> GenerationText:
+    """
+    Build the generation text for page ranges of one or more documents.
+
+    A single selection gives exactly the text of ``build_generation_text``.
+    With several documents, the text of each is headed by its name, and the
+    retrieved passages are shared out between the documents.
+
+    Args:
+        selections: List of {"hash", "name", "pages"} dictionaries, where
+            "pages" is a page selection string of that document
+        retrieval_top_k: If set, quizzes and analytics questions get only this
+            many of the most relevant passages instead of every page
+
+    Returns:
+        The text for all content types, or a dictionary of text per content type
+    """
+    if not selections:
+        raise ValueError("No documents selected")
+    if len(selections) == 1:
+        return build_generation_text(selections[0]["hash"], selections[0]["pages"], retrieval_top_k)
+
+    per_document_k = None if retrieval_top_k is None else max(1, math.ceil(retrieval_top_k / len(selections)))
+    texts = [
+        (selection["name"], build_generation_text(selection["hash"], selection["pages"], per_document_k))
+        for selection in selections
+    ]
+
+    def combine(content_type: str) -> str:
+        return "\n\n".join(f"=== Document: {name} ===\n{text_for(text, content_type)}" for name, text in texts)
+
+    if retrieval_top_k is None:
+        return combine("default")
+    return {"default": combine("default"), "quiz": combine("quiz"), "analytics": combine("analytics")}
+
+
+def build_selection_context(selections: List[Dict[str, str]], query: str, k: int) -> str:
+    """
+    Find the passages most relevant to a query in the selected pages of several documents.
+
+    Args:
+        selections: List of {"hash", "name", "pages"} dictionaries
+        query: Free-text query, such as an analytics question
+        k: Number of passages in total, shared out between the documents
+
+    Returns:
+        The passages of every document, headed by the document name when
+        there are several
+    """
+    per_document_k = max(1, math.ceil(k / max(len(selections), 1)))
+    contexts = [
+        (selection["name"], build_context(
+            selection["hash"], resolve_page_range(selection["hash"], selection["pages"]), query, per_document_k
+        ))
+        for selection in selections
+    ]
+    if len(contexts) == 1:
+        return contexts[0][1]
+    return "\n\n".join(f"=== Document: {name} ===\n{context}" for name, context in contexts if context)
+
+
+def submit_generation(text: GenerationText, content_types: Iterable[str], provider: str = "openai") -> Dict[str, Future]:
+    """
+    Start the selected generators in the background without waiting for them.
+
+    Args:
+        text: The extracted text to generate content from, or a dictionary
+            of text per content type (see ``text_for``)
+        content_types: Keys of GENERATORS to run (e.g. "summary", "quiz")
+        provider: The LLM provider to use ("auto", "openai" or "groq")
+
+    Returns:
+        Dictionary mapping content type to the Future of its result
+    """
+    return {
+        content_type: _executor.submit(bind_session(GENERATORS[content_type]), text_for(text, content_type), provider)
+        for content_type in content_types
+        if content_type in GENERATORS
+    }
+
+
+def iter_completed(futures: Dict[str, Future]) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[Exception]]]:
+    """
+    Yield the results of submitted generations in completion order.
+
+    Args:
+        futures: Dictionary returned by ``submit_generation``
+
+    Yields:
+        Tuples of (content type, result, error); exactly one of result and error is set
+    """
+    content_types = {future: content_type for content_type, future in futures.items()}
+    for future in as_completed(content_types):
+        try:
+            yield content_types[future], future.result(), None
+        except Exception as e:
+            yield content_types[future], None, e
+
+
+def iter_generated_content(text: GenerationText, content_types: Iterable[str], provider: str = "openai",
+                           max_workers: Optional[int] = None) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[Exception]]]:
+    """
+    Run the selected generators concurrently and yield results as they finish.
+
+    Args:
+        text: The extracted text to generate content from, or a dictionary
+            of text per content type (see ``text_for``)
+        content_types: Keys of GENERATORS to run (e.g. "summary", "quiz")
+        provider: The LLM provider to use ("auto", "openai" or "groq")
+        max_workers: Maximum number of concurrent generator calls
+
+    Yields:
+        Tuples of (content type, result, error); exactly one of result and error is set
+    """
+    content_types = [content_type for content_type in content_types if content_type in GENERATORS]
+    if not content_types:
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(content_types)) as executor:
+        futures = {
+            content_type: executor.submit(bind_session(GENERATORS[content_type]), text_for(text, content_type), provider)
+            for content_type in content_types
+        }
+        yield from iter_completed(futures)
+
+
+def generate_content(text: GenerationText, content_types: Iterable[str], provider: str = "openai",
+                     max_workers: Optional[int] = None) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Generate the selected content types concurrently.
+
+    A failing generator does not discard the results of the others.
+
+    Args:
+        text: The extracted text to generate content from, or a dictionary
+            of text per content type (see ``text_for``)
+        content_types: Keys of GENERATORS to run (e.g. "summary", "quiz")
+        provider: The LLM provider to use ("auto", "openai" or "groq")
+        max_workers: Maximum number of concurrent generator calls
+
+    Returns:
+        Tuple of (generated content by type, error messages by type)
+    """
+    generated_content = {}
+    errors = {}
+    for content_type, result, error in iter_generated_content(text, content_types, provider, max_workers):
+        if error is not None:
+            errors[content_type] = str(error)
+        else:
+            generated_content[content_type] = result
+    return generated_content, errors
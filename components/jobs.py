@@ -0,0 +1,347 @@
+"""
+Background job queue for content generation.
+
+Jobs are stored in SQLite and processed by worker processes that run
+independently of the Streamlit frontend:
+
+    python -m components.jobs --workers 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from typing import Any, Dict, Iterable, List, Optional
+
+import streamlit as st
+
+from components.cache import CACHE_DIR
+from components.scheduler import current_session_id, use_session
+
+JOBS_DB = os.path.join(CACHE_DIR, "jobs.sqlite3")
+
+# Worker timing
+POLL_INTERVAL_SECONDS = 1.0
+HEARTBEAT_INTERVAL_SECONDS = 5.0
+WORKER_TIMEOUT_SECONDS = 30.0
+
+
+class JobQueue:
+    """SQLite-backed queue of generation jobs and their results."""
+
+    def __init__(self, path: str = JOBS_DB):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    doc_hash TEXT,
+                    page_numbers TEXT,
+                    content_types TEXT NOT NULL,
+                    provider TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    results TEXT NOT NULL DEFAULT '{}',
+                    errors TEXT NOT NULL DEFAULT '{}',
+                    worker TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS workers (
+                    id TEXT PRIMARY KEY,
+                    last_seen REAL NOT NULL
+                )"""
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection in autocommit mode; callers close it."""
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def submit(self, doc_hash: str, page_numbers: str, content_types: Iterable[str],
+               provider: str = "openai", retrieval_top_k: Optional[int] = None,
+               selections: Optional[List[Dict[str, str]]] = None,
+               session_id: Optional[str] = None) -> str:
+        """
+        Queue a generation job.
+
+        Args:
+            doc_hash: Hash of the document in the document store
+            page_numbers: String containing page numbers (e.g., '1-5' or '1,3,5')
+            content_types: Content types to generate (e.g. "summary", "quiz")
+            provider: The LLM provider to use ("auto", "openai" or "groq")
+            retrieval_top_k: Passages sent for quizzes and analytics questions,
+                or None to send every page
+            selections: Page ranges of several documents, as {"hash", "name",
+                "pages"} dictionaries, generated from together instead of
+                ``doc_hash`` and ``page_numbers`` alone
+            session_id: Session the job generates content for, by default the
+                current one; the worker makes its calls on behalf of it
+
+        Returns:
+            The job id
+        """
+        options = {"retrieval_top_k": retrieval_top_k, "session_id": session_id or current_session_id()}
+        if selections:
+            options["selections"] = selections
+        job_id = uuid.uuid4().hex
+        with closing(self._connect()) as conn:
+            conn.execute(
+                """INSERT INTO jobs (id, status, doc_hash, page_numbers, content_types, provider, payload, created_at)
+                VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)""",
+                (job_id, doc_hash, page_numbers, json.dumps(list(content_types)), provider,
+                 json.dumps(options), time.time())
+            )
+        return job_id
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Atomically take the oldest queued job.
+
+        Args:
+            worker_id: Id of the worker taking the job
+
+        Returns:
+            The job, or None if the queue is empty
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started_at = ? WHERE id = ?",
+                (worker_id, time.time(), row["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return self.get(row["id"])
+
+    def store_result(self, job_id: str, content_type: str, result: Optional[Dict[str, Any]] = None,
+                     error: Optional[str] = None) -> None:
+        """
+        Persist the result or error of one content type as soon as it is ready.
+
+        Args:
+            job_id: The job id
+            content_type: The content type that finished
+            result: The generated content, if successful
+            error: The error message, if the generator failed
+        """
+        column = "results" if error is None else "errors"
+        value = result if error is None else error
+        with closing(self._connect()) as conn:
+            conn.execute(
+                f"UPDATE jobs SET {column} = json_set({column}, ?, json(?)) WHERE id = ?",
+                (f"$.{content_type}", json.dumps(value), job_id)
+            )
+
+    def finish(self, job_id: str, status: str = "done") -> None:
+        """Mark a job as finished."""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?",
+                (status, time.time(), job_id)
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a job with its status, results and errors.
+
+        Args:
+            job_id: The job id
+
+        Returns:
+            The job, or None if it does not exist
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["content_types"] = json.loads(job["content_types"])
+        job["options"] = json.loads(job.pop("payload"))
+        job["results"] = json.loads(job["results"])
+        job["errors"] = json.loads(job["errors"])
+        return job
+
+    def heartbeat(self, worker_id: str) -> None:
+        """Record that a worker is alive."""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO workers (id, last_seen) VALUES (?, ?)",
+                (worker_id, time.time())
+            )
+
+    def active_workers(self, max_age: float = WORKER_TIMEOUT_SECONDS) -> List[str]:
+        """Ids of workers seen within ``max_age`` seconds."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT id FROM workers WHERE last_seen >= ?", (time.time() - max_age,)
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def requeue_stale(self, max_age: float = WORKER_TIMEOUT_SECONDS) -> int:
+        """
+        Put jobs of crashed workers back in the queue.
+
+        A running job is abandoned when its worker has not sent a heartbeat
+        within ``max_age`` seconds, the same test as ``active_workers``; jobs
+        of live workers stay with them however long they run.
+
+        Args:
+            max_age: Seconds without a heartbeat after which a worker is
+                considered crashed
+
+        Returns:
+            Number of requeued jobs
+        """
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                """UPDATE jobs SET status = 'queued', worker = NULL
+                WHERE status = 'running'
+                AND (worker IS NULL OR worker NOT IN (SELECT id FROM workers WHERE last_seen >= ?))""",
+                (time.time() - max_age,)
+            )
+            return cursor.rowcount
+
+
+def run_job(queue: JobQueue, job: Dict[str, Any]) -> None:
+    """
+    Run the generators of a job, persisting each result as it finishes.
+
+    Documents are resolved from the shared document store by their hash, and
+    content is generated on behalf of the session that submitted the job.
+
+    Args:
+        queue: The job queue
+        job: A job returned by ``JobQueue.claim``
+    """
+    from components.generation import build_generation_text, build_selection_text, iter_generated_content
+
+    retrieval_top_k = job["options"].get("retrieval_top_k")
+    if job["options"].get("selections"):
+        text = build_selection_text(job["options"]["selections"], retrieval_top_k)
+    else:
+        text = build_generation_text(job["doc_hash"], job["page_numbers"], retrieval_top_k)
+    failed = False
+    # Quizzes are served to, and LLM calls queued for, the session that submitted the job
+    with use_session(job["options"].get("session_id")):
+        for content_type, result, error in iter_generated_content(text, job["content_types"], job["provider"]):
+            if error is not None:
+                failed = True
+                queue.store_result(job["id"], content_type, error=str(error))
+            else:
+                queue.store_result(job["id"], content_type, result=result)
+    queue.finish(job["id"], "failed" if failed else "done")
+
+
+def run_worker(path: str = JOBS_DB, poll_interval: float = POLL_INTERVAL_SECONDS) -> None:
+    """
+    Process jobs until interrupted.
+
+    Args:
+        path: Path of the jobs database
+        poll_interval: Seconds to wait when the queue is empty
+    """
+    queue = JobQueue(path)
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    queue.heartbeat(worker_id)
+
+    # Heartbeats continue while a job runs, so long jobs are not taken for abandoned
+    def send_heartbeats():
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL_SECONDS)
+            queue.heartbeat(worker_id)
+            queue.requeue_stale()
+
+    threading.Thread(target=send_heartbeats, name="job-heartbeat", daemon=True).start()
+    while True:
+        job = queue.claim(worker_id)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        try:
+            run_job(queue, job)
+        except Exception as e:
+            queue.store_result(job["id"], "job", error=str(e))
+            queue.finish(job["id"], "failed")
+
+
+def display_job_status(job_id: str, path: str = JOBS_DB) -> Optional[Dict[str, Any]]:
+    """
+    Display the progress of a generation job in Streamlit.
+
+    Failed content types are counted here; their errors are left to the
+    caller, which keeps showing them after the job has finished.
+
+    Args:
+        job_id: The job id
+        path: Path of the jobs database
+
+    Returns:
+        The job, or None if it does not exist
+    """
+    queue = JobQueue(path)
+    job = queue.get(job_id)
+    if job is None:
+        st.error("Generation job not found.")
+        return None
+
+    finished = len(job["results"]) + len(job["errors"])
+    failed = f", {len(job['errors'])} failed" if job["errors"] else ""
+    st.progress(
+        min(finished / max(len(job["content_types"]), 1), 1.0),
+        text=f"Background generation {job['status']}: {finished} of {len(job['content_types'])} ready{failed}"
+    )
+    if job["status"] == "queued" and not queue.active_workers():
+        st.warning("No generation workers are running. Start them with `python -m components.jobs`.")
+    return job
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2, help="Number of worker processes")
+    parser.add_argument("--db", default=JOBS_DB, help="Path of the jobs database")
+    args = parser.parse_args()
+
+    JobQueue(args.db)
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(args.db,), daemon=True)
+        for _ in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    print(f"Started {args.workers} generation workers on {args.db}")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
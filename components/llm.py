@@ -0,0 +1,131 @@
+import json
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from langchain_groq import ChatGroq
+from langchain_openai import ChatOpenAI
+import streamlit as st
+
+# Model used when a caller does not ask for a specific one
+DEFAULT_MODELS = {
+    "openai": "gpt-3.5-turbo",
+    "groq": "mixtral-8x7b-32768",
+}
+
+# Connection pool limits of the shared HTTP client
+MAX_CONNECTIONS = 50
+MAX_KEEPALIVE_CONNECTIONS = 20
+KEEPALIVE_EXPIRY_SECONDS = 60.0
+
+_clients: Dict[Tuple[str, str, float, str], Any] = {}
+_api_keys: Dict[str, str] = {}
+_http_client: Optional[httpx.Client] = None
+_lock = threading.Lock()
+
+
+def resolve_model(provider: str, model: Optional[str] = None) -> str:
+    """
+    Get the model name used for a provider.
+
+    Args:
+        provider: Either "openai" or "groq"
+        model: Explicit model name, or None for the provider default
+
+    Returns:
+        The model name
+    """
+    if model:
+        return model
+    if provider not in DEFAULT_MODELS:
+        raise ValueError(f"Unsupported provider: {provider}")
+    return DEFAULT_MODELS[provider]
+
+
+def get_api_key(provider: str) -> str:
+    """
+    Read a provider API key from secrets.toml once and remember it.
+
+    Args:
+        provider: Either "openai" or "groq"
+
+    Returns:
+        The API key
+    """
+    with _lock:
+        if provider not in _api_keys:
+            try:
+                _api_keys[provider] = st.secrets[provider]["api_key"]
+            except KeyError:
+                raise Exception(f"API key not found in secrets.toml for provider: {provider}")
+        return _api_keys[provider]
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Get the shared HTTP client with a keep-alive connection pool.
+
+    Returns:
+        The process-wide httpx.Client
+    """
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS
+                ),
+                timeout=httpx.Timeout(120.0, connect=10.0)
+            )
+        return _http_client
+
+
+def get_llm(provider: str = "openai", model: Optional[str] = None,
+            temperature: float = 0, **kwargs: Any) -> Any:
+    """
+    Get a shared LLM client for a provider, model and settings.
+
+    Clients are built once per combination of settings and reused by all
+    sessions. They share one pooled HTTP client, so connections and TLS
+    sessions are kept alive between requests.
+
+    Args:
+        provider: Either "openai" or "groq"
+        model: Model name, or None for the provider default
+        temperature: Sampling temperature
+        **kwargs: Extra keyword arguments for the chat model class
+
+    Returns:
+        The configured LLM instance
+    """
+    model = resolve_model(provider, model)
+    key = (provider, model, temperature, json.dumps(kwargs, sort_keys=True, default=str))
+
+    with _lock:
+        llm = _clients.get(key)
+    if llm is not None:
+        return llm
+
+    api_key = get_api_key(provider)
+    http_client = get_http_client()
+    if provider == "openai":
+        llm = ChatOpenAI(model=model, temperature=temperature, api_key=api_key,
+                         http_client=http_client, **kwargs)
+    elif provider == "groq":
+        llm = ChatGroq(model=model, temperature=temperature, api_key=api_key,
+                       http_client=http_client, **kwargs)
+    else:
+        raise ValueError(f"Unsupported provider: {provider}")
+
+    with _lock:
+        # Keep the first client if another thread built one meanwhile
+        return _clients.setdefault(key, llm)
+
+
+def clear_llm_clients() -> None:
+    """Forget all cached clients and API keys, e.g. after secrets change."""
+    with _lock:
+        _clients.clear()
+        _api_keys.clear()
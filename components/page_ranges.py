@@ -0,0 +1,202 @@
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# A page number or a range like "3-7", "10-" (to the end) or "-5" (from the start)
+RANGE_PATTERN = re.compile(r"^(\d+)?\s*-\s*(\d+)?$")
+PAGE_PATTERN = re.compile(r"^[+-]?\d+$")
+
+# Inclusive (first, last) page interval; last is None for open-ended ranges
+Interval = Tuple[int, Optional[int]]
+
+
+class PageRangeSpec:
+    """
+    A set of pages stored as sorted, merged, inclusive intervals.
+
+    Pages are numbered from 1. Intervals are never expanded into lists, so
+    ranges like "1-10000000" cost nothing until they are clipped to the length
+    of a document and iterated.
+    """
+
+    def __init__(self, intervals: List[Interval]):
+        self.intervals = merge_intervals(intervals)
+
+    @classmethod
+    def parse(cls, spec: str, named_ranges: Optional[Dict[str, Tuple[int, int]]] = None) -> "PageRangeSpec":
+        """
+        Parse a page selection like "1-5, 8, 10-" or "Chapter 2".
+
+        Reversed ranges are swapped and whitespace is ignored. Parts that are
+        not numbers are looked up in ``named_ranges``, case-insensitively.
+
+        Args:
+            spec: Comma-separated pages, ranges and range names
+            named_ranges: Range name -> (first page, last page), e.g. from
+                ``toc_ranges``
+
+        Returns:
+            The parsed PageRangeSpec
+
+        Raises:
+            ValueError: For empty specs, page numbers below 1 and unknown names
+        """
+        names = {name.strip().lower(): pages for name, pages in (named_ranges or {}).items()}
+        intervals: List[Interval] = []
+        for part in spec.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            match = RANGE_PATTERN.match(part)
+            if PAGE_PATTERN.match(part) and not part.startswith("-"):
+                page = int(part)
+                if page < 1:
+                    raise ValueError(f"Page numbers start at 1, got '{part}'")
+                intervals.append((page, page))
+            elif match and (match.group(1) or match.group(2)):
+                first = int(match.group(1)) if match.group(1) else 1
+                last = int(match.group(2)) if match.group(2) else None
+                if first < 1 or last == 0:
+                    raise ValueError(f"Page numbers start at 1, got '{part}'")
+                if last is not None and last < first:
+                    first, last = last, first
+                intervals.append((first, last))
+            elif part.lower() in names:
+                intervals.append(tuple(names[part.lower()]))
+            else:
+                raise ValueError(f"Invalid page range '{part}'")
+        if not intervals:
+            raise ValueError("No valid page numbers found")
+        return cls(intervals)
+
+    def clip(self, page_count: int) -> "PageRangeSpec":
+        """
+        Restrict the pages to a document, closing open-ended ranges.
+
+        Args:
+            page_count: Number of pages of the document
+
+        Returns:
+            A new PageRangeSpec within 1..page_count
+        """
+        return PageRangeSpec([
+            (first, page_count if last is None else min(last, page_count))
+            for first, last in self.intervals
+            if first <= page_count
+        ])
+
+    @property
+    def is_bounded(self) -> bool:
+        return all(last is not None for _, last in self.intervals)
+
+    @property
+    def first_page(self) -> Optional[int]:
+        return self.intervals[0][0] if self.intervals else None
+
+    @property
+    def last_page(self) -> Optional[int]:
+        return self.intervals[-1][1] if self.intervals else None
+
+    def __iter__(self) -> Iterator[int]:
+        for first, last in self.intervals:
+            if last is None:
+                raise ValueError("Open-ended page range must be clipped to the document first")
+            yield from range(first, last + 1)
+
+    def __len__(self) -> int:
+        if not self.is_bounded:
+            raise ValueError("Open-ended page range must be clipped to the document first")
+        return sum(last - first + 1 for first, last in self.intervals)
+
+    def __bool__(self) -> bool:
+        return bool(self.intervals)
+
+    def __contains__(self, page_number: Any) -> bool:
+        return any(
+            first <= page_number and (last is None or page_number <= last)
+            for first, last in self.intervals
+        )
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, PageRangeSpec) and self.intervals == other.intervals
+
+    def _parts(self) -> List[str]:
+        parts = []
+        for first, last in self.intervals:
+            if last is None:
+                parts.append(f"{first}-")
+            elif first == last:
+                parts.append(str(first))
+            else:
+                parts.append(f"{first}-{last}")
+        return parts
+
+    def describe(self) -> str:
+        """
+        Describe the pages for display, e.g. "pages 1-5, 8 and 10-".
+
+        Returns:
+            The pages as readable text
+        """
+        parts = self._parts()
+        if len(parts) == 1:
+            noun = "page" if self.intervals[0][0] == self.intervals[0][1] else "pages"
+            return f"{noun} {parts[0]}"
+        return f"pages {', '.join(parts[:-1])} and {parts[-1]}" if parts else "no pages"
+
+    def __str__(self) -> str:
+        return ",".join(self._parts())
+
+    def __repr__(self) -> str:
+        return f"PageRangeSpec('{self}')"
+
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    """
+    Sort intervals and merge those that overlap or touch.
+
+    Args:
+        intervals: Inclusive (first, last) intervals; last may be None
+
+    Returns:
+        Sorted, non-overlapping intervals
+    """
+    merged: List[Interval] = []
+    for first, last in sorted(intervals, key=lambda interval: interval[0]):
+        if merged:
+            previous_first, previous_last = merged[-1]
+            if previous_last is None:
+                continue
+            if first <= previous_last + 1:
+                merged[-1] = (previous_first, None if last is None else max(previous_last, last))
+                continue
+        merged.append((first, last))
+    return merged
+
+
+def toc_ranges(toc: List[List[Any]], page_count: int) -> Dict[str, Tuple[int, int]]:
+    """
+    Turn a table of contents into named page ranges.
+
+    Every entry spans from its page to the page before the next entry of the
+    same or a higher level, or to the end of the document.
+
+    Args:
+        toc: Entries of [level, title, page] as returned by ``doc.get_toc()``
+        page_count: Number of pages of the document
+
+    Returns:
+        Dictionary mapping entry title to (first page, last page)
+    """
+    ranges = {}
+    for i, (level, title, page, *_) in enumerate(toc):
+        if page < 1:
+            continue
+        last = page_count
+        for next_level, _, next_page, *_ in toc[i + 1:]:
+            if next_level <= level and next_page >= 1:
+                last = max(page, next_page - 1)
+                break
+        title = title.strip()
+        if title and title not in ranges:
+            ranges[title] = (page, min(last, page_count))
+    return ranges
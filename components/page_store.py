@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# Maximum number of documents whose page text is kept in memory
+MAX_DOCUMENTS = 32
+
+
+class PageTextStore:
+    """
+    Lazily filled per-page text of a single document.
+
+    Pages are numbered from 1, like the page numbers entered by users.
+    """
+
+    def __init__(self, doc_hash: str):
+        self.doc_hash = doc_hash
+        self.page_count: Optional[int] = None
+        # Table of contents entry title -> (first page, last page), once read
+        self.named_ranges: Optional[Dict[str, Tuple[int, int]]] = None
+        self._pages: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, page_number: int) -> bool:
+        return page_number in self._pages
+
+    def put(self, page_number: int, text: str) -> None:
+        """
+        Store the text of a page if it is not cached yet.
+
+        Args:
+            page_number: 1-based page number
+            text: The page text as returned by ``page.get_text()``
+        """
+        with self._lock:
+            self._pages.setdefault(page_number, text)
+
+    def get(self, page_number: int) -> Optional[str]:
+        """
+        Get the text of a page if it is cached.
+
+        Args:
+            page_number: 1-based page number
+
+        Returns:
+            The page text, or None if the page was not extracted yet
+        """
+        with self._lock:
+            return self._pages.get(page_number)
+
+
+_stores: "OrderedDict[str, PageTextStore]" = OrderedDict()
+_stores_lock = threading.Lock()
+
+
+def get_page_store(doc_hash: str) -> PageTextStore:
+    """
+    Get the shared page text store of a document, creating it if needed.
+
+    The least recently used stores are dropped beyond MAX_DOCUMENTS.
+
+    Args:
+        doc_hash: Hash of the document in the document store
+
+    Returns:
+        The PageTextStore for the document
+    """
+    with _stores_lock:
+        store = _stores.get(doc_hash)
+        if store is None:
+            store = PageTextStore(doc_hash)
+            _stores[doc_hash] = store
+            while len(_stores) > MAX_DOCUMENTS:
+                _stores.popitem(last=False)
+        else:
+            _stores.move_to_end(doc_hash)
+        return store
+
+
+def clear_page_stores() -> None:
+    """Forget the page text of all documents."""
+    with _stores_lock:
+        _stores.clear()
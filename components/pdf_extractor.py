@@ -1,73 +1,230 @@
-import fitz  # PyMuPDF
-import io
-from typing import List, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from components.document_store import get_document_store
+from components.page_ranges import PageRangeSpec, toc_ranges
+from components.page_store import get_page_store
+from components.telemetry import span, traced
+
+# Rough number of characters per token, used for token caps
+CHARS_PER_TOKEN = 4
 
 def parse_page_numbers(page_numbers: str) -> List[int]:
     """
     Parse a string of page numbers into a list of integers.
     Supports ranges (e.g., '1-5') and individual numbers (e.g., '1,3,5').
     
+    Prefer ``resolve_page_range``, which never expands the ranges and clips
+    them to the document.
+    
     Args:
         page_numbers: String containing page numbers (e.g., '1-5' or '1,3,5')
         
     Returns:
-        List of page numbers
-    """
-    pages = []
-    for part in page_numbers.split(','):
-        if '-' in part:
-            start, end = map(int, part.split('-'))
-            pages.extend(range(start, end + 1))
-        else:
-            pages.append(int(part))
-    return sorted(set(pages))  # Remove duplicates and sort
+        Sorted list of unique page numbers
+    """
+    return list(PageRangeSpec.parse(page_numbers))
 
-def extract_text_from_pages(pdf_content: bytes, page_numbers: str) -> str:
+def get_page_count(doc_hash: str) -> int:
     """
-    Extract text from specified pages of a PDF file.
+    Get the number of pages of a stored document, opening it only once.
     
     Args:
-        pdf_content: The PDF file content as bytes
-        page_numbers: String containing page numbers (e.g., '1-5' or '1,3,5')
+        doc_hash: Hash of the document in the document store
         
     Returns:
-        Extracted text from the specified pages
+        Number of pages
+    """
+    store = get_page_store(doc_hash)
+    if store.page_count is None:
+        load_document_outline(doc_hash)
+    return store.page_count
+
+def get_named_ranges(doc_hash: str) -> Dict[str, Tuple[int, int]]:
     """
+    Get the page ranges of the table of contents entries of a stored document.
+    
+    Args:
+        doc_hash: Hash of the document in the document store
+        
+    Returns:
+        Dictionary mapping entry title to (first page, last page)
+    """
+    store = get_page_store(doc_hash)
+    if store.named_ranges is None:
+        load_document_outline(doc_hash)
+    return store.named_ranges
+
+def load_document_outline(doc_hash: str) -> None:
+    """Read the page count and table of contents into the shared page store."""
+    store = get_page_store(doc_hash)
+    with span("pdf.open"):
+        doc = get_document_store().open(doc_hash)
     try:
-        # Validate input
-        if not pdf_content:
-            raise ValueError("PDF content is empty")
+        store.page_count = len(doc)
+        store.named_ranges = toc_ranges(doc.get_toc(), store.page_count)
+    finally:
+        doc.close()
+
+def resolve_page_range(doc_hash: str, page_numbers: Union[str, PageRangeSpec]) -> PageRangeSpec:
+    """
+    Parse page numbers and clip them to the pages of a stored document.
+    
+    Besides pages and ranges ('1-5', '10-' for page 10 to the end), the names
+    of table of contents entries select the pages of that entry. The table of
+    contents is only read when such a name is used.
+    
+    Args:
+        doc_hash: Hash of the document in the document store
+        page_numbers: String containing page numbers, or a parsed PageRangeSpec
         
-        if not page_numbers:
-            raise ValueError("No page numbers specified")
+    Returns:
+        The pages of the document that were selected
         
-        # Parse page numbers
-        pages_to_extract = parse_page_numbers(page_numbers)
+    Raises:
+        ValueError: For invalid page numbers or a selection outside the document
+    """
+    if isinstance(page_numbers, PageRangeSpec):
+        spec = page_numbers
+    else:
+        try:
+            spec = PageRangeSpec.parse(page_numbers)
+        except ValueError:
+            named_ranges = get_named_ranges(doc_hash)
+            if not named_ranges:
+                raise
+            spec = PageRangeSpec.parse(page_numbers, named_ranges)
+    
+    page_count = get_page_count(doc_hash)
+    clipped = spec.clip(page_count)
+    if not clipped:
+        raise ValueError(f"Page number {spec.first_page} exceeds total pages ({page_count})")
+    return clipped
+
+def iter_page_texts(doc_hash: str, pages: Optional[Iterable[int]] = None,
+                    max_chars: Optional[int] = None, max_tokens: Optional[int] = None,
+                    cache: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the text of pages one page at a time.
+    
+    Pages already in the shared page store are not extracted again. The PDF is
+    opened only when a page is missing, and each page is released as soon as
+    its text is extracted, so memory does not grow with the size of the range
+    unless ``cache`` is on.
+    
+    Args:
+        doc_hash: Hash of the document in the document store
+        pages: Page numbers to get, in order, or None for all pages; a
+            PageRangeSpec is clipped to the document
+        max_chars: Stop after this many characters; the last page is truncated
+        max_tokens: Stop after about this many tokens (4 characters per token)
+        cache: Keep newly extracted pages in the shared page store
         
-        # Create a BytesIO object from the PDF content
-        pdf_stream = io.BytesIO(pdf_content)
+    Yields:
+        Dictionaries with "page", "text", "char_count" and "truncated"
+    """
+    if max_tokens is not None:
+        token_chars = max_tokens * CHARS_PER_TOKEN
+        max_chars = token_chars if max_chars is None else min(max_chars, token_chars)
+    
+    store = get_page_store(doc_hash)
+    doc = None
+    try:
+        if store.page_count is None:
+            with span("pdf.open"):
+                doc = get_document_store().open(doc_hash)
+            store.page_count = len(doc)
+        if pages is None:
+            pages = range(1, store.page_count + 1)
+        elif isinstance(pages, PageRangeSpec):
+            pages = pages.clip(store.page_count)
+        elif isinstance(pages, (list, tuple, range)) and pages:
+            # Fail before extracting anything when the whole selection is known
+            check_page_number(min(pages), store.page_count)
+            check_page_number(max(pages), store.page_count)
         
-        # Open the PDF
-        doc = fitz.open(stream=pdf_stream, filetype="pdf")
+        remaining = max_chars
+        for page_number in pages:
+            check_page_number(page_number, store.page_count)
+            text = store.get(page_number)
+            if text is None:
+                if doc is None:
+                    with span("pdf.open"):
+                        doc = get_document_store().open(doc_hash)
+                with span("pdf.get_text", page=page_number):
+                    text = doc.load_page(page_number - 1).get_text()
+                if cache:
+                    store.put(page_number, text)
+            
+            truncated = remaining is not None and len(text) > remaining
+            if truncated:
+                text = text[:remaining]
+            yield {"page": page_number, "text": text, "char_count": len(text), "truncated": truncated}
+            
+            if remaining is not None:
+                remaining -= len(text)
+                if remaining <= 0:
+                    return
+    finally:
+        if doc is not None:
+            doc.close()
+
+def check_page_number(page_number: int, page_count: int) -> None:
+    """
+    Raise ValueError for a page number outside the document.
+    
+    Args:
+        page_number: 1-based page number
+        page_count: Number of pages of the document
+    """
+    if page_number > page_count:
+        raise ValueError(f"Page number {page_number} exceeds total pages ({page_count})")
+    if page_number < 1:
+        raise ValueError(f"Page number {page_number} is not a valid page number")
+
+def get_page_texts(doc_hash: str, pages: Optional[Iterable[int]] = None) -> Dict[int, str]:
+    """
+    Get the text of pages from the shared page store, extracting missing pages.
+    
+    Missing pages are not added to the store; callers such as the retrieval
+    index keep their own copy of the text.
+    
+    Args:
+        doc_hash: Hash of the document in the document store
+        pages: Page numbers to get, or None for all pages
         
-        # Validate page numbers
-        if not pages_to_extract:
-            raise ValueError("No valid page numbers found")
+    Returns:
+        Dictionary mapping page number to page text
+    """
+    return {record["page"]: record["text"] for record in iter_page_texts(doc_hash, pages)}
+
+@traced("pdf.extract_text")
+def extract_text_from_pages(doc_hash: str, page_numbers: Union[str, PageRangeSpec]) -> str:
+    """
+    Extract text from specified pages of a PDF file.
+    
+    Args:
+        doc_hash: Hash of the document in the document store
+        page_numbers: String containing page numbers (e.g., '1-5', '1,3,5',
+            '10-' or a table of contents entry), or a PageRangeSpec
         
-        if max(pages_to_extract) > len(doc):
-            raise ValueError(f"Page number {max(pages_to_extract)} exceeds total pages ({len(doc)})")
+    Returns:
+        Extracted text from the specified pages
+    """
+    try:
+        # Validate input
+        if not doc_hash:
+            raise ValueError("No document specified")
         
-        # Extract text from specified pages
-        extracted_text = ""
-        for page_num in pages_to_extract:
-            page = doc[page_num - 1]  # Convert to 0-based index
-            text = page.get_text()
-            extracted_text += f"\n\n--- Page {page_num} ---\n{text}\n"
+        if not page_numbers:
+            raise ValueError("No page numbers specified")
         
-        # Close the document
-        doc.close()
+        # Parse page numbers and validate them against the document
+        pages_to_extract = resolve_page_range(doc_hash, page_numbers)
         
-        return extracted_text.strip()
+        # Join the page texts as they are streamed, keeping them in the shared store
+        return "".join(
+            f"\n\n--- Page {record['page']} ---\n{record['text']}\n"
+            for record in iter_page_texts(doc_hash, pages_to_extract, cache=True)
+        ).strip()
         
     except Exception as e:
         raise Exception(f"Error extracting text from PDF: {str(e)}") 
\ No newline at end of file
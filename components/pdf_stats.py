@@ -1,101 +1,263 @@
 import streamlit as st
 import fitz  # PyMuPDF
-import io
-from typing import Dict, Any
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Any, Iterator, Optional
 import pandas as pd
+from components.document_store import get_document_store
+from components.page_store import MAX_DOCUMENTS, get_page_store
+from components.telemetry import traced
 
-def get_pdf_statistics(pdf_content: bytes) -> Dict[str, Any]:
+# Documents with at least this many pages are analyzed in a process pool
+PARALLEL_PAGE_THRESHOLD = 200
+
+# Number of pages analyzed between two progress updates
+CHUNK_PAGES = 25
+
+STAT_COUNTERS = ["total_images", "total_text_blocks", "total_lines", "total_words", "total_characters"]
+
+# Statistics memoized per document hash, shared by all sessions; like the page
+# store, only the MAX_DOCUMENTS most recently used documents are kept
+_completed_stats: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_partial_stats: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_stats_lock = threading.Lock()
+
+def _remember(memo: "OrderedDict[str, Dict[str, Any]]", doc_hash: str, stats: Dict[str, Any]) -> None:
+    """Store statistics in a memo, dropping the least recently used beyond MAX_DOCUMENTS."""
+    memo[doc_hash] = stats
+    memo.move_to_end(doc_hash)
+    while len(memo) > MAX_DOCUMENTS:
+        memo.popitem(last=False)
+
+@traced("pdf.page_range_statistics")
+def get_page_range_statistics(pdf_path: str, start: int, stop: int) -> Dict[str, Any]:
     """
-    Analyze a PDF file and return statistics about its content.
+    Count content statistics for a range of pages.
+    
+    Uses the lightweight "blocks" extraction mode instead of building the
+    nested "dict" structure, and counts words once per page.
     
     Args:
-        pdf_content: The PDF file content as bytes
+        pdf_path: Path of the PDF file
+        start: First page index (0-based, inclusive)
+        stop: Last page index (0-based, exclusive)
         
     Returns:
-        Dictionary containing PDF statistics
+        Dictionary with the STAT_COUNTERS and the page texts of the range
     """
+    doc = fitz.open(pdf_path, filetype="pdf")
     try:
-        # Open the PDF from bytes
-        doc = fitz.open(stream=pdf_content, filetype="pdf")
-        
-        # Initialize counters
-        total_images = 0
-        total_text_blocks = 0
-        total_lines = 0
-        total_words = 0
-        total_characters = 0
+        stats = dict.fromkeys(STAT_COUNTERS, 0)
+        page_texts = []
         
-        # Process each page
-        for page in doc:
+        for page_index in range(start, stop):
+            page = doc[page_index]
+            
             # Count images
-            total_images += len(page.get_images())
+            stats["total_images"] += len(page.get_images())
             
-            # Get text blocks
-            blocks = page.get_text("dict")["blocks"]
-            total_text_blocks += len(blocks)
+            # Get text and image blocks as (x0, y0, x1, y1, text, block_no, block_type)
+            blocks = page.get_text("blocks", flags=fitz.TEXTFLAGS_DICT)
+            stats["total_text_blocks"] += len(blocks)
             
-            # Process each block
-            for block in blocks:
-                if "lines" in block:
-                    total_lines += len(block["lines"])
-                    for line in block["lines"]:
-                        if "spans" in line:
-                            for span in line["spans"]:
-                                text = span["text"]
-                                total_words += len(text.split())
-                                total_characters += len(text)
+            # Every line of a text block ends with a newline
+            page_text = "".join(block[4] for block in blocks if block[6] == 0)
+            lines = page_text.count("\n")
+            stats["total_lines"] += lines
+            stats["total_words"] += len(page_text.split())
+            stats["total_characters"] += len(page_text) - lines
+            page_texts.append(page_text)
         
-        # Get metadata
-        metadata = doc.metadata
-        
-        # Close the document
+        stats["page_texts"] = page_texts
+        return stats
+    finally:
         doc.close()
+
+def iter_pdf_statistics(doc_hash: str, max_workers: Optional[int] = None,
+                        chunk_pages: int = CHUNK_PAGES,
+                        cancel_event: Optional[threading.Event] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Analyze a PDF progressively, yielding partial statistics as pages are processed.
+    
+    Results are memoized per document hash for all sessions of the process.
+    Progress of an interrupted or cancelled analysis is kept, so a later call
+    resumes with the pages that are still missing.
+    
+    Args:
+        doc_hash: Hash of the document in the document store
+        max_workers: Number of worker processes for large documents
+            (defaults to the number of CPUs)
+        chunk_pages: Number of pages analyzed between two updates
+        cancel_event: Event that stops the analysis when set
         
-        return {
-            "total_pages": len(doc),
-            "total_images": total_images,
-            "total_text_blocks": total_text_blocks,
-            "total_lines": total_lines,
-            "total_words": total_words,
-            "total_characters": total_characters,
-            "metadata": metadata
-        }
+    Yields:
+        Statistics dictionaries with "pages_done" and "complete" keys
+    """
+    with _stats_lock:
+        completed = _completed_stats.get(doc_hash)
+        if completed is not None:
+            _completed_stats.move_to_end(doc_hash)
+    if completed is not None:
+        yield completed
+        return
+    
+    # Open the PDF from the document store; workers reopen it from its path
+    doc = get_document_store().open(doc_hash)
+    pdf_path = doc.name
+    total_pages = len(doc)
+    metadata = doc.metadata
+    doc.close()
+    
+    store = get_page_store(doc_hash)
+    store.page_count = total_pages
+    
+    with _stats_lock:
+        progress = _partial_stats.get(doc_hash) or {"done": {}, **dict.fromkeys(STAT_COUNTERS, 0)}
+        _remember(_partial_stats, doc_hash, progress)
+        ranges = [
+            (start, min(start + chunk_pages, total_pages))
+            for start in range(0, total_pages, chunk_pages)
+            if start not in progress["done"]
+        ]
+    
+    def snapshot() -> Dict[str, Any]:
+        with _stats_lock:
+            pages_done = sum(progress["done"].values())
+            return {
+                "total_pages": total_pages,
+                **{counter: progress[counter] for counter in STAT_COUNTERS},
+                "metadata": metadata,
+                "pages_done": pages_done,
+                "complete": pages_done >= total_pages
+            }
+    
+    def merge(start: int, result: Dict[str, Any]) -> None:
+        with _stats_lock:
+            # Another session may have analyzed the same pages meanwhile
+            if start in progress["done"]:
+                return
+            for counter in STAT_COUNTERS:
+                progress[counter] += result[counter]
+            progress["done"][start] = len(result["page_texts"])
+        for page_number, page_text in enumerate(result["page_texts"], start=start + 1):
+            store.put(page_number, page_text)
+    
+    yield snapshot()
+    
+    workers = max_workers or os.cpu_count() or 1
+    if total_pages >= PARALLEL_PAGE_THRESHOLD and workers > 1 and len(ranges) > 1:
+        # Analyze chunks in a process pool, reporting them as they complete
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(ranges)))
+        try:
+            futures = {
+                executor.submit(get_page_range_statistics, pdf_path, start, stop): start
+                for start, stop in ranges
+            }
+            for future in as_completed(futures):
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                merge(futures[future], future.result())
+                yield snapshot()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    else:
+        for start, stop in ranges:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            merge(start, get_page_range_statistics(pdf_path, start, stop))
+            yield snapshot()
+    
+    final = snapshot()
+    if final["complete"]:
+        with _stats_lock:
+            _remember(_completed_stats, doc_hash, final)
+            _partial_stats.pop(doc_hash, None)
+
+def clear_statistics_cache():
+    """Forget all memoized and partial statistics."""
+    with _stats_lock:
+        _completed_stats.clear()
+        _partial_stats.clear()
+
+@traced("pdf.statistics")
+def get_pdf_statistics(doc_hash: str, max_workers: Optional[int] = None,
+                       cancel_event: Optional[threading.Event] = None,
+                       on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Analyze a PDF file and return statistics about its content.
+    
+    Large documents are split into page ranges analyzed in a process pool.
+    
+    Args:
+        doc_hash: Hash of the document in the document store
+        max_workers: Number of worker processes for large documents
+            (defaults to the number of CPUs)
+        cancel_event: Event that stops the analysis when set, e.g. when the
+            document is removed while it is being ingested
+        on_progress: Called with every partial snapshot of the statistics,
+            so they can be shown while the analysis runs
+        
+    Returns:
+        Dictionary containing PDF statistics
+    """
+    try:
+        stats = None
+        for stats in iter_pdf_statistics(doc_hash, max_workers=max_workers, cancel_event=cancel_event):
+            if on_progress is not None:
+                on_progress(stats)
+        if cancel_event is not None and cancel_event.is_set() and not stats["complete"]:
+            raise Exception("the analysis was cancelled")
+        return stats
         
     except Exception as e:
         raise Exception(f"Error analyzing PDF: {str(e)}")
 
-def display_pdf_statistics(pdf_file: io.BytesIO):
+def render_statistics_metrics(stats: Dict[str, Any]):
+    """
+    Render the statistics metrics in two rows of columns.
+    
+    Args:
+        stats: Statistics dictionary from iter_pdf_statistics
+    """
+    # Display basic statistics
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total Pages", stats["total_pages"])
+    with col2:
+        st.metric("Total Images", stats["total_images"])
+    with col3:
+        st.metric("Total Text Blocks", stats["total_text_blocks"])
+    
+    # Display text statistics
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total Lines", stats["total_lines"])
+    with col2:
+        st.metric("Total Words", stats["total_words"])
+    with col3:
+        st.metric("Total Characters", stats["total_characters"])
+
+def display_pdf_statistics(stats: Dict[str, Any]):
     """
     Display PDF statistics in a Streamlit interface.
     
+    Partial statistics of an analysis still running are shown with a
+    progress bar; complete statistics with the document metadata.
+    
     Args:
-        pdf_file: A BytesIO object containing the PDF file
+        stats: Statistics dictionary from iter_pdf_statistics, complete or partial
     """
-    try:
-        stats = get_pdf_statistics(pdf_file.read())
-        
-        # Display basic statistics
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("Total Pages", stats["total_pages"])
-        with col2:
-            st.metric("Total Images", stats["total_images"])
-        with col3:
-            st.metric("Total Text Blocks", stats["total_text_blocks"])
-        
-        # Display text statistics
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("Total Lines", stats["total_lines"])
-        with col2:
-            st.metric("Total Words", stats["total_words"])
-        with col3:
-            st.metric("Total Characters", stats["total_characters"])
-        
+    if not stats["complete"]:
+        st.progress(
+            stats["pages_done"] / max(stats["total_pages"], 1),
+            text=f"Analyzed {stats['pages_done']} of {stats['total_pages']} pages..."
+        )
+    render_statistics_metrics(stats)
+    
+    if stats["complete"]:
         # Display metadata
         st.subheader("Document Metadata")
         metadata_df = pd.DataFrame([stats["metadata"]])
         st.dataframe(metadata_df)
-        
-    except Exception as e:
-        st.error(f"Error analyzing PDF: {str(e)}") 
\ No newline at end of file
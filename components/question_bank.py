@@ -0,0 +1,452 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+from components.cache import CACHE_DIR
+from components.evaluation_cache import normalize_answer
+from components.llm import resolve_model
+from components.router import model_for
+from components.scheduler import bind_session, current_session_id
+from components.structured_output import invoke_structured
+from components.telemetry import collect_usage, generation_metadata, get_telemetry, traced
+from components.text_compaction import fit_to_budget
+
+QUESTION_BANK_DB = os.path.join(CACHE_DIR, "question_bank.sqlite3")
+
+# Questions per quiz, per generated batch, and the number of unseen questions
+# below which the bank of a user is topped up in the background
+QUIZ_SIZE = 3
+BANK_BATCH_SIZE = 12
+LOW_WATERMARK = 2 * QUIZ_SIZE
+
+# Earlier questions listed in a top-up prompt so the model does not repeat them
+MAX_AVOID_QUESTIONS = 40
+
+DIFFICULTIES = ("easy", "medium", "hard")
+
+BANK_PROMPT = """You are an expert at creating educational quizzes.
+            Create {count} multiple choice questions based on the given text, covering as many of its
+            topics as possible, with a mix of easy, medium and hard questions.
+            Each question should have 4 options (A, B, C, D) and only one correct answer.
+            The text is split into pages marked "--- Page N ---"; give the page each question is based on.
+            Format the response as a JSON object with the following structure:
+            {{
+                "questions": [
+                    {{
+                        "question": "question text",
+                        "options": ["A. option1", "B. option2", "C. option3", "D. option4"],
+                        "correct_answer": "A",
+                        "difficulty": "easy, medium or hard",
+                        "page": 1
+                    }},
+                    ...
+                ]
+            }}"""
+
+BANK_SCHEMA = {
+    "type": "object",
+    "required": ["questions"],
+    "properties": {
+        "questions": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["question", "options", "correct_answer", "difficulty"],
+                "properties": {
+                    "question": {"type": "string"},
+                    "options": {"type": "array", "minItems": 2, "items": {"type": "string"}},
+                    "correct_answer": {"type": "string", "enum": ["A", "B", "C", "D"]},
+                    "difficulty": {"type": "string", "enum": list(DIFFICULTIES)},
+                    "page": {"type": "integer"}
+                }
+            }
+        }
+    }
+}
+
+# Shared pool for background top-ups
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="question-bank")
+
+
+def make_bank_key(text: str) -> str:
+    """
+    Identify the question bank of a text.
+
+    The text is built from a document and page range, so every page range
+    of every document gets its own bank.
+
+    Args:
+        text: The text the questions are generated from
+
+    Returns:
+        Hex SHA-256 digest of the text
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class QuestionBank:
+    """
+    Persistent SQLite store of generated quiz questions per text.
+
+    Every question keeps the page it is based on and a difficulty tag. The
+    questions served to each user are recorded, so quizzes sampled for the
+    same user never repeat a question. Users are identified by the id the
+    caller passes; the app has no sign-in, so it uses the Streamlit session,
+    and the history starts over when the browser page is reloaded.
+    """
+
+    def __init__(self, path: str = QUESTION_BANK_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._filling: Dict[str, Future] = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """CREATE TABLE IF NOT EXISTS banks (
+                key TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY,
+                bank_key TEXT NOT NULL,
+                question_hash TEXT NOT NULL,
+                question TEXT NOT NULL,
+                difficulty TEXT,
+                page INTEGER,
+                metadata TEXT,
+                created_at REAL NOT NULL,
+                UNIQUE (bank_key, question_hash)
+            );
+            CREATE TABLE IF NOT EXISTS served (
+                user_id TEXT NOT NULL,
+                question_id INTEGER NOT NULL,
+                served_at REAL NOT NULL,
+                PRIMARY KEY (user_id, question_id)
+            );"""
+        )
+        self._conn.commit()
+
+    def register(self, bank_key: str, text: str, provider: str) -> None:
+        """Remember the text of a bank, so it can be topped up from its key alone."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO banks (key, text, provider, created_at) VALUES (?, ?, ?, ?)",
+                (bank_key, text, provider, time.time())
+            )
+            self._conn.commit()
+
+    def add(self, bank_key: str, questions: List[Dict[str, Any]], metadata: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Store generated questions, skipping questions already in the bank.
+
+        Args:
+            bank_key: Key from ``make_bank_key``
+            questions: Questions as returned for BANK_SCHEMA
+            metadata: Generation metadata stored with the questions
+
+        Returns:
+            Number of new questions
+        """
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                """INSERT OR IGNORE INTO questions
+                (bank_key, question_hash, question, difficulty, page, metadata, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                [
+                    (
+                        bank_key,
+                        hashlib.sha256(normalize_answer(question["question"]).encode("utf-8")).hexdigest(),
+                        json.dumps(question),
+                        question.get("difficulty"),
+                        question.get("page"),
+                        json.dumps(metadata or {}),
+                        now
+                    )
+                    for question in questions
+                ]
+            )
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def size(self, bank_key: str) -> int:
+        """Number of questions in a bank."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM questions WHERE bank_key = ?", (bank_key,)
+            ).fetchone()[0]
+
+    def remaining(self, bank_key: str, user_id: str) -> int:
+        """Number of questions of a bank the user has not been served yet."""
+        with self._lock:
+            return self._conn.execute(
+                """SELECT COUNT(*) FROM questions WHERE bank_key = ? AND id NOT IN (
+                    SELECT question_id FROM served WHERE user_id = ?
+                )""",
+                (bank_key, user_id)
+            ).fetchone()[0]
+
+    def sample(self, bank_key: str, user_id: str, count: int = QUIZ_SIZE,
+               difficulty: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Draw questions the user has not seen and mark them as served.
+
+        Args:
+            bank_key: Key from ``make_bank_key``
+            user_id: The user the quiz is for
+            count: Number of questions
+            difficulty: Only draw questions of this difficulty, or None for any
+
+        Returns:
+            Up to ``count`` questions with their "page" and "difficulty"
+        """
+        query = """SELECT id, question FROM questions WHERE bank_key = ? AND id NOT IN (
+            SELECT question_id FROM served WHERE user_id = ?
+        )"""
+        params: List[Any] = [bank_key, user_id]
+        if difficulty is not None:
+            query += " AND difficulty = ?"
+            params.append(difficulty)
+        query += " ORDER BY RANDOM() LIMIT ?"
+        params.append(count)
+
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO served (user_id, question_id, served_at) VALUES (?, ?, ?)",
+                [(user_id, question_id, now) for question_id, _ in rows]
+            )
+            self._conn.commit()
+        return [json.loads(question) for _, question in rows]
+
+    def questions(self, bank_key: str, limit: Optional[int] = None) -> List[str]:
+        """Texts of the most recent questions of a bank."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT question FROM questions WHERE bank_key = ? ORDER BY id DESC LIMIT ?",
+                (bank_key, -1 if limit is None else limit)
+            ).fetchall()
+        return [json.loads(row[0])["question"] for row in rows]
+
+    def fill(self, bank_key: str, count: int = BANK_BATCH_SIZE) -> int:
+        """
+        Generate a batch of questions for a registered bank.
+
+        Args:
+            bank_key: Key from ``make_bank_key``
+            count: Number of questions to ask for
+
+        Returns:
+            Number of new questions
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT text, provider FROM banks WHERE key = ?", (bank_key,)).fetchone()
+        if row is None:
+            raise ValueError(f"Question bank {bank_key} is not registered")
+        text, provider = row
+        questions, metadata = generate_bank_questions(
+            text, provider, count, avoid=self.questions(bank_key, MAX_AVOID_QUESTIONS)
+        )
+        added = self.add(bank_key, questions, metadata)
+        get_telemetry().increment("learnify_question_bank_questions_total", added)
+        return added
+
+    def fill_now(self, bank_key: str) -> int:
+        """
+        Fill a bank in the calling thread, e.g. for a quiz that is waiting.
+
+        A fill of the bank already running is waited for instead; a top-up
+        still queued behind the fills of other banks is taken over, so the
+        caller never waits for the background pool.
+
+        Args:
+            bank_key: Key from ``make_bank_key``
+
+        Returns:
+            Number of new questions
+        """
+        with self._lock:
+            future = self._filling.get(bank_key)
+            if future is not None and not future.done() and future.cancel():
+                future = None
+            owner = future is None or future.done()
+            if owner:
+                future = Future()
+                future.set_running_or_notify_cancel()
+                self._filling[bank_key] = future
+        if owner:
+            try:
+                future.set_result(self.fill(bank_key))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+    def top_up(self, bank_key: str) -> Future:
+        """
+        Fill a bank in the background, unless a fill is already running.
+
+        Args:
+            bank_key: Key from ``make_bank_key``
+
+        Returns:
+            The future of the running fill
+        """
+        with self._lock:
+            future = self._filling.get(bank_key)
+            if future is None or future.done():
+                future = _executor.submit(bind_session(self.fill), bank_key)
+                self._filling[bank_key] = future
+            return future
+
+
+@traced("question_bank.generate")
+def generate_bank_questions(text: str, provider: str = "openai", count: int = BANK_BATCH_SIZE,
+                            avoid: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Generate a batch of tagged quiz questions from the given text.
+
+    Args:
+        text: The text to generate questions from
+        provider: The LLM provider to use ("auto", "openai" or "groq")
+        count: Number of questions to ask for
+        avoid: Questions already in the bank, which must not be repeated
+
+    Returns:
+        Tuple of (questions, generation metadata)
+    """
+    try:
+        message = fit_to_budget(text, model_for(provider))
+        if avoid:
+            message += "\n\nDo not repeat any of these existing questions:\n" + "\n".join(f"- {q}" for q in avoid)
+        prompt = ChatPromptTemplate.from_messages([
+            SystemMessage(content=BANK_PROMPT.format(count=count)),
+            HumanMessage(content=message)
+        ])
+
+        start = time.perf_counter()
+        with collect_usage() as usage:
+            data, provider_used = invoke_structured(prompt, BANK_SCHEMA, provider)
+        metadata = generation_metadata(provider_used, resolve_model(provider_used), usage, time.perf_counter() - start)
+        return data["questions"], metadata
+
+    except Exception as e:
+        raise Exception(f"Error generating question bank: {str(e)}")
+
+
+_bank: Optional[QuestionBank] = None
+_bank_lock = threading.Lock()
+
+
+def get_question_bank() -> QuestionBank:
+    """
+    Get the process-wide question bank, creating it on first use.
+
+    Returns:
+        The shared QuestionBank instance
+    """
+    global _bank
+    with _bank_lock:
+        if _bank is None:
+            _bank = QuestionBank()
+        return _bank
+
+
+@traced("question_bank.sample")
+def sample_quiz_from_bank(bank_key: str, user_id: Optional[str] = None, size: int = QUIZ_SIZE,
+                          difficulty: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Sample a quiz from a registered question bank.
+
+    A bank the user has exhausted is filled before sampling; a bank running
+    low is topped up in the background.
+
+    Args:
+        bank_key: Key from ``make_bank_key``
+        user_id: The user the quiz is for, or None for the current session;
+            questions are only guaranteed not to repeat for the same id, so
+            pass a stable identity to keep the history across sessions
+        size: Number of questions
+        difficulty: Only use questions of this difficulty, or None for any
+
+    Returns:
+        Dictionary with the "questions" and their "correct_answer" under
+        "content", like the other generators
+    """
+    try:
+        bank = get_question_bank()
+        user_id = user_id or current_session_id()
+        start = time.perf_counter()
+
+        questions = bank.sample(bank_key, user_id, size, difficulty)
+        cached = len(questions) == size
+        if not cached:
+            # Fill in this thread, sharing a background top-up already running
+            try:
+                bank.fill_now(bank_key)
+            except Exception:
+                if not questions:
+                    raise
+            else:
+                questions += bank.sample(bank_key, user_id, size - len(questions), difficulty)
+        if not questions:
+            raise ValueError("The question bank has no new questions")
+
+        remaining = bank.remaining(bank_key, user_id)
+        if remaining < LOW_WATERMARK:
+            bank.top_up(bank_key)
+
+        return {
+            "type": "quiz",
+            "content": {"questions": questions},
+            "metadata": {
+                "provider": "question bank",
+                "model": "sampled",
+                "bank_key": bank_key,
+                "bank_size": bank.size(bank_key),
+                "remaining": remaining,
+                "latency_seconds": round(time.perf_counter() - start, 4),
+                "cached": cached
+            }
+        }
+
+    except Exception as e:
+        raise Exception(f"Error sampling quiz: {str(e)}")
+
+
+def sample_quiz(text: str, provider: str = "openai") -> Dict[str, Any]:
+    """
+    Get a quiz for the given text from its question bank.
+
+    The bank of the text is created on first use with one batch of
+    BANK_BATCH_SIZE questions, so later quizzes and retakes are sampled
+    without calling the model. Questions do not repeat within the current
+    session.
+
+    Args:
+        text: The text to generate questions from
+        provider: The LLM provider to use ("auto", "openai" or "groq")
+
+    Returns:
+        Dictionary containing the quiz questions and answers
+    """
+    bank_key = make_bank_key(text)
+    get_question_bank().register(bank_key, text, provider)
+    return sample_quiz_from_bank(bank_key)
@@ -0,0 +1,317 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from components.cache import CACHE_DIR
+from components.telemetry import traced
+
+QUIZ_RESULTS_DIR = os.path.join(CACHE_DIR, "quiz_results")
+
+# Share of correct answers above which a question counts as easy, and below
+# which it counts as hard
+EASY_THRESHOLD = 0.8
+HARD_THRESHOLD = 0.4
+
+RESPONSE_COLUMNS = [
+    "quiz_id", "submission_id", "user_id", "submitted_at",
+    "question_id", "question_index", "answer", "correct_answer"
+]
+
+
+def make_question_id(question: Dict[str, Any]) -> str:
+    """
+    Identify a question by its text, so it can be tracked across quizzes.
+
+    Args:
+        question: A quiz question with a "question" text
+
+    Returns:
+        Short hex digest of the question text
+    """
+    return hashlib.sha256(question["question"].strip().encode("utf-8")).hexdigest()[:16]
+
+
+def make_quiz_id(quiz_data: Dict[str, Any]) -> str:
+    """Identify a quiz by the ids of its questions."""
+    ids = "".join(make_question_id(question) for question in quiz_data["questions"])
+    return hashlib.sha256(ids.encode("utf-8")).hexdigest()[:16]
+
+
+def responses_frame(quiz_data: Dict[str, Any], submissions: List[Dict[str, Any]],
+                    quiz_id: Optional[str] = None) -> pd.DataFrame:
+    """
+    Build the long table of answers given to a quiz, one row per question per submission.
+
+    Args:
+        quiz_data: The quiz data containing questions and correct answers
+        submissions: List of {"user_id", "answers"} dictionaries, where
+            "answers" maps question index to the chosen letter; optional
+            "submission_id" and "submitted_at" are generated when missing
+        quiz_id: Id the responses are stored under, or None to derive it
+            from the questions
+
+    Returns:
+        DataFrame with the RESPONSE_COLUMNS; unanswered questions have an
+        empty answer
+    """
+    questions = quiz_data["questions"]
+    question_count = len(questions)
+    submission_count = len(submissions)
+    now = time.time()
+    batch_id = uuid.uuid4().hex
+
+    # String columns repeat a value per submission or per question, so they
+    # are built as categoricals from integer codes instead of one string per row
+    per_submission = np.repeat(np.arange(submission_count), question_count)
+    per_question = np.tile(np.arange(question_count), submission_count)
+
+    def expand(values: List[str], rows: np.ndarray) -> pd.Categorical:
+        codes, categories = pd.factorize(np.asarray(values, dtype=object))
+        return pd.Categorical.from_codes(codes[rows], categories=categories)
+
+    # Chosen letters of all submissions, coded in order of first appearance
+    letters: Dict[str, int] = {"": 0}
+    answer_codes = np.fromiter(
+        (letters.setdefault(submission["answers"].get(str(i), ""), len(letters))
+         for submission in submissions for i in range(question_count)),
+        dtype=np.int64, count=submission_count * question_count
+    )
+
+    return pd.DataFrame({
+        "quiz_id": expand([quiz_id or make_quiz_id(quiz_data)], np.zeros(len(per_question), dtype=np.int64)),
+        "submission_id": expand(
+            [submission.get("submission_id") or f"{batch_id}-{i}" for i, submission in enumerate(submissions)],
+            per_submission
+        ),
+        "user_id": expand([str(submission.get("user_id", "")) for submission in submissions], per_submission),
+        "submitted_at": np.repeat(
+            np.array([submission.get("submitted_at", now) for submission in submissions], dtype=float), question_count
+        ),
+        "question_id": expand([make_question_id(question) for question in questions], per_question),
+        "question_index": per_question,
+        "answer": pd.Categorical.from_codes(answer_codes, categories=list(letters)),
+        "correct_answer": expand([question["correct_answer"] for question in questions], per_question)
+    }, columns=RESPONSE_COLUMNS)
+
+
+def grade_responses(responses: pd.DataFrame) -> pd.DataFrame:
+    """
+    Mark every response as correct or not.
+
+    Args:
+        responses: Table from ``responses_frame`` or ``QuizResultStore.load``
+
+    Returns:
+        The responses with a boolean "correct" column
+    """
+    return responses.assign(correct=responses["answer"].to_numpy() == responses["correct_answer"].to_numpy())
+
+
+def score_submissions(graded: pd.DataFrame) -> pd.DataFrame:
+    """
+    Score every submission.
+
+    Args:
+        graded: Responses from ``grade_responses``
+
+    Returns:
+        DataFrame indexed by submission id with "user_id", "correct_answers",
+        "total_questions" and "percentage"
+    """
+    scores = graded.groupby("submission_id", sort=False).agg(
+        user_id=("user_id", "first"),
+        correct_answers=("correct", "sum"),
+        total_questions=("correct", "size")
+    )
+    scores["percentage"] = scores["correct_answers"] / scores["total_questions"] * 100
+    return scores
+
+
+@traced("quiz.grade")
+def grade_submissions(quiz_data: Dict[str, Any], submissions: List[Dict[str, Any]],
+                      quiz_id: Optional[str] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Grade the answers of many users to one quiz at once.
+
+    Args:
+        quiz_data: The quiz data containing questions and correct answers
+        submissions: List of {"user_id", "answers"} dictionaries
+        quiz_id: Id the responses are stored under, or None to derive it
+
+    Returns:
+        Tuple of (graded responses, scores per submission)
+    """
+    graded = grade_responses(responses_frame(quiz_data, submissions, quiz_id))
+    return graded, score_submissions(graded)
+
+
+def question_statistics(graded: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compute how difficult and how discriminating every question is.
+
+    The discrimination is the correlation between answering a question
+    correctly and the score on the other questions of the same submission.
+
+    Args:
+        graded: Responses from ``grade_responses``
+
+    Returns:
+        DataFrame indexed by question id with "attempts", "p_correct",
+        "difficulty" ("easy", "medium" or "hard") and "discrimination"
+    """
+    correct = graded["correct"].astype(float)
+    rest = graded.groupby("submission_id")["correct"].transform("sum").astype(float) - correct
+    sums = pd.DataFrame({
+        "question_id": graded["question_id"],
+        "x": correct,
+        "y": rest,
+        "xy": correct * rest,
+        "xx": correct * correct,
+        "yy": rest * rest
+    }).groupby("question_id").agg(["sum", "count"])
+
+    n = sums[("x", "count")]
+    mean_x = sums[("x", "sum")] / n
+    mean_y = sums[("y", "sum")] / n
+    covariance = sums[("xy", "sum")] / n - mean_x * mean_y
+    variance_x = sums[("xx", "sum")] / n - mean_x ** 2
+    variance_y = sums[("yy", "sum")] / n - mean_y ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        discrimination = covariance / np.sqrt(variance_x * variance_y)
+
+    statistics = pd.DataFrame({
+        "attempts": n.astype(int),
+        "p_correct": mean_x,
+        "discrimination": discrimination.replace([np.inf, -np.inf], np.nan)
+    })
+    statistics["difficulty"] = np.select(
+        [statistics["p_correct"] >= EASY_THRESHOLD, statistics["p_correct"] < HARD_THRESHOLD],
+        ["easy", "hard"],
+        default="medium"
+    )
+    return statistics[["attempts", "p_correct", "difficulty", "discrimination"]]
+
+
+def distractor_rates(graded: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compute how often every option of every question was chosen.
+
+    Args:
+        graded: Responses from ``grade_responses``
+
+    Returns:
+        DataFrame indexed by question id with one column per option letter
+        (and "" for unanswered) holding the share of submissions choosing it
+    """
+    return pd.crosstab(graded["question_id"], graded["answer"], normalize="index")
+
+
+def score_distribution(scores: pd.DataFrame, bins: int = 10) -> Dict[str, Any]:
+    """
+    Summarize the distribution of submission scores.
+
+    Args:
+        scores: Scores from ``score_submissions``
+        bins: Number of equal-width bins between 0 and 100 percent
+
+    Returns:
+        Dictionary with a "histogram" DataFrame of "bin" and "count", and the
+        "count", "mean", "median", "std", "p10" and "p90" of the percentages
+    """
+    percentages = scores["percentage"].to_numpy(dtype=float)
+    counts, edges = np.histogram(percentages, bins=bins, range=(0, 100))
+    histogram = pd.DataFrame({
+        "bin": [f"{edges[i]:.0f}-{edges[i + 1]:.0f}%" for i in range(bins)],
+        "count": counts
+    })
+    if not len(percentages):
+        return {"histogram": histogram, "count": 0}
+    p10, median, p90 = np.percentile(percentages, [10, 50, 90])
+    return {
+        "histogram": histogram,
+        "count": int(len(percentages)),
+        "mean": float(percentages.mean()),
+        "median": float(median),
+        "std": float(percentages.std()),
+        "p10": float(p10),
+        "p90": float(p90)
+    }
+
+
+class QuizResultStore:
+    """
+    Columnar on-disk store of quiz responses.
+
+    Responses are appended as Parquet files partitioned by quiz id, so
+    aggregate queries read only the columns and quizzes they need.
+    """
+
+    def __init__(self, root: str = QUIZ_RESULTS_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def save(self, responses: pd.DataFrame) -> None:
+        """
+        Append responses to the store.
+
+        Args:
+            responses: Table from ``responses_frame``; a "correct" column is
+                not stored, it is recomputed when grading
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise Exception("Storing quiz results requires pyarrow")
+        table = pa.Table.from_pandas(responses[RESPONSE_COLUMNS], preserve_index=False)
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            pq.write_to_dataset(
+                table, self.root, partition_cols=["quiz_id"],
+                basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet"
+            )
+
+    def load(self, quiz_id: Optional[str] = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Read stored responses.
+
+        Args:
+            quiz_id: Only read the responses of this quiz, or None for all
+            columns: Only read these columns, or None for all
+
+        Returns:
+            DataFrame of responses, empty if nothing was stored yet
+        """
+        if quiz_id is not None and not os.path.isdir(os.path.join(self.root, f"quiz_id={quiz_id}")):
+            return pd.DataFrame(columns=columns or RESPONSE_COLUMNS)
+        if not os.path.isdir(self.root) or not os.listdir(self.root):
+            return pd.DataFrame(columns=columns or RESPONSE_COLUMNS)
+        filters = [("quiz_id", "==", quiz_id)] if quiz_id is not None else None
+        responses = pd.read_parquet(self.root, columns=columns, filters=filters)
+        if "quiz_id" in responses:
+            responses["quiz_id"] = responses["quiz_id"].astype(str)
+        return responses
+
+
+_store: Optional[QuizResultStore] = None
+_store_lock = threading.Lock()
+
+
+def get_quiz_result_store() -> QuizResultStore:
+    """
+    Get the process-wide quiz result store, creating it on first use.
+
+    Returns:
+        The shared QuizResultStore instance
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = QuizResultStore()
+        return _store
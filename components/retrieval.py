@@ -0,0 +1,220 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from components.cache import CACHE_DIR
+from components.page_ranges import PageRangeSpec
+from components.page_store import MAX_DOCUMENTS
+from components.pdf_extractor import get_page_texts
+from components.telemetry import traced
+
+# Passages are windows of about this many words within a page
+PASSAGE_WORDS = 180
+
+# Default number of passages pulled into a prompt
+DEFAULT_TOP_K = 8
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+INDEX_DIR = os.path.join(CACHE_DIR, "indexes")
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most
+my myself no nor not now of off on once only or other our ours ourselves out over own same she should
+so some such than that the their theirs them themselves then there these they this those through to
+too under until up very was we were what when where which while who whom why will with would you your
+yours yourself yourselves also may might must shall use used using one two however thus therefore
+""".split())
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase index terms without stopwords.
+
+    Args:
+        text: The text to tokenize
+
+    Returns:
+        List of terms
+    """
+    return [term for term in WORD_PATTERN.findall(text.lower()) if len(term) > 1 and term not in STOPWORDS]
+
+
+def split_passages(page_texts: Dict[int, str], passage_words: int = PASSAGE_WORDS) -> List[Dict[str, Any]]:
+    """
+    Split page texts into passages of about ``passage_words`` words.
+
+    Args:
+        page_texts: Dictionary mapping page number to page text
+        passage_words: Target passage length in words
+
+    Returns:
+        List of {"page", "text"} passages in page order
+    """
+    passages = []
+    for page_number in sorted(page_texts):
+        words = page_texts[page_number].split()
+        for start in range(0, len(words), passage_words):
+            passages.append({"page": page_number, "text": " ".join(words[start:start + passage_words])})
+    return passages
+
+
+class BM25Index:
+    """Okapi BM25 index over the passages of one document."""
+
+    def __init__(self, passages: List[Dict[str, Any]]):
+        self.passages = passages
+        self.term_counts = [Counter(tokenize(passage["text"])) for passage in passages]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        self.document_frequency = Counter()
+        for counts in self.term_counts:
+            self.document_frequency.update(counts.keys())
+
+    def idf(self, term: str) -> float:
+        """Inverse document frequency of a term."""
+        frequency = self.document_frequency.get(term, 0)
+        return math.log(1 + (len(self.passages) - frequency + 0.5) / (frequency + 0.5))
+
+    def score(self, index: int, query_terms: Iterable[str]) -> float:
+        """BM25 score of one passage for the query terms."""
+        counts = self.term_counts[index]
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[index] / (self.average_length or 1))
+        total = 0.0
+        for term in query_terms:
+            frequency = counts.get(term)
+            if frequency:
+                total += self.idf(term) * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return total
+
+    def key_terms(self, indexes: List[int], count: int = 20) -> List[str]:
+        """
+        Most characteristic terms of a set of passages by TF-IDF.
+
+        Args:
+            indexes: Passage indexes to consider
+            count: Number of terms to return
+
+        Returns:
+            List of terms, most characteristic first
+        """
+        frequency = Counter()
+        for index in indexes:
+            frequency.update(self.term_counts[index])
+        weighted = {term: tf * self.idf(term) for term, tf in frequency.items()}
+        return sorted(weighted, key=weighted.get, reverse=True)[:count]
+
+    def search(self, query: Optional[str] = None, k: int = DEFAULT_TOP_K,
+               pages: Optional[Iterable[int]] = None) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Find the passages most relevant to a query.
+
+        Without a query, the key terms of the candidate passages are used, which
+        favours passages covering the central topics of the pages.
+
+        Args:
+            query: Free-text query, or None to use the key terms
+            k: Number of passages to return
+            pages: Restrict the search to these page numbers
+
+        Returns:
+            List of at most ``k`` (score, passage) pairs, best first; passages
+            sharing no term with the query are left out
+        """
+        if pages is None or isinstance(pages, PageRangeSpec):
+            page_set = pages
+        else:
+            page_set = set(pages)
+        candidates = [
+            index for index, passage in enumerate(self.passages)
+            if page_set is None or passage["page"] in page_set
+        ]
+        query_terms = tokenize(query) if query else self.key_terms(candidates)
+        scored = [(self.score(index, query_terms), self.passages[index]) for index in candidates]
+        scored = [(score, passage) for score, passage in scored if score > 0]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored[:k]
+
+    def save(self, path: str) -> None:
+        """Save the passages of the index as JSON."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump({"passages": self.passages}, f)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Load an index saved with ``save``."""
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)["passages"])
+
+
+# Indexes kept in memory, least recently used first; like the page store,
+# only MAX_DOCUMENTS documents are kept
+_indexes: "OrderedDict[str, BM25Index]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+@traced("retrieval.index")
+def get_document_index(doc_hash: str) -> BM25Index:
+    """
+    Get the retrieval index of a document, building and saving it on first use.
+
+    The least recently used indexes are dropped from memory beyond
+    MAX_DOCUMENTS; they are loaded again from disk when needed.
+
+    Args:
+        doc_hash: Hash of the document in the document store
+
+    Returns:
+        The BM25Index of the whole document
+    """
+    with _indexes_lock:
+        if doc_hash in _indexes:
+            _indexes.move_to_end(doc_hash)
+            return _indexes[doc_hash]
+
+    path = os.path.join(INDEX_DIR, f"{doc_hash}.json")
+    if os.path.exists(path):
+        index = BM25Index.load(path)
+    else:
+        index = BM25Index(split_passages(get_page_texts(doc_hash)))
+        index.save(path)
+
+    with _indexes_lock:
+        index = _indexes.setdefault(doc_hash, index)
+        _indexes.move_to_end(doc_hash)
+        while len(_indexes) > MAX_DOCUMENTS:
+            _indexes.popitem(last=False)
+        return index
+
+
+@traced("retrieval.build_context")
+def build_context(doc_hash: str, page_numbers: Optional[Iterable[int]] = None,
+                  query: Optional[str] = None, k: int = DEFAULT_TOP_K) -> str:
+    """
+    Build a compact prompt context from the most relevant passages.
+
+    Args:
+        doc_hash: Hash of the document in the document store
+        page_numbers: Restrict retrieval to these page numbers
+        query: Free-text query, or None to pick passages covering the key terms
+        k: Number of passages to include
+
+    Returns:
+        The selected passages in page order, with "--- Page N ---" markers
+    """
+    results = get_document_index(doc_hash).search(query, k, page_numbers)
+    passages = sorted((passage for _, passage in results), key=lambda passage: passage["page"])
+    return "\n\n".join(f"--- Page {passage['page']} ---\n{passage['text']}" for passage in passages)
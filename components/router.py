@@ -0,0 +1,384 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from components.llm import get_api_key, get_llm, resolve_model
+from components.scheduler import LLMScheduler, bind_session, current_session_id, estimate_prompt_tokens, get_scheduler
+from components.telemetry import record_llm_call, span
+
+# Providers the router can choose from, in order of preference for ties
+PROVIDERS = ["openai", "groq"]
+
+# Routing defaults
+HEDGE_DELAY_SECONDS = 8.0
+TIMEOUT_SECONDS = 90.0
+# How often calls still queued by the scheduler are checked for having started
+POLL_SECONDS = 0.25
+DEFAULT_LATENCY_SECONDS = 5.0
+EWMA_ALPHA = 0.2
+
+# HTTP status codes worth retrying on another provider
+RETRIABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def is_retriable_error(error: Exception) -> bool:
+    """
+    Check whether an error is a timeout, rate limit or transient server error.
+
+    Args:
+        error: The exception raised by an LLM call
+
+    Returns:
+        True if another provider should be tried
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if status_code in RETRIABLE_STATUS_CODES:
+        return True
+    name = type(error).__name__
+    return any(marker in name for marker in ("RateLimit", "Timeout", "Connection", "Overloaded"))
+
+
+def run_in_thread(func: Callable[..., Any], *args: Any) -> Future:
+    """
+    Run a function in a new daemon thread.
+
+    Router calls mostly wait in the scheduler queue, so each gets its own
+    thread; a fixed pool in front of the queue would admit calls in pool
+    order instead of the scheduler's fair order across sessions.
+
+    Args:
+        func: The function to run
+        *args: Arguments passed to ``func``
+
+    Returns:
+        Future of the result of ``func``
+    """
+    future: Future = Future()
+
+    def target():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=target, name="llm-router", daemon=True).start()
+    return future
+
+
+class Attempt:
+    """One provider call made for a routed request."""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        # Set once the scheduler admits the call and the provider call starts
+        self.started_at: Optional[float] = None
+        self.cancelled = threading.Event()
+        self.timed_out = False
+
+
+class ProviderStats:
+    """Exponentially weighted latency and error rate of one provider."""
+
+    def __init__(self, alpha: float = EWMA_ALPHA):
+        self.alpha = alpha
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def record(self, latency: float, success: bool) -> None:
+        """
+        Record the outcome of one call.
+
+        Args:
+            latency: Call duration in seconds
+            success: Whether the call succeeded
+        """
+        self.requests += 1
+        if not success:
+            self.failures += 1
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.alpha * (latency - self.latency)
+        self.error_rate += self.alpha * ((0.0 if success else 1.0) - self.error_rate)
+
+    def score(self) -> float:
+        """Expected cost of a call; lower is better."""
+        latency = self.latency if self.latency is not None else DEFAULT_LATENCY_SECONDS
+        return latency * (1 + 4 * self.error_rate)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "latency": self.latency,
+            "error_rate": self.error_rate,
+            "requests": self.requests,
+            "failures": self.failures
+        }
+
+
+class ProviderRouter:
+    """
+    Route LLM calls between providers by observed latency and error rate.
+
+    A call goes to the best-ranked provider first. If it has not answered after
+    ``hedge_delay`` seconds, the same request is also sent to the next provider
+    and the first successful answer wins. Timeouts, rate limits and transient
+    server errors fail over to the next provider. Every call is admitted by
+    the scheduler, which enforces the provider rate limits; the hedge and
+    timeout clocks start when a call is admitted, so time spent queued
+    neither triggers hedges nor counts against a provider.
+    """
+
+    def __init__(self, providers: Optional[List[str]] = None,
+                 llm_factory: Callable[..., Any] = get_llm,
+                 hedge_delay: Optional[float] = HEDGE_DELAY_SECONDS,
+                 timeout: float = TIMEOUT_SECONDS,
+                 scheduler: Optional[LLMScheduler] = None):
+        self.providers = providers
+        self.llm_factory = llm_factory
+        self.scheduler = scheduler
+        self.hedge_delay = hedge_delay
+        self.timeout = timeout
+        self.stats: Dict[str, ProviderStats] = {}
+        self._lock = threading.Lock()
+
+    def available_providers(self) -> List[str]:
+        """Providers configured for this router, by default those with an API key."""
+        if self.providers is not None:
+            return list(self.providers)
+        available = []
+        for provider in PROVIDERS:
+            try:
+                get_api_key(provider)
+                available.append(provider)
+            except Exception:
+                continue
+        return available
+
+    def rank(self, provider: str = "auto") -> List[str]:
+        """
+        Order the providers to try for a request.
+
+        Args:
+            provider: "auto" to rank by observed performance, or a provider
+                name to try first; a provider without an API key is skipped
+                and the request fails over to the others
+
+        Returns:
+            Provider names in the order they should be tried
+        """
+        providers = self.available_providers()
+        with self._lock:
+            ranked = sorted(
+                providers,
+                key=lambda name: (self.stats.setdefault(name, ProviderStats()).score(), providers.index(name))
+            )
+        if provider in providers:
+            ranked = [provider] + [name for name in ranked if name != provider]
+        if not ranked:
+            raise Exception("No LLM provider is configured in secrets.toml")
+        return ranked
+
+    def record(self, provider: str, latency: float, success: bool) -> None:
+        """Record the outcome of a call made outside ``invoke``, e.g. a stream."""
+        with self._lock:
+            self.stats.setdefault(provider, ProviderStats()).record(latency, success)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Current statistics of every provider."""
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+    def get_llm(self, provider: str, models: Optional[Dict[str, str]] = None, **llm_kwargs: Any) -> Any:
+        """Build the LLM of a provider with the model configured for it."""
+        model = (models or {}).get(provider)
+        return self.llm_factory(provider, model, **llm_kwargs)
+
+    def _call(self, attempt: Attempt, prompt: Any, models: Optional[Dict[str, str]],
+              llm_kwargs: Dict[str, Any], session_id: str) -> Any:
+        provider = attempt.provider
+        llm = self.get_llm(provider, models, **llm_kwargs)
+        model = getattr(llm, "model_name", None) or (models or {}).get(provider) or provider
+
+        def call():
+            # Measure the provider latency only, not the time spent queued
+            with span("llm.call", provider=provider, model=model):
+                start = time.monotonic()
+                if attempt.started_at is None:
+                    attempt.started_at = start
+                try:
+                    response = (prompt | llm).invoke({})
+                except Exception:
+                    if not attempt.timed_out:
+                        self.record(provider, time.monotonic() - start, False)
+                    raise
+                latency = time.monotonic() - start
+                # A call the router gave up on was already recorded as timed out
+                if not attempt.timed_out:
+                    self.record(provider, latency, True)
+                record_llm_call(provider, model, response, latency)
+                return response
+
+        scheduler = self.scheduler or get_scheduler()
+        return scheduler.run(provider, call, estimate_prompt_tokens(prompt), session_id, attempt.cancelled)
+
+    def invoke(self, prompt: Any, provider: str = "auto",
+               models: Optional[Dict[str, str]] = None, **llm_kwargs: Any) -> Tuple[Any, str]:
+        """
+        Invoke a prompt on the best available provider.
+
+        Calls that are still queued when the request is answered or fails are
+        withdrawn from the scheduler, so they do not use the rate limits.
+
+        Args:
+            prompt: A prompt runnable taking no input variables
+            provider: "auto" or the provider to try first
+            models: Optional model name per provider
+            **llm_kwargs: Extra settings passed to the LLM factory
+
+        Returns:
+            Tuple of (model response, provider that produced it)
+        """
+        candidates = self.rank(provider)
+        session_id = current_session_id()
+        scheduler = self.scheduler or get_scheduler()
+        pending: Dict[Future, Attempt] = {}
+        errors = []
+        launched = 0
+
+        def launch():
+            nonlocal launched
+            attempt = Attempt(candidates[launched])
+            launched += 1
+            pending[run_in_thread(
+                bind_session(self._call), attempt, prompt, models, llm_kwargs, session_id
+            )] = attempt
+
+        try:
+            launch()
+            while pending:
+                # Hedge and timeout clocks run from the start of the provider calls
+                now = time.monotonic()
+                attempts = list(pending.values())
+                started = [attempt.started_at for attempt in attempts if attempt.started_at is not None]
+                newest = attempts[-1]
+                can_hedge = launched < len(candidates) and self.hedge_delay is not None
+                waits = [POLL_SECONDS] if len(started) < len(attempts) else []
+                if started:
+                    waits.append(min(started) + self.timeout - now)
+                if can_hedge and newest.started_at is not None:
+                    waits.append(newest.started_at + self.hedge_delay - now)
+                done, _ = wait(pending, timeout=max(0.0, min(waits)), return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    attempt = pending.pop(future)
+                    try:
+                        return future.result(), attempt.provider
+                    except Exception as e:
+                        errors.append(f"{attempt.provider}: {str(e)}")
+                        if is_retriable_error(e) and launched < len(candidates):
+                            launch()
+                        elif not pending and len(errors) == 1:
+                            raise
+                if done:
+                    continue
+
+                now = time.monotonic()
+                timed_out = [
+                    future for future, attempt in pending.items()
+                    if attempt.started_at is not None and now - attempt.started_at >= self.timeout
+                ]
+                if timed_out:
+                    # Give up on the slow providers and fail over if possible
+                    for future in timed_out:
+                        attempt = pending.pop(future)
+                        attempt.timed_out = True
+                        scheduler.cancel(attempt.cancelled)
+                        self.record(attempt.provider, self.timeout, False)
+                        errors.append(f"{attempt.provider}: timed out after {self.timeout:g}s")
+                    if launched < len(candidates):
+                        launch()
+                elif can_hedge and newest.started_at is not None and now - newest.started_at >= self.hedge_delay:
+                    # Hedge the slow request on the next provider
+                    launch()
+        finally:
+            for attempt in pending.values():
+                scheduler.cancel(attempt.cancelled)
+
+        raise Exception(f"All LLM providers failed: {'; '.join(errors)}")
+
+
+_router: Optional[ProviderRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ProviderRouter:
+    """
+    Get the process-wide provider router.
+
+    Returns:
+        The shared ProviderRouter instance
+    """
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ProviderRouter()
+        return _router
+
+
+def set_router(router: ProviderRouter) -> None:
+    """
+    Replace the process-wide router, e.g. with one using fake chat models.
+
+    Args:
+        router: The router to use from now on
+    """
+    global _router
+    with _router_lock:
+        _router = router
+
+
+def model_for(provider: str, models: Optional[Dict[str, str]] = None) -> str:
+    """
+    Get the model name a provider uses for a request, or "auto" when routed.
+
+    Args:
+        provider: "auto" or a provider name
+        models: Optional model name per provider
+
+    Returns:
+        The model name used to identify the request
+    """
+    if provider == "auto":
+        return "auto"
+    return resolve_model(provider, (models or {}).get(provider))
+
+
+
+def cached_as(provider: str, provider_used: str, models: Optional[Dict[str, str]] = None) -> Tuple[str, str]:
+    """
+    Get the provider and model a routed result is cached under.
+
+    Routed ("auto") requests are cached as a whole. A result requested from a
+    specific provider is cached under the provider that answered, so an
+    answer from a failover is never served as the requested provider's.
+
+    Args:
+        provider: "auto" or the provider the request asked for
+        provider_used: The provider that produced the result
+        models: Optional model name per provider
+
+    Returns:
+        Tuple of (provider, model) to pass to ``make_cache_key``
+    """
+    if provider == "auto":
+        return "auto", "auto"
+    return provider_used, model_for(provider_used, models)
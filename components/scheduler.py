@@ -0,0 +1,372 @@
+import contextlib
+import contextvars
+import functools
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+# Requests and tokens per minute allowed for each provider
+DEFAULT_LIMITS = {
+    "openai": {"rpm": 500, "tpm": 200000},
+    "groq": {"rpm": 30, "tpm": 15000},
+}
+
+# Completion tokens assumed for a request when reserving the token budget
+DEFAULT_COMPLETION_TOKENS = 1000
+
+# Retry settings for rate-limited requests
+MAX_RETRIES = 3
+BASE_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+
+# Number of recent wait times kept for the metrics
+WAIT_SAMPLES = 1000
+
+WINDOW_SECONDS = 60.0
+
+_session_id: contextvars.ContextVar = contextvars.ContextVar("llm_session_id", default=None)
+
+
+def current_session_id() -> str:
+    """
+    Identify the session an LLM call is made for.
+
+    Uses the session bound with ``bind_session`` or, in the Streamlit script
+    thread, the Streamlit session id.
+
+    Returns:
+        The session id, or "default" outside of any session
+    """
+    session_id = _session_id.get()
+    if session_id is not None:
+        return session_id
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        ctx = None
+    return ctx.session_id if ctx is not None else "default"
+
+
+@contextlib.contextmanager
+def use_session(session_id: Optional[str]) -> Iterator[None]:
+    """
+    Make calls on behalf of another session, e.g. in a job worker.
+
+    Args:
+        session_id: The session the calls are made for, or None to keep the
+            current one
+    """
+    token = _session_id.set(session_id) if session_id else None
+    try:
+        yield
+    finally:
+        if token is not None:
+            _session_id.reset(token)
+
+
+def bind_session(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Bind a function to the current session so it keeps it in worker threads.
+
+    The other context variables of the caller, such as the telemetry span and
+    usage collectors, are carried over as well.
+
+    Args:
+        func: The function to run later, possibly in another thread
+
+    Returns:
+        A wrapper running ``func`` with the caller's session id
+    """
+    context = contextvars.copy_context()
+    context.run(_session_id.set, current_session_id())
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # Every call gets its own copy, so the wrapper can run in several threads at once
+        return context.copy().run(func, *args, **kwargs)
+
+    return wrapper
+
+
+def estimate_prompt_tokens(prompt: Any, completion_tokens: int = DEFAULT_COMPLETION_TOKENS) -> int:
+    """
+    Estimate the tokens a prompt will use, including the expected completion.
+
+    Args:
+        prompt: A prompt template taking no input variables
+        completion_tokens: Tokens reserved for the completion
+
+    Returns:
+        Estimated total token count
+    """
+    try:
+        characters = sum(len(str(message.content)) for message in prompt.format_messages())
+    except Exception:
+        characters = 0
+    return characters // 4 + completion_tokens
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    Check whether an error means the provider rate limit was hit.
+
+    Args:
+        error: The exception raised by an LLM call
+
+    Returns:
+        True for HTTP 429 and rate limit errors
+    """
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code == 429 or "RateLimit" in type(error).__name__
+
+
+class SlidingWindowBudget:
+    """Requests and tokens admitted during the last minute for one provider."""
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._admitted: Deque[Tuple[float, int]] = deque()
+        self._tokens = 0
+
+    def _expire(self, now: float) -> None:
+        while self._admitted and now - self._admitted[0][0] >= WINDOW_SECONDS:
+            self._tokens -= self._admitted.popleft()[1]
+
+    def wait_time(self, tokens: int, now: float) -> float:
+        """
+        Seconds until a request of ``tokens`` tokens fits the budget.
+
+        A request larger than the whole token budget is admitted once the
+        window is empty.
+        """
+        self._expire(now)
+        waits = [0.0]
+        if len(self._admitted) >= self.rpm:
+            waits.append(self._admitted[len(self._admitted) - self.rpm][0] + WINDOW_SECONDS - now)
+        if self._admitted and self._tokens + tokens > self.tpm:
+            released = self._tokens
+            for admitted_at, admitted_tokens in self._admitted:
+                released -= admitted_tokens
+                if released + tokens <= self.tpm or released == 0:
+                    waits.append(admitted_at + WINDOW_SECONDS - now)
+                    break
+        return max(waits)
+
+    def admit(self, tokens: int, now: float) -> None:
+        """Record an admitted request."""
+        self._admitted.append((now, tokens))
+        self._tokens += tokens
+
+
+class LLMScheduler:
+    """
+    Process-wide admission control for LLM calls.
+
+    Every provider has requests-per-minute and tokens-per-minute budgets.
+    Waiting calls are queued per session and admitted round-robin across
+    sessions, so one busy session cannot starve the others. Rate-limited
+    calls are retried with jittered exponential backoff.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Dict[str, int]]] = None,
+                 max_retries: int = MAX_RETRIES,
+                 base_backoff: float = BASE_BACKOFF_SECONDS,
+                 max_backoff: float = MAX_BACKOFF_SECONDS):
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._budgets: Dict[str, SlidingWindowBudget] = {}
+        self._queues: Dict[str, Dict[str, Deque[object]]] = {}
+        self._rotation: Dict[str, Deque[str]] = {}
+        self._condition = threading.Condition()
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self._admitted = 0
+        self._retries = 0
+
+    def _budget(self, provider: str) -> SlidingWindowBudget:
+        if provider not in self._budgets:
+            limits = self.limits.get(provider, {})
+            self._budgets[provider] = SlidingWindowBudget(
+                limits.get("rpm", float("inf")), limits.get("tpm", float("inf"))
+            )
+        return self._budgets[provider]
+
+    def _head(self, provider: str) -> Optional[object]:
+        """The ticket that is next in line for a provider."""
+        rotation = self._rotation.get(provider)
+        if not rotation:
+            return None
+        return self._queues[provider][rotation[0]][0]
+
+    def acquire(self, provider: str, tokens: int, session_id: Optional[str] = None,
+                cancelled: Optional[threading.Event] = None) -> float:
+        """
+        Block until a call fits the provider budget and it is this session's turn.
+
+        Args:
+            provider: The provider the call goes to
+            tokens: Estimated tokens of the call
+            session_id: Session making the call (defaults to the current one)
+            cancelled: Event that withdraws the call from the queue when set
+                with ``cancel``
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            CancelledError: If the call was cancelled before it was admitted
+        """
+        session_id = session_id or current_session_id()
+        ticket = object()
+        start = time.monotonic()
+
+        with self._condition:
+            queues = self._queues.setdefault(provider, {})
+            rotation = self._rotation.setdefault(provider, deque())
+            if session_id not in queues:
+                queues[session_id] = deque()
+                rotation.append(session_id)
+            queues[session_id].append(ticket)
+
+            budget = self._budget(provider)
+            while True:
+                if cancelled is not None and cancelled.is_set():
+                    # Leave the queue without using any of the budget
+                    queues[session_id].remove(ticket)
+                    if not queues[session_id]:
+                        del queues[session_id]
+                        rotation.remove(session_id)
+                    self._condition.notify_all()
+                    raise CancelledError()
+                now = time.monotonic()
+                if self._head(provider) is ticket:
+                    delay = budget.wait_time(tokens, now)
+                    if delay <= 0:
+                        break
+                    self._condition.wait(timeout=delay)
+                else:
+                    self._condition.wait()
+
+            # Admit the call and move its session to the back of the rotation
+            budget.admit(tokens, now)
+            queues[session_id].popleft()
+            rotation.popleft()
+            if queues[session_id]:
+                rotation.append(session_id)
+            else:
+                del queues[session_id]
+
+            waited = now - start
+            self._waits.append(waited)
+            self._admitted += 1
+            self._condition.notify_all()
+        return waited
+
+    def cancel(self, cancelled: threading.Event) -> None:
+        """
+        Withdraw the calls waiting with an event from the queue.
+
+        Calls already admitted are not interrupted, but are not retried.
+
+        Args:
+            cancelled: The event passed to ``acquire`` or ``run``
+        """
+        with self._condition:
+            cancelled.set()
+            self._condition.notify_all()
+
+    def run(self, provider: str, func: Callable[[], Any], tokens: int,
+            session_id: Optional[str] = None, cancelled: Optional[threading.Event] = None) -> Any:
+        """
+        Run an LLM call once it is admitted, retrying when rate limited.
+
+        Args:
+            provider: The provider the call goes to
+            func: Function making the call
+            tokens: Estimated tokens of the call
+            session_id: Session making the call (defaults to the current one)
+            cancelled: Event that withdraws the call when set with ``cancel``
+
+        Returns:
+            The result of ``func``
+
+        Raises:
+            CancelledError: If the call was cancelled before it was admitted
+        """
+        session_id = session_id or current_session_id()
+        for attempt in range(self.max_retries + 1):
+            self.acquire(provider, tokens, session_id, cancelled)
+            try:
+                return func()
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                with self._condition:
+                    self._retries += 1
+                # Full jitter keeps retries from many sessions from synchronizing
+                backoff = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+                if cancelled is None:
+                    time.sleep(backoff)
+                elif cancelled.wait(backoff):
+                    raise CancelledError()
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get queue and wait-time metrics.
+
+        Returns:
+            Dictionary with queue depth per provider, admitted calls, retries
+            and wait-time statistics in seconds
+        """
+        with self._condition:
+            waits: List[float] = sorted(self._waits)
+            queue_depth = {
+                provider: sum(len(queue) for queue in queues.values())
+                for provider, queues in self._queues.items()
+            }
+            admitted = self._admitted
+            retries = self._retries
+        return {
+            "queue_depth": queue_depth,
+            "admitted": admitted,
+            "retries": retries,
+            "wait_avg": sum(waits) / len(waits) if waits else 0.0,
+            "wait_p95": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+            "wait_max": waits[-1] if waits else 0.0
+        }
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """
+    Get the process-wide LLM scheduler.
+
+    Limits can be overridden per provider in secrets.toml, e.g.
+    ``[rate_limits.openai]`` with ``rpm`` and ``tpm`` keys.
+
+    Returns:
+        The shared LLMScheduler instance
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            limits = {provider: dict(values) for provider, values in DEFAULT_LIMITS.items()}
+            try:
+                import streamlit as st
+                for provider, values in st.secrets.get("rate_limits", {}).items():
+                    limits.setdefault(provider, {}).update(values)
+            except Exception:
+                pass
+            _scheduler = LLMScheduler(limits)
+        return _scheduler
@@ -0,0 +1,176 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+from components.router import get_router
+from components.telemetry import span
+
+# Providers whose chat models support JSON mode via response_format
+JSON_MODE_PROVIDERS = {"openai", "groq"}
+
+REPAIR_PROMPT = """You fix malformed JSON. You will receive a JSON schema, a validation error and a
+            broken model output. Return only the corrected JSON object matching the schema, keeping
+            the original content. Do not add explanations or code fences."""
+
+CODE_FENCE = re.compile(r"^\s*```[a-zA-Z0-9_-]*\s*\n?|\n?\s*```\s*$")
+TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+}
+
+
+class StructuredOutputError(ValueError):
+    """Raised when model output cannot be parsed into the expected structure."""
+
+
+def validate(value: Any, schema: Dict[str, Any], path: str = "$") -> Any:
+    """
+    Validate a value against a JSON schema subset, coercing numeric strings.
+
+    Supports "type", "properties", "required", "items", "minItems", "enum",
+    "minimum" and "maximum".
+
+    Args:
+        value: The parsed JSON value
+        schema: The JSON schema
+        path: Location of the value, used in error messages
+
+    Returns:
+        The validated value, with numeric strings converted to numbers
+
+    Raises:
+        StructuredOutputError: If the value does not match the schema
+    """
+    expected = schema.get("type")
+    if expected in ("number", "integer"):
+        if isinstance(value, str):
+            try:
+                value = float(value.strip().rstrip("%"))
+            except ValueError:
+                raise StructuredOutputError(f"{path} should be a number, got {value!r}")
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise StructuredOutputError(f"{path} should be a number, got {type(value).__name__}")
+        if expected == "integer" or float(value).is_integer():
+            value = int(value)
+        if "minimum" in schema and value < schema["minimum"]:
+            raise StructuredOutputError(f"{path} should be at least {schema['minimum']}")
+        if "maximum" in schema and value > schema["maximum"]:
+            raise StructuredOutputError(f"{path} should be at most {schema['maximum']}")
+    elif expected is not None and not isinstance(value, JSON_TYPES[expected]):
+        raise StructuredOutputError(f"{path} should be {expected}, got {type(value).__name__}")
+
+    if "enum" in schema and value not in schema["enum"]:
+        raise StructuredOutputError(f"{path} should be one of {schema['enum']}, got {value!r}")
+
+    if expected == "object":
+        for key in schema.get("required", []):
+            if key not in value:
+                raise StructuredOutputError(f"{path} is missing required key {key!r}")
+        value = dict(value)
+        for key, property_schema in schema.get("properties", {}).items():
+            if key in value:
+                value[key] = validate(value[key], property_schema, f"{path}.{key}")
+    elif expected == "array":
+        if len(value) < schema.get("minItems", 0):
+            raise StructuredOutputError(f"{path} should have at least {schema['minItems']} items")
+        if "items" in schema:
+            value = [validate(item, schema["items"], f"{path}[{i}]") for i, item in enumerate(value)]
+    return value
+
+
+def repair_json(text: str) -> str:
+    """
+    Apply cheap local fixes to malformed JSON output.
+
+    Strips code fences and text around the outermost object, replaces smart
+    quotes and removes trailing commas.
+
+    Args:
+        text: The raw model output
+
+    Returns:
+        The repaired JSON text
+    """
+    text = CODE_FENCE.sub("", text.strip()).translate(SMART_QUOTES)
+    start = text.find("{")
+    end = text.rfind("}")
+    if start != -1 and end > start:
+        text = text[start:end + 1]
+    return TRAILING_COMMA.sub(r"\1", text)
+
+
+def parse_structured(text: str, schema: Dict[str, Any]) -> Any:
+    """
+    Parse and validate model output, repairing it locally if needed.
+
+    Args:
+        text: The raw model output
+        schema: The JSON schema the output must match
+
+    Returns:
+        The validated data
+
+    Raises:
+        StructuredOutputError: If the output cannot be parsed or validated
+    """
+    errors: List[str] = []
+    with span("llm.parse", characters=len(text)) as attributes:
+        for candidate in (text, repair_json(text)):
+            try:
+                value = validate(json.loads(candidate), schema)
+                attributes["repaired"] = candidate is not text
+                return value
+            except json.JSONDecodeError as e:
+                errors.append(f"invalid JSON: {str(e)}")
+            except StructuredOutputError as e:
+                errors.append(str(e))
+        raise StructuredOutputError(errors[-1])
+
+
+def invoke_structured(prompt: Any, schema: Dict[str, Any], provider: str = "openai",
+                      models: Optional[Dict[str, str]] = None) -> Tuple[Any, str]:
+    """
+    Invoke a prompt and return output validated against a schema.
+
+    Uses provider JSON mode. Malformed output is repaired locally first; only
+    if that fails is the model asked once to fix its own output, which costs
+    far less than regenerating from the source text.
+
+    Args:
+        prompt: A prompt template taking no input variables
+        schema: The JSON schema the output must match
+        provider: The LLM provider to use ("auto", "openai" or "groq")
+        models: Optional model name per provider
+
+    Returns:
+        Tuple of (validated data, provider that produced it)
+    """
+    router = get_router()
+    json_mode = provider == "auto" or provider in JSON_MODE_PROVIDERS
+    llm_kwargs = {"model_kwargs": {"response_format": {"type": "json_object"}}} if json_mode else {}
+    response, provider_used = router.invoke(prompt, provider, models, **llm_kwargs)
+
+    try:
+        return parse_structured(response.content, schema), provider_used
+    except StructuredOutputError as e:
+        error = str(e)
+
+    # Ask the same provider to fix only its output
+    repair_prompt = ChatPromptTemplate.from_messages([
+        SystemMessage(content=REPAIR_PROMPT),
+        HumanMessage(content=(
+            f"Schema:\n{json.dumps(schema)}\n\n"
+            f"Error: {error}\n\n"
+            f"Output:\n{response.content}"
+        ))
+    ])
+    repaired, _ = router.invoke(repair_prompt, provider_used, models, **llm_kwargs)
+    return parse_structured(repaired.content, schema), provider_used
@@ -1,61 +1,348 @@
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+import re
+import time
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-import streamlit as st
+from components.cache import get_cache, make_cache_key
+from components.llm import resolve_model
+from components.router import cached_as, get_router, is_retriable_error, model_for
+from components.scheduler import bind_session, estimate_prompt_tokens, get_scheduler
+from components.telemetry import collect_usage, generation_metadata, mark_cached, record_llm_call, traced
 
-def summarize_text(text: str) -> str:
+SUMMARY_MODEL = "gpt-4-turbo-preview"
+SUMMARY_MODELS = {"openai": SUMMARY_MODEL}
+SUMMARY_PROMPT = "You are an expert at summarizing educational content. Create a concise and informative summary of the provided text."
+MAP_PROMPT = "You are an expert at summarizing educational content. Summarize this excerpt of a larger document, keeping its key concepts, definitions and conclusions."
+REDUCE_PROMPT = "You are an expert at summarizing educational content. Combine the following partial summaries of consecutive sections of a document into one concise and informative summary."
+
+# Map-reduce settings for large page ranges
+MAX_CHUNK_TOKENS = 6000
+MAP_REDUCE_THRESHOLD_TOKENS = 12000
+MAX_CONCURRENCY = 4
+
+# Pages of the extractor and page spans of partial summaries, e.g. "--- Pages 12-19 ---"
+PAGE_MARKER = re.compile(r"(?=--- (?:Pages? \d+(?:-\d+)?|Section \d+) ---)")
+PAGE_SPAN = re.compile(r"--- Pages? (\d+)(?:-(\d+))? ---")
+
+def estimate_tokens(text: str) -> int:
     """
-    Generate a summary of the input text using OpenAI.
+    Roughly estimate the number of tokens in a text (about 4 characters per token).
     
     Args:
-        text: The text to summarize
+        text: The text to measure
+    
+    Returns:
+        Estimated token count
+    """
+    return len(text) // 4 + 1
+
+def split_into_chunks(text: Union[str, Iterable[Dict[str, Any]]], max_tokens: int = MAX_CHUNK_TOKENS) -> List[str]:
+    """
+    Split extracted text into chunks of whole pages that fit a token budget.
+    
+    Pages are delimited by the "--- Page N ---" markers added by the extractor,
+    partial summaries by the page spans of ``label_partials``. Page records
+    streamed by ``iter_page_texts`` are consumed one at a time instead. A
+    single page larger than the budget is split into fixed-size pieces.
+    
+    Args:
+        text: The extracted text to split, or page records from ``iter_page_texts``
+        max_tokens: Maximum estimated tokens per chunk
+    
+    Returns:
+        List of text chunks in document order
+    """
+    max_chars = max_tokens * 4
+    chunks = []
+    current = []
+    current_tokens = 0
+    
+    if isinstance(text, str):
+        pages = PAGE_MARKER.split(text)
+    else:
+        pages = (f"--- Page {record['page']} ---\n{record['text']}\n\n" for record in text)
+    
+    for page in pages:
+        if not page.strip():
+            continue
+        
+        # Break oversized pages into budget-sized pieces
+        pieces = [page[i:i + max_chars] for i in range(0, len(page), max_chars)]
+        for piece in pieces:
+            tokens = estimate_tokens(piece)
+            if current and current_tokens + tokens > max_tokens:
+                chunks.append("".join(current).strip())
+                current = []
+                current_tokens = 0
+            current.append(piece)
+            current_tokens += tokens
+    
+    if current:
+        chunks.append("".join(current).strip())
+    return chunks
+
+def label_partials(chunks: List[str], partials: List[str]) -> str:
+    """
+    Join partial summaries, each headed by the pages of the chunk it summarizes.
+    
+    The span of a chunk is read from the page markers it contains, so a
+    chunk of pages 12 to 19 is labelled "--- Pages 12-19 ---". A chunk
+    continuing an oversized page gets the page it continues; text without
+    any page markers is labelled by section instead.
+    
+    Args:
+        chunks: The chunks that were summarized
+        partials: The summary of each chunk
+    
+    Returns:
+        The labelled partial summaries
+    """
+    labelled = []
+    last_page = None
+    for i, (chunk, partial) in enumerate(zip(chunks, partials)):
+        spans = [(int(first), int(last or first)) for first, last in PAGE_SPAN.findall(chunk)]
+        if spans:
+            first_page, last_page = spans[0][0], spans[-1][1]
+        elif last_page is not None:
+            first_page = last_page
+        if last_page is None:
+            label = f"--- Section {i + 1} ---"
+        elif first_page == last_page:
+            label = f"--- Page {first_page} ---"
+        else:
+            label = f"--- Pages {first_page}-{last_page} ---"
+        labelled.append(f"{label}\n{partial}")
+    return "\n\n".join(labelled)
+
+@traced("summarize.map")
+def collapse_text(text: str, max_tokens: int = MAX_CHUNK_TOKENS,
+                  max_concurrency: int = MAX_CONCURRENCY, provider: str = "openai") -> str:
+    """
+    Map step of map-reduce summarization.
+    
+    Summarizes the chunks of the text in parallel, repeating on the partial
+    summaries until they fit into a single reduce call.
+    
+    Args:
+        text: The extracted text to collapse
+        max_tokens: Maximum estimated tokens per chunk
+        max_concurrency: Maximum number of concurrent LLM calls
+        provider: The LLM provider to use ("auto", "openai" or "groq")
+    
+    Returns:
+        Partial summaries joined into one text ready for the reduce step
+    """
+    chunks = split_into_chunks(text, max_tokens)
+    system_prompt = MAP_PROMPT
+    
+    while True:
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            summarize_chunk = bind_session(lambda chunk: summarize_text(chunk, system_prompt, provider))
+            partials = list(executor.map(summarize_chunk, chunks))
         
+        combined = label_partials(chunks, partials)
+        if estimate_tokens(combined) <= max_tokens or len(partials) == 1:
+            return combined
+        
+        # Reduce groups of partial summaries until they fit the budget
+        chunks = split_into_chunks(combined, max_tokens)
+        system_prompt = REDUCE_PROMPT
+
+def map_reduce_summarize(text: str, max_tokens: int = MAX_CHUNK_TOKENS,
+                         max_concurrency: int = MAX_CONCURRENCY, provider: str = "openai") -> str:
+    """
+    Summarize a large text by summarizing its chunks in parallel and then
+    combining the partial summaries.
+    
+    Args:
+        text: The extracted text to summarize
+        max_tokens: Maximum estimated tokens per chunk
+        max_concurrency: Maximum number of concurrent LLM calls
+        provider: The LLM provider to use ("auto", "openai" or "groq")
+    
     Returns:
         Generated summary
     """
-    # Create the prompt template
-    prompt = ChatPromptTemplate.from_messages([
-        SystemMessage(content="You are an expert at summarizing educational content. Create a concise and informative summary of the provided text."),
+    collapsed = collapse_text(text, max_tokens, max_concurrency, provider)
+    return summarize_text(collapsed, REDUCE_PROMPT, provider)
+
+def build_summary_prompt(text: str, system_prompt: str = SUMMARY_PROMPT) -> Any:
+    """
+    Build the prompt used to summarize text.
+    
+    Args:
+        text: The text to summarize
+        system_prompt: The system prompt to use
+    
+    Returns:
+        A prompt template taking no input variables
+    """
+    return ChatPromptTemplate.from_messages([
+        SystemMessage(content=system_prompt),
         HumanMessage(content=text)
     ])
+
+def invoke_summary(text: str, system_prompt: str = SUMMARY_PROMPT, provider: str = "openai") -> Tuple[str, str]:
+    """
+    Summarize text with one LLM call routed to the best provider.
+    
+    Args:
+        text: The text to summarize
+        system_prompt: The system prompt to use
+        provider: The LLM provider to use ("auto", "openai" or "groq")
+    
+    Returns:
+        Tuple of (generated summary, provider that produced it)
+    """
+    prompt = build_summary_prompt(text, system_prompt)
+    response, provider_used = get_router().invoke(prompt, provider, models=SUMMARY_MODELS)
+    return response.content, provider_used
+
+def summarize_text(text: str, system_prompt: str = SUMMARY_PROMPT, provider: str = "openai") -> str:
+    """
+    Generate a summary of the input text.
+    
+    Args:
+        text: The text to summarize
+        system_prompt: The system prompt to use
+        provider: The LLM provider to use ("auto", "openai" or "groq")
+    
+    Returns:
+        Generated summary
+    """
+    return invoke_summary(text, system_prompt, provider)[0]
+
+def summary_result(summary: str, provider: str, usage: Dict[str, Any], seconds: float) -> Dict[str, Any]:
+    """
+    Wrap a summary in the result dictionary stored in generated_content.
+    
+    Args:
+        summary: The generated summary text
+        provider: The provider that generated the summary
+        usage: LLM usage collected with ``collect_usage``
+        seconds: Total generation time
+    
+    Returns:
+        Dictionary containing the summary and metadata
+    """
+    return {
+        "content": summary,
+        "metadata": generation_metadata(
+            provider, resolve_model(provider, SUMMARY_MODELS.get(provider)), usage, seconds
+        )
+    }
+
+def stream_summary(text: str, provider: str = "openai",
+                   result: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """
+    Stream a summary of the input text token by token.
+    
+    Cached summaries are yielded in a single chunk. Large texts are collapsed
+    by map-reduce first, which is announced by a status line that is not
+    part of the summary. A provider failing before its first token fails over
+    to the next ranked one. A completed stream is stored in the generation
+    cache.
+    
+    Args:
+        text: The text to summarize
+        provider: The LLM provider to use ("auto", "openai" or "groq")
+        result: Optional dictionary updated with the summary_result once
+            the stream is complete
     
-    # Initialize OpenAI LLM
-    llm = ChatOpenAI(
-        model="gpt-4-turbo-preview",
-        temperature=0,
-        api_key=st.secrets["openai"]["api_key"]
-    )
+    Yields:
+        Chunks of the summary text as they arrive from the model
+    """
+    cache = get_cache()
+    cache_key = make_cache_key(text, SUMMARY_PROMPT, provider, model_for(provider, SUMMARY_MODELS))
+    cached = cache.get(cache_key)
+    if cached is not None:
+        cached = mark_cached(cached)
+        if result is not None:
+            result.update(cached)
+        yield cached["content"]
+        return
     
-    # Create the chain
-    chain = prompt | llm
+    chunks = []
+    router = get_router()
+    generation_start = time.perf_counter()
+    with collect_usage() as usage:
+        try:
+            # Large texts are collapsed in parallel first, then the reduce step is streamed
+            if estimate_tokens(text) > MAP_REDUCE_THRESHOLD_TOKENS:
+                # Show progress before the collapse step, which can take a while
+                yield f"_Summarizing about {estimate_tokens(text):,} tokens of text section by section..._\n\n"
+                prompt = build_summary_prompt(collapse_text(text, provider=provider), REDUCE_PROMPT)
+            else:
+                prompt = build_summary_prompt(text)
+            
+            # Streams cannot be hedged, but fail over until the first token arrives
+            errors = []
+            for provider_used in router.rank(provider):
+                llm = router.get_llm(provider_used, SUMMARY_MODELS)
+                get_scheduler().acquire(provider_used, estimate_prompt_tokens(prompt))
+                start = time.monotonic()
+                response = None
+                try:
+                    for chunk in (prompt | llm).stream({}):
+                        response = chunk if response is None else response + chunk
+                        chunks.append(chunk.content)
+                        yield chunk.content
+                except Exception as e:
+                    router.record(provider_used, time.monotonic() - start, False)
+                    if response is not None or not is_retriable_error(e):
+                        raise
+                    errors.append(f"{provider_used}: {str(e)}")
+                    continue
+                router.record(provider_used, time.monotonic() - start, True)
+                record_llm_call(
+                    provider_used, getattr(llm, "model_name", None) or provider_used,
+                    response, time.monotonic() - start
+                )
+                break
+            else:
+                raise Exception(f"All LLM providers failed: {'; '.join(errors)}")
+        except Exception as e:
+            raise Exception(f"Error generating summary: {str(e)}")
     
-    # Generate the summary
-    response = chain.invoke({})
-    return response.content
+    summary = summary_result("".join(chunks), provider_used, usage, time.perf_counter() - generation_start)
+    cache.set(make_cache_key(text, SUMMARY_PROMPT, *cached_as(provider, provider_used, SUMMARY_MODELS)), summary)
+    if result is not None:
+        result.update(summary)
 
-def generate_summary(text: str) -> Dict[str, Any]:
+@traced("generate.summary")
+def generate_summary(text: str, provider: str = "openai") -> Dict[str, Any]:
     """
     Generate a summary of the input text.
     
     Args:
         text: The text to summarize
-        
+        provider: The LLM provider to use ("auto", "openai" or "groq")
+    
     Returns:
         Dictionary containing the summary and metadata
     """
     try:
-        # Generate the summary
-        summary = summarize_text(text)
+        # Return a cached summary for identical text and settings
+        cache = get_cache()
+        cache_key = make_cache_key(text, SUMMARY_PROMPT, provider, model_for(provider, SUMMARY_MODELS))
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return mark_cached(cached)
         
-        # Return the result with metadata
-        return {
-            "content": summary,
-            "metadata": {
-                "provider": "openai",
-                "model": "gpt-4-turbo-preview"
-            }
-        }
+        # Generate the summary, using map-reduce for large page ranges
+        start = time.perf_counter()
+        with collect_usage() as usage:
+            if estimate_tokens(text) > MAP_REDUCE_THRESHOLD_TOKENS:
+                collapsed = collapse_text(text, provider=provider)
+                summary, provider_used = invoke_summary(collapsed, REDUCE_PROMPT, provider)
+            else:
+                summary, provider_used = invoke_summary(text, SUMMARY_PROMPT, provider)
         
+        # Return the result with metadata
+        result = summary_result(summary, provider_used, usage, time.perf_counter() - start)
+        cache.set(make_cache_key(text, SUMMARY_PROMPT, *cached_as(provider, provider_used, SUMMARY_MODELS)), result)
+        return result
+    
     except Exception as e:
-        raise Exception(f"Error generating summary: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Error generating summary: {str(e)}")
\ No newline at end of file
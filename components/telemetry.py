@@ -0,0 +1,418 @@
+"""
+Timing spans, LLM usage metrics and their export.
+
+Spans are written as JSON lines to ``TRACE_LOG``, if set, and aggregated, together with
+LLM call and token counters, into metrics that can be served in the Prometheus
+text format.
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from components.cache import get_cache
+
+# JSON lines file receiving every finished span; tracing to a file is off
+# unless it is set, e.g. to .learnify_cache/traces.jsonl
+TRACE_LOG = os.environ.get("LEARNIFY_TRACE_LOG") or None
+
+# Size at which the trace log is rotated to "<TRACE_LOG>.1", replacing the previous one
+TRACE_LOG_MAX_BYTES = int(os.environ.get("LEARNIFY_TRACE_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# Port of the Prometheus metrics endpoint started by the app, if set
+METRICS_PORT = os.environ.get("LEARNIFY_METRICS_PORT")
+
+# Upper bounds in seconds of the span duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# USD per million (prompt, completion) tokens, used to estimate cost
+MODEL_PRICES = {
+    "gpt-4-turbo-preview": (10.0, 30.0),
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "mixtral-8x7b-32768": (0.24, 0.24),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("telemetry_span", default=None)
+_usage_collectors: contextvars.ContextVar = contextvars.ContextVar("telemetry_usage", default=())
+_usage_lock = threading.Lock()
+
+
+class Histogram:
+    """Count, sum, maximum and bucket counts of observed durations."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+
+
+class Telemetry:
+    """Process-wide registry of counters, span durations and the trace log."""
+
+    def __init__(self, trace_log: Optional[str] = TRACE_LOG, trace_log_max_bytes: int = TRACE_LOG_MAX_BYTES):
+        self.trace_log = trace_log
+        self.trace_log_max_bytes = trace_log_max_bytes
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._lock = threading.Lock()
+        self._log_file = None
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        """Add to a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Record a duration in seconds."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.histograms.setdefault(key, Histogram()).observe(value)
+
+    def log(self, record: Dict[str, Any]) -> None:
+        """Append a record to the trace log, rotating it once it reaches its maximum size."""
+        if not self.trace_log:
+            return
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            if self._log_file is None:
+                directory = os.path.dirname(self.trace_log)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._log_file = open(self.trace_log, "a", encoding="utf-8", buffering=1)
+            elif self._log_file.tell() >= self.trace_log_max_bytes:
+                self._log_file.close()
+                os.replace(self.trace_log, f"{self.trace_log}.1")
+                self._log_file = open(self.trace_log, "a", encoding="utf-8", buffering=1)
+            self._log_file.write(line)
+
+    def span_summary(self) -> List[Dict[str, Any]]:
+        """
+        Summarize the recorded spans, slowest total time first.
+
+        Returns:
+            List of {"span", "count", "total_seconds", "avg_seconds", "max_seconds"}
+        """
+        with self._lock:
+            rows = [
+                {
+                    "span": dict(labels)["span"],
+                    "count": histogram.count,
+                    "total_seconds": histogram.total,
+                    "avg_seconds": histogram.total / histogram.count,
+                    "max_seconds": histogram.max
+                }
+                for (name, labels), histogram in self.histograms.items()
+                if name == "learnify_span_seconds" and histogram.count
+            ]
+        return sorted(rows, key=lambda row: row["total_seconds"], reverse=True)
+
+    def prometheus_text(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        Returns:
+            The metrics page
+        """
+        def render_labels(labels: Labels, extra: Labels = ()) -> str:
+            pairs = labels + extra
+            if not pairs:
+                return ""
+            escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+            return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            histograms = [(key, (h.count, h.total, list(h.buckets))) for key, h in histograms]
+
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{render_labels(labels)} {value:g}")
+
+        for (name, labels), (count, total, buckets) in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            for bound, bucket_count in zip(DURATION_BUCKETS, buckets):
+                lines.append(f"{name}_bucket{render_labels(labels, (('le', f'{bound:g}'),))} {bucket_count}")
+            lines.append(f"{name}_bucket{render_labels(labels, (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{render_labels(labels)} {total:g}")
+            lines.append(f"{name}_count{render_labels(labels)} {count}")
+
+        # The generation cache keeps its own hit and miss counters
+        try:
+            cache_stats = get_cache().stats()
+            lines.append("# TYPE learnify_generation_cache_lookups_total counter")
+            lines.append(f'learnify_generation_cache_lookups_total{{result="hit"}} {cache_stats["hits"]}')
+            lines.append(f'learnify_generation_cache_lookups_total{{result="miss"}} {cache_stats["misses"]}')
+            lines.append("# TYPE learnify_generation_cache_entries gauge")
+            lines.append(f"learnify_generation_cache_entries {cache_stats['entries']}")
+        except Exception:
+            pass
+        return "\n".join(lines) + "\n"
+
+
+_telemetry = Telemetry()
+
+
+def get_telemetry() -> Telemetry:
+    """
+    Get the process-wide telemetry registry.
+
+    Returns:
+        The shared Telemetry instance
+    """
+    return _telemetry
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Time a block of code as a named span.
+
+    The yielded dictionary can be filled with more attributes, which are
+    written to the trace log with the span.
+
+    Args:
+        name: Span name, e.g. "pdf.extract_pages"
+        **attributes: Attributes recorded with the span
+
+    Yields:
+        The span attributes
+    """
+    parent = _current_span.get()
+    span_id = uuid.uuid4().hex[:16]
+    trace_id = parent["trace_id"] if parent else uuid.uuid4().hex
+    token = _current_span.set({"trace_id": trace_id, "span_id": span_id})
+    started_at = datetime.now(timezone.utc).isoformat()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attributes
+    except Exception as e:
+        error = f"{type(e).__name__}: {str(e)}"
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        _current_span.reset(token)
+        telemetry = get_telemetry()
+        telemetry.observe("learnify_span_seconds", seconds, span=name)
+        if error is not None:
+            telemetry.increment("learnify_span_errors_total", span=name)
+        telemetry.log({
+            "timestamp": started_at,
+            "span": name,
+            "seconds": round(seconds, 6),
+            "trace_id": trace_id,
+            "span_id": span_id,
+            "parent_id": parent["span_id"] if parent else None,
+            "error": error,
+            **attributes
+        })
+
+
+def traced(name: Optional[str] = None) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Decorate a function to run it in a span.
+
+    Args:
+        name: Span name, defaulting to "<module>.<function>"
+
+    Returns:
+        The decorator
+    """
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        span_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def collect_usage() -> Iterator[Dict[str, Any]]:
+    """
+    Collect the LLM usage of all calls made within the block.
+
+    Calls made in worker threads are included as long as they run in a copy of
+    the caller's context, e.g. through ``bind_session``. Nested collectors all
+    receive the calls.
+
+    Yields:
+        Dictionary with "llm_calls", "prompt_tokens", "completion_tokens",
+        "cost_usd", "llm_seconds" and the "models" used
+    """
+    usage = {
+        "llm_calls": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cost_usd": 0.0,
+        "llm_seconds": 0.0,
+        "models": []
+    }
+    token = _usage_collectors.set(_usage_collectors.get() + (usage,))
+    try:
+        yield usage
+    finally:
+        _usage_collectors.reset(token)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """
+    Estimate the cost of a call in USD from MODEL_PRICES.
+
+    Args:
+        model: The model name
+        prompt_tokens: Prompt tokens used
+        completion_tokens: Completion tokens used
+
+    Returns:
+        The estimated cost, or 0.0 for models without a known price
+    """
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+def record_llm_call(provider: str, model: str, response: Any, seconds: float) -> None:
+    """
+    Record the latency and token usage of a successful LLM call.
+
+    Args:
+        provider: The provider that answered
+        model: The model requested
+        response: The chat model response, whose usage_metadata holds the tokens
+        seconds: Call latency
+    """
+    usage_metadata = getattr(response, "usage_metadata", None) or {}
+    response_metadata = getattr(response, "response_metadata", None) or {}
+    model = response_metadata.get("model_name") or model
+    prompt_tokens = usage_metadata.get("input_tokens", 0)
+    completion_tokens = usage_metadata.get("output_tokens", 0)
+    cost = estimate_cost(model, prompt_tokens, completion_tokens)
+
+    telemetry = get_telemetry()
+    telemetry.increment("learnify_llm_calls_total", provider=provider, model=model)
+    telemetry.increment("learnify_llm_tokens_total", prompt_tokens, provider=provider, model=model, type="prompt")
+    telemetry.increment("learnify_llm_tokens_total", completion_tokens, provider=provider, model=model, type="completion")
+    telemetry.increment("learnify_llm_cost_usd_total", cost, provider=provider, model=model)
+    telemetry.observe("learnify_llm_seconds", seconds, provider=provider, model=model)
+
+    with _usage_lock:
+        for usage in _usage_collectors.get():
+            usage["llm_calls"] += 1
+            usage["prompt_tokens"] += prompt_tokens
+            usage["completion_tokens"] += completion_tokens
+            usage["cost_usd"] += cost
+            usage["llm_seconds"] += seconds
+            if model not in usage["models"]:
+                usage["models"].append(model)
+
+
+def generation_metadata(provider: str, model: str, usage: Dict[str, Any], seconds: float) -> Dict[str, Any]:
+    """
+    Build the metadata stored with generated content.
+
+    Args:
+        provider: The provider that produced the content
+        model: The model requested from that provider
+        usage: Usage collected with ``collect_usage``
+        seconds: Total generation time
+
+    Returns:
+        Dictionary with the model, provider, ISO timestamp, latency, token
+        usage, estimated cost and a "cached" flag
+    """
+    return {
+        "model": usage["models"][-1] if usage["models"] else model,
+        "provider": provider,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "latency_seconds": round(seconds, 3),
+        "llm_calls": usage["llm_calls"],
+        "prompt_tokens": usage["prompt_tokens"],
+        "completion_tokens": usage["completion_tokens"],
+        "cost_usd": round(usage["cost_usd"], 6),
+        "cached": False
+    }
+
+
+def mark_cached(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Flag a result served from the generation cache.
+
+    Args:
+        result: The cached result
+
+    Returns:
+        The result with metadata["cached"] set to True
+    """
+    get_telemetry().increment("learnify_generation_cache_served_total", type=result.get("type", "summary"))
+    return {**result, "metadata": {**result.get("metadata", {}), "cached": True}}
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = get_telemetry().prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server: Optional[ThreadingHTTPServer] = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serve the metrics in the Prometheus text format at /metrics.
+
+    The server is started once per process; later calls return it.
+
+    Args:
+        port: Port to listen on
+        host: Interface to listen on
+
+    Returns:
+        The running server
+    """
+    global _metrics_server
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _metrics_server
@@ -0,0 +1,341 @@
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from components.llm import DEFAULT_MODELS
+from components.telemetry import get_telemetry, span
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Rough number of characters per token, used when no local tokenizer is available
+CHARS_PER_TOKEN = 4
+
+# Tokens of document text sent in a single prompt, leaving room for the
+# instructions and the response within the context window of each model
+PROMPT_TOKEN_BUDGETS = {
+    "gpt-3.5-turbo": 12000,
+    "gpt-4-turbo-preview": 100000,
+    "mixtral-8x7b-32768": 28000,
+}
+DEFAULT_TOKEN_BUDGET = 12000
+
+# Lines at the top and bottom of a page that may be running headers or footers;
+# only pages with more than twice as many lines have edges apart from their body
+EDGE_LINES = 3
+# Share of the pages between its first and last occurrence an edge line must
+# appear on to count as a running header or footer
+REPEAT_RATIO = 0.4
+# Pages an edge line must appear on to count as a running header or footer
+MIN_REPEAT_PAGES = 3
+
+PAGE_SPLIT = re.compile(r"--- Page (\d+) ---\n?")
+PAGE_NUMBER_LINE = re.compile(r"^(page\s*)?[-–—(\[]?\s*\d+\s*(/|of)?\s*\d*\s*[-–—)\]]?$", re.IGNORECASE)
+HYPHENATED_BREAK = re.compile(r"(\w)[-\u00ad]\n[ \t]*([a-z])")
+HORIZONTAL_SPACE = re.compile(r"[ \t\u00a0\u2000-\u200b]+")
+BLANK_LINES = re.compile(r"\n{3,}")
+
+_encodings: Dict[str, Any] = {}
+_encodings_lock = threading.Lock()
+
+
+def get_encoding(model: str) -> Optional[Any]:
+    """
+    Get the local tokenizer for a model.
+
+    Models unknown to tiktoken use the cl100k_base encoding, which is close
+    enough for budgeting. Loading failures, e.g. when the encoding cannot be
+    downloaded, are remembered so they are not retried on every call.
+
+    Args:
+        model: The model name
+
+    Returns:
+        The tiktoken encoding, or None if tiktoken is not available
+    """
+    if tiktoken is None:
+        return None
+    with _encodings_lock:
+        if model not in _encodings:
+            try:
+                try:
+                    _encodings[model] = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    _encodings[model] = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                _encodings[model] = None
+        return _encodings[model]
+
+
+def count_tokens(text: str, model: str = DEFAULT_MODELS["openai"]) -> int:
+    """
+    Count the tokens of a text with the model's tokenizer.
+
+    Falls back to an estimate of 4 characters per token without tiktoken.
+
+    Args:
+        text: The text to measure
+        model: The model name
+
+    Returns:
+        Token count
+    """
+    encoding = get_encoding(model)
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def token_budget(model: str) -> int:
+    """
+    Get the number of document tokens a model gets in one prompt.
+
+    Args:
+        model: The model name, or "auto" when the provider is routed
+
+    Returns:
+        Token budget; for "auto" the smallest budget of the routed models
+    """
+    if model == "auto":
+        return min(PROMPT_TOKEN_BUDGETS.get(name, DEFAULT_TOKEN_BUDGET) for name in DEFAULT_MODELS.values())
+    return PROMPT_TOKEN_BUDGETS.get(model, DEFAULT_TOKEN_BUDGET)
+
+
+def split_pages(text: str) -> List[Tuple[Optional[str], str]]:
+    """
+    Split extracted text at its "--- Page N ---" markers.
+
+    Args:
+        text: Text from ``extract_text_from_pages`` or ``build_context``
+
+    Returns:
+        List of (page number or None for text before the first marker, page text)
+    """
+    parts = PAGE_SPLIT.split(text)
+    pages = [(None, parts[0])] if parts[0].strip() else []
+    pages.extend(zip(parts[1::2], parts[2::2]))
+    return pages
+
+
+def format_page(page: Optional[str], page_text: str) -> str:
+    """Format a page with the marker ``extract_text_from_pages`` uses."""
+    return f"{page_text}\n" if page is None else f"\n\n--- Page {page} ---\n{page_text}\n"
+
+
+def join_pages(pages: List[Tuple[Optional[str], str]]) -> str:
+    """Join pages formatted like ``extract_text_from_pages`` does."""
+    return "".join(format_page(page, page_text) for page, page_text in pages).strip()
+
+
+def line_signature(line: str, page: Optional[str] = None) -> str:
+    """
+    Normalize a line so running headers with changing page numbers match.
+
+    Only the number of the page itself is masked; other numbers are kept, so
+    body lines that differ just in their figures do not match each other.
+
+    Args:
+        line: The line text
+        page: Number of the page the line is on, from its page marker
+
+    Returns:
+        The lowercase line with the page number replaced by "#"
+    """
+    line = line.lower()
+    if page is None:
+        return line
+    return re.sub(rf"(?<!\d){page}(?!\d)", "#", line)
+
+
+def page_edges(lines: List[str]) -> List[Tuple[int, str]]:
+    """
+    Get the lines at the top and bottom of a page that may be headers or footers.
+
+    Pages too short to have a body apart from their edges, such as slides,
+    have no edges, so none of their lines is ever removed as a header.
+
+    Args:
+        lines: Non-empty lines of the page
+
+    Returns:
+        List of (line index, "top" or "bottom")
+    """
+    if len(lines) <= 2 * EDGE_LINES:
+        return []
+    return [(i, "top") for i in range(EDGE_LINES)] + \
+        [(i, "bottom") for i in range(len(lines) - EDGE_LINES, len(lines))]
+
+
+def find_running_lines(pages: List[List[str]]) -> set:
+    """
+    Find header and footer lines repeated at the edges of many pages.
+
+    A line repeats when its signature is found at the same edge, top or
+    bottom, of several pages. Repetition is measured over the pages between
+    the first and last occurrence of a line, so chapter titles used as running
+    headers of a single chapter are found as well as headers of the whole
+    document.
+
+    Args:
+        pages: Signatures of the non-empty lines of every page
+
+    Returns:
+        (edge, signature) pairs of the repeated lines
+    """
+    occurrences: Dict[Tuple[str, str], List[int]] = {}
+    for index, signatures in enumerate(pages):
+        for key in {(edge, signatures[i]) for i, edge in page_edges(signatures)}:
+            occurrences.setdefault(key, []).append(index)
+    return {
+        key for key, indexes in occurrences.items()
+        if len(indexes) >= MIN_REPEAT_PAGES and len(indexes) >= REPEAT_RATIO * (indexes[-1] - indexes[0] + 1)
+    }
+
+
+def clean_page(text: str) -> str:
+    """Normalize unicode, hyphenation and whitespace of one page."""
+    text = unicodedata.normalize("NFKC", text)
+    text = HYPHENATED_BREAK.sub(r"\1\2", text.replace("\r\n", "\n")).replace("\u00ad", "")
+    text = HORIZONTAL_SPACE.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    return BLANK_LINES.sub("\n\n", text).strip()
+
+
+def compact_text(text: Union[str, Iterable[Dict[str, Any]]], model: str = DEFAULT_MODELS["openai"]) -> Dict[str, Any]:
+    """
+    Remove text that costs tokens without carrying content.
+
+    Running headers and footers repeated across pages, page number lines at
+    the top or bottom of pages, words hyphenated across line breaks, ligatures
+    and runs of whitespace are cleaned up. Page markers are kept, so the
+    result can still be split into pages.
+
+    Page records streamed by ``iter_page_texts`` are cleaned as they arrive,
+    so the raw text of the pages is never joined into one string.
+
+    Args:
+        text: Text from ``extract_text_from_pages`` or ``build_context``, or
+            page records from ``iter_page_texts``
+        model: The model whose tokenizer is used to report the savings
+
+    Returns:
+        Dictionary with the compacted "text", "original_tokens", "tokens",
+        "tokens_saved" and "removed_lines"
+    """
+    with span("prompt.compact") as attributes:
+        if isinstance(text, str):
+            pages = [(page, clean_page(page_text)) for page, page_text in split_pages(text)]
+            original_tokens = count_tokens(text, model)
+        else:
+            pages = []
+            original_tokens = 0
+            for record in text:
+                page = str(record["page"])
+                original_tokens += count_tokens(format_page(page, record["text"]), model)
+                pages.append((page, clean_page(record["text"])))
+        page_lines = [[line for line in page_text.split("\n") if line] for _, page_text in pages]
+        page_signatures = [
+            [line_signature(line, page) for line in lines] for (page, _), lines in zip(pages, page_lines)
+        ]
+        running = find_running_lines(page_signatures)
+
+        compacted = []
+        removed_lines = 0
+        for (page, page_text), lines, signatures in zip(pages, page_lines, page_signatures):
+            # Running lines and page numbers only count at the top and bottom of a page
+            drop = {
+                i for i, edge in page_edges(lines)
+                if (edge, signatures[i]) in running or PAGE_NUMBER_LINE.match(lines[i])
+            }
+            if len(drop) == len(lines):
+                drop = set()
+            removed_lines += len(drop)
+
+            kept = []
+            index = 0
+            for line in page_text.split("\n"):
+                if line:
+                    index += 1
+                    if index - 1 in drop:
+                        continue
+                kept.append(line)
+            compacted.append((page, BLANK_LINES.sub("\n\n", "\n".join(kept)).strip()))
+
+        result_text = join_pages(compacted)
+        tokens = count_tokens(result_text, model)
+        attributes.update(original_tokens=original_tokens, tokens=tokens, removed_lines=removed_lines)
+
+    telemetry = get_telemetry()
+    telemetry.increment("learnify_prompt_tokens_total", original_tokens, stage="extracted")
+    telemetry.increment("learnify_prompt_tokens_total", tokens, stage="compacted")
+    return {
+        "text": result_text,
+        "original_tokens": original_tokens,
+        "tokens": tokens,
+        "tokens_saved": original_tokens - tokens,
+        "removed_lines": removed_lines
+    }
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str) -> str:
+    """Cut a text to its first ``max_tokens`` tokens."""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def fit_to_budget(text: str, model: str) -> str:
+    """
+    Trim a prompt text to the token budget of a model.
+
+    Whole pages are kept from the start of the text for as long as they fit;
+    the first page that does not fit is cut at a token boundary.
+
+    Args:
+        text: Text with "--- Page N ---" markers
+        model: The model name, or "auto" when the provider is routed
+
+    Returns:
+        The text, trimmed if it exceeds the budget
+    """
+    budget = token_budget(model)
+    tokenizer_model = DEFAULT_MODELS["openai"] if model == "auto" else model
+    if count_tokens(text, tokenizer_model) <= budget:
+        return text
+
+    with span("prompt.fit_to_budget", budget=budget):
+        kept = []
+        remaining = budget
+        for page, page_text in split_pages(text):
+            tokens = count_tokens(format_page(page, page_text), tokenizer_model)
+            if tokens > remaining:
+                marker_tokens = tokens - count_tokens(page_text, tokenizer_model)
+                kept.append((page, truncate_tokens(page_text, max(0, remaining - marker_tokens), tokenizer_model)))
+                break
+            kept.append((page, page_text))
+            remaining -= tokens
+    get_telemetry().increment("learnify_prompt_truncations_total", model=model)
+    return join_pages(kept)
+
+
+def compaction_stats() -> Dict[str, Any]:
+    """
+    Summarize the tokens saved by compaction in this process.
+
+    Returns:
+        Dictionary with "extracted_tokens", "compacted_tokens", "tokens_saved"
+        and "saved_ratio"
+    """
+    counters = get_telemetry().counters
+    extracted = counters.get(("learnify_prompt_tokens_total", (("stage", "extracted"),)), 0)
+    compacted = counters.get(("learnify_prompt_tokens_total", (("stage", "compacted"),)), 0)
+    return {
+        "extracted_tokens": int(extracted),
+        "compacted_tokens": int(compacted),
+        "tokens_saved": int(extracted - compacted),
+        "saved_ratio": (extracted - compacted) / extracted if extracted else 0.0
+    }
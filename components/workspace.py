@@ -0,0 +1,147 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, List, Optional
+
+from components.document_store import get_document_store
+from components.pdf_extractor import get_named_ranges
+from components.pdf_stats import get_pdf_statistics
+from components.scheduler import bind_session
+from components.telemetry import traced
+
+# Documents ingested at the same time
+INGESTION_WORKERS = int(os.environ.get("LEARNIFY_INGESTION_WORKERS", "4"))
+
+# Shared pool for ingesting uploads of all sessions
+_executor = ThreadPoolExecutor(max_workers=INGESTION_WORKERS, thread_name_prefix="ingestion")
+
+
+@traced("workspace.ingest")
+def ingest_document(fileobj: BinaryIO, cancel_event: Optional[threading.Event] = None,
+                    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Store a PDF and prepare everything generation needs from it.
+
+    The file is hashed into the document store, its table of contents is
+    read, and the statistics pass extracts the text of every page into the
+    shared page store. Statistics of large documents use a share of the CPUs,
+    so concurrent ingestions do not oversubscribe them.
+
+    Args:
+        fileobj: Readable binary file object of the PDF
+        cancel_event: Event that stops the statistics pass when set
+        on_progress: Called with the partial statistics as pages are analyzed
+
+    Returns:
+        Dictionary with the document "hash", "statistics" and "chapters"
+    """
+    doc_hash = get_document_store().put_file(fileobj)
+    chapters = get_named_ranges(doc_hash)
+    max_workers = max(1, (os.cpu_count() or 1) // INGESTION_WORKERS)
+    return {
+        "hash": doc_hash,
+        "statistics": get_pdf_statistics(
+            doc_hash, max_workers=max_workers, cancel_event=cancel_event, on_progress=on_progress
+        ),
+        "chapters": len(chapters)
+    }
+
+
+class Workspace:
+    """
+    Documents uploaded in one session, ingested concurrently in the background.
+
+    Documents are keyed by file name and size, so the same upload seen on
+    every Streamlit rerun is ingested only once.
+    """
+
+    def __init__(self):
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self._futures: Dict[str, Future] = {}
+        self._cancel_events: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def add(self, fileobj: BinaryIO, name: str, size: Optional[int] = None) -> str:
+        """
+        Start ingesting a document unless it was added before.
+
+        Args:
+            fileobj: Readable binary file object of the PDF
+            name: File name shown to the user
+            size: File size in bytes, used to tell re-uploads apart
+
+        Returns:
+            The key of the document in the workspace
+        """
+        key = f"{name}:{size}"
+        with self._lock:
+            if key not in self.documents:
+                self.documents[key] = {
+                    "key": key, "name": name, "hash": None, "status": "ingesting", "statistics": None
+                }
+                self._cancel_events[key] = threading.Event()
+                self._futures[key] = _executor.submit(
+                    bind_session(ingest_document), fileobj, self._cancel_events[key],
+                    lambda stats, key=key: self._record_progress(key, stats)
+                )
+        return key
+
+    def _record_progress(self, key: str, stats: Dict[str, Any]) -> None:
+        """Keep the latest statistics of a document being ingested."""
+        with self._lock:
+            document = self.documents.get(key)
+            if document is not None and document["status"] == "ingesting":
+                document["statistics"] = stats
+
+    def refresh(self) -> None:
+        """Record the outcome of finished ingestions."""
+        with self._lock:
+            for key, future in list(self._futures.items()):
+                if not future.done():
+                    continue
+                document = self.documents.get(key)
+                if document is not None:
+                    try:
+                        result = future.result()
+                        document.update(
+                            hash=result["hash"],
+                            statistics=result["statistics"],
+                            pages=result["statistics"]["total_pages"],
+                            chapters=result["chapters"],
+                            status="ready"
+                        )
+                    except Exception as e:
+                        document.update(status="failed", error=str(e))
+                del self._futures[key]
+                self._cancel_events.pop(key, None)
+
+    def remove(self, key: str) -> None:
+        """Forget a document, stopping its ingestion if it is still in progress."""
+        with self._lock:
+            self.documents.pop(key, None)
+            if key in self._cancel_events:
+                self._cancel_events[key].set()
+
+    def clear(self) -> None:
+        """Forget all documents, stopping the ingestions in progress."""
+        with self._lock:
+            self.documents.clear()
+            for cancel_event in self._cancel_events.values():
+                cancel_event.set()
+
+    @property
+    def pending(self) -> int:
+        """Number of documents still being ingested."""
+        self.refresh()
+        return sum(document["status"] == "ingesting" for document in self.documents.values())
+
+    def ready_documents(self) -> List[Dict[str, Any]]:
+        """
+        Get the ingested documents in upload order.
+
+        Returns:
+            List of {"key", "name", "hash", "status", "statistics", "pages",
+            "chapters"} dictionaries
+        """
+        self.refresh()
+        return [document for document in self.documents.values() if document["status"] == "ready"]
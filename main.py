@@ -1,5 +1,230 @@
+"""
+Pre-generate summaries, quizzes and analytics questions for a library of PDFs.
+
+Summaries and analytics questions are stored in the generation cache, so the
+app serves them instantly. Quizzes fill the question bank of their text, from
+which the app samples quizzes without calling the model. Every item is also
+appended to a JSONL file; items already in the output file for the same
+provider and retrieval settings are skipped, so an interrupted run can simply
+be started again.
+
+The optional manifest maps PDF file names to named page ranges; files that
+are not listed are processed as a whole:
+
+    {
+        "biology.pdf": {"Chapter 1": "1-24", "Chapter 2": "25-51"},
+        "chemistry.pdf": {"Acids and bases": "40-62"}
+    }
+
+Usage:
+    python main.py library/ --manifest manifest.json --output pregenerated.jsonl --workers 8
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from components.cache import get_cache
+from components.document_store import get_document_store
+from components.generation import GENERATORS, build_generation_text, text_for
+from components.question_bank import BANK_BATCH_SIZE, get_question_bank, make_bank_key
+from components.scheduler import get_scheduler
+from components.text_compaction import compaction_stats
+
+
+def load_manifest(path: str) -> Dict[str, Dict[str, str]]:
+    """
+    Load the page ranges to generate content for.
+
+    Args:
+        path: Path of the JSON manifest, or an empty string for none
+
+    Returns:
+        Dictionary mapping PDF file name to {section name: page numbers}
+    """
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def plan_sections(library: str, manifest: Dict[str, Dict[str, str]]) -> List[Dict[str, Any]]:
+    """
+    Store the PDFs of a library and list the sections to generate content for.
+
+    Args:
+        library: Directory containing the PDF files
+        manifest: Page ranges per file from ``load_manifest``
+
+    Returns:
+        List of {"file", "doc_hash", "section", "pages"} dictionaries
+    """
+    store = get_document_store()
+    sections = []
+    for name in sorted(os.listdir(library)):
+        if not name.lower().endswith(".pdf"):
+            continue
+        with open(os.path.join(library, name), "rb") as f:
+            doc_hash = store.put_file(f)
+        ranges = manifest.get(name)
+        if not ranges:
+            doc = store.open(doc_hash)
+            ranges = {"Whole document": f"1-{len(doc)}"}
+            doc.close()
+        for section, pages in ranges.items():
+            sections.append({"file": name, "doc_hash": doc_hash, "section": section, "pages": pages})
+
+    missing = set(manifest) - {section["file"] for section in sections}
+    if missing:
+        raise Exception(f"Files listed in the manifest were not found in {library}: {', '.join(sorted(missing))}")
+    return sections
+
+
+def load_completed(path: str) -> Set[Tuple[str, str, str, str, Optional[int]]]:
+    """
+    Read the items already generated by a previous run.
+
+    Args:
+        path: Path of the JSONL output file
+
+    Returns:
+        Set of (document hash, page numbers, content type, provider,
+        retrieval top k) that succeeded
+    """
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash is generated again
+                continue
+            if "result" in record:
+                completed.add((
+                    record["doc_hash"], record["pages"], record["content_type"],
+                    record.get("provider"), record.get("retrieval_top_k")
+                ))
+    return completed
+
+
+def fill_question_bank(text: str, provider: str) -> Dict[str, Any]:
+    """
+    Fill the question bank of a text, as the app's first quiz would.
+
+    No quiz is sampled, so no questions are marked as served. A bank that
+    already holds a full batch is left as it is.
+
+    Args:
+        text: The text the questions are generated from
+        provider: The LLM provider to use ("auto", "openai" or "groq")
+
+    Returns:
+        Dictionary with the "bank_key", the number of questions "added" and
+        the "bank_size"
+    """
+    bank = get_question_bank()
+    bank_key = make_bank_key(text)
+    bank.register(bank_key, text, provider)
+    added = bank.fill_now(bank_key) if bank.size(bank_key) < BANK_BATCH_SIZE else 0
+    return {"bank_key": bank_key, "added": added, "bank_size": bank.size(bank_key)}
+
+
+def generate_item(section: Dict[str, Any], content_type: str, provider: str, retrieval_top_k: Any) -> Dict[str, Any]:
+    """
+    Generate one content type for one section.
+
+    Args:
+        section: A section from ``plan_sections``
+        content_type: Key of GENERATORS
+        provider: The LLM provider to use ("auto", "openai" or "groq")
+        retrieval_top_k: Passages sent for quizzes and analytics questions, or None
+
+    Returns:
+        The output record, with a "result" or an "error" key
+    """
+    record = {**section, "content_type": content_type, "provider": provider, "retrieval_top_k": retrieval_top_k}
+    start = time.perf_counter()
+    try:
+        text = build_generation_text(section["doc_hash"], section["pages"], retrieval_top_k)
+        if content_type == "quiz":
+            # Quizzes are sampled per user, so only their question bank is generated
+            record["result"] = fill_question_bank(text_for(text, content_type), provider)
+        else:
+            record["result"] = GENERATORS[content_type](text_for(text, content_type), provider)
+    except Exception as e:
+        record["error"] = str(e)
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    return record
+
+
 def main():
-    print("Hello from learnify!")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("library", help="Directory containing the PDF files")
+    parser.add_argument("--manifest", default="", help="JSON file with page ranges per PDF")
+    parser.add_argument("--output", default="pregenerated.jsonl", help="JSONL file the results are appended to")
+    parser.add_argument("--types", default=",".join(GENERATORS), help="Comma-separated content types to generate")
+    parser.add_argument("--provider", default="auto", choices=["auto", "openai", "groq"], help="LLM provider")
+    parser.add_argument("--workers", type=int, default=4, help="Number of concurrent generations")
+    parser.add_argument("--retrieval-top-k", type=int, default=None,
+                        help="Send only this many relevant passages for quizzes and analytics questions")
+    args = parser.parse_args()
+
+    content_types = [content_type.strip() for content_type in args.types.split(",") if content_type.strip()]
+    unknown = set(content_types) - set(GENERATORS)
+    if unknown:
+        parser.error(f"Unknown content types: {', '.join(sorted(unknown))}")
+
+    sections = plan_sections(args.library, load_manifest(args.manifest))
+    completed = load_completed(args.output)
+    items = [
+        (section, content_type)
+        for section in sections
+        for content_type in content_types
+        if (section["doc_hash"], section["pages"], content_type, args.provider, args.retrieval_top_k) not in completed
+    ]
+    total = len(sections) * len(content_types)
+    print(f"{len(sections)} sections in {len({section['file'] for section in sections})} files, "
+          f"{total - len(items)} of {total} items already generated")
+
+    cache = get_cache()
+    cache_before = cache.stats()
+    start = time.perf_counter()
+    done = failed = 0
+    with open(args.output, "a", encoding="utf-8") as output, \
+            ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(generate_item, section, content_type, args.provider, args.retrieval_top_k)
+            for section, content_type in items
+        ]
+        for future in as_completed(futures):
+            record = future.result()
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+
+            done += 1
+            status = "ok"
+            if "error" in record:
+                failed += 1
+                status = f"error: {record['error']}"
+            elapsed = time.perf_counter() - start
+            print(f"[{done}/{len(items)}] {record['file']} / {record['section']} / {record['content_type']} "
+                  f"({record['seconds']:.1f}s, {done / elapsed * 60:.1f} items/min) {status}")
+
+    elapsed = time.perf_counter() - start
+    cache_after = cache.stats()
+    scheduler_metrics = get_scheduler().metrics()
+    print(f"Generated {done - failed} items, {failed} failed, in {elapsed:.1f}s "
+          f"({(done / elapsed * 60) if elapsed else 0:.1f} items/min)")
+    print(f"Cache hits: {cache_after['hits'] - cache_before['hits']}, "
+          f"LLM calls: {scheduler_metrics['admitted']}, retries: {scheduler_metrics['retries']}, "
+          f"p95 queue wait: {scheduler_metrics['wait_p95']:.1f}s")
+    compaction = compaction_stats()
+    print(f"Prompt tokens saved by compaction: {compaction['tokens_saved']} of "
+          f"{compaction['extracted_tokens']} ({compaction['saved_ratio']:.1%})")
 
 
 if __name__ == "__main__":
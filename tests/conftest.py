@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Keep caches and traces of the tests out of the working directory
+os.environ.setdefault("LEARNIFY_CACHE_DIR", tempfile.mkdtemp(prefix="learnify-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_model():
+    """Route every LLM call to one fake chat model, returning it and the prompts it was sent."""
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain_core.runnables import RunnableLambda
+
+    from components import router as router_module
+    from components.router import ProviderRouter, set_router
+    from components.scheduler import LLMScheduler
+
+    previous = router_module._router
+    model = FakeListChatModel(responses=[])
+    prompts = []
+
+    def send(prompt_value):
+        prompts.append(prompt_value)
+        return model.invoke(prompt_value)
+
+    set_router(ProviderRouter(
+        providers=["openai"], llm_factory=lambda provider, model_name=None, **llm_kwargs: RunnableLambda(send),
+        hedge_delay=None, scheduler=LLMScheduler(limits={})
+    ))
+    yield model, prompts
+    set_router(previous)
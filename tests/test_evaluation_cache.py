@@ -0,0 +1,57 @@
+from components.evaluation_cache import EvaluationCache, SimilarityIndex, normalize_answer
+
+QUESTION = "question"
+CORRECT = (
+    "The sample mean is an unbiased estimator of the population mean and its variance "
+    "shrinks as the sample size grows, so larger samples give more precise estimates of the mean."
+)
+NEGATED = (
+    "The sample mean is not an unbiased estimator of the population mean and its variance "
+    "shrinks as the sample size grows, so larger samples give more precise estimates of the mean."
+)
+FLIPPED = (
+    "The sample mean is a biased estimator of the population mean and its variance "
+    "grows as the sample size grows, so larger samples give more precise estimates of the mean."
+)
+
+
+def make_index():
+    index = SimilarityIndex()
+    index.add(QUESTION, "correct", normalize_answer(CORRECT))
+    return index
+
+
+def test_negated_answer_does_not_match():
+    assert make_index().find(QUESTION, normalize_answer(NEGATED), 0.9) is None
+
+
+def test_flipped_answer_does_not_match():
+    assert make_index().find(QUESTION, normalize_answer(FLIPPED), 0.9) is None
+
+
+def test_answer_differing_in_filler_words_matches():
+    rephrased = "I think " + CORRECT.replace("so larger", "so then larger").upper()
+    match = make_index().find(QUESTION, normalize_answer(rephrased), 0.9)
+
+    assert match is not None and match[0] == "correct"
+
+
+def test_cache_reuses_near_identical_answers_above_the_default_threshold(tmp_path):
+    cache = EvaluationCache(str(tmp_path / "evaluations.sqlite3"))
+    cache.store(QUESTION, CORRECT, {"score": 95, "feedback": "Correct"})
+
+    reused = cache.lookup(QUESTION, CORRECT.upper() + "!")
+    assert reused["score"] == 95 and reused["cached"] and reused["similarity"] == 1.0
+    reused = cache.lookup(QUESTION, "I think " + CORRECT)
+    assert reused["score"] == 95 and 0.95 <= reused["similarity"] < 1.0
+
+
+def test_cache_evaluates_answers_below_the_default_threshold(tmp_path):
+    cache = EvaluationCache(str(tmp_path / "evaluations.sqlite3"))
+    cache.store(QUESTION, CORRECT, {"score": 95, "feedback": "Correct"})
+
+    # Only filler words differ, but too many of them for the threshold
+    assert cache.lookup(QUESTION, "Basically, I think that " + CORRECT.replace("The sample", "this sample")) is None
+    assert cache.lookup(QUESTION, NEGATED) is None
+    assert cache.lookup(QUESTION, CORRECT, threshold=1.0)["similarity"] == 1.0
+    assert cache.lookup(QUESTION, "I think " + CORRECT, threshold=1.0) is None
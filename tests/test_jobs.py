@@ -0,0 +1,68 @@
+import threading
+import time
+
+from components.jobs import JobQueue
+
+
+def make_queue(tmp_path, jobs=0):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    job_ids = []
+    for i in range(jobs):
+        job_ids.append(queue.submit("hash", f"{i + 1}", ["summary"]))
+        time.sleep(0.001)
+    return queue, job_ids
+
+
+def test_claim_takes_the_oldest_queued_job(tmp_path):
+    queue, job_ids = make_queue(tmp_path, jobs=2)
+
+    first = queue.claim("worker")
+    assert first["id"] == job_ids[0]
+    assert (first["status"], first["worker"]) == ("running", "worker")
+    assert queue.claim("worker")["id"] == job_ids[1]
+    assert queue.claim("worker") is None
+
+
+def test_concurrent_workers_never_claim_the_same_job(tmp_path):
+    queue, job_ids = make_queue(tmp_path, jobs=20)
+    claimed = []
+
+    def work(worker_id):
+        while True:
+            job = queue.claim(worker_id)
+            if job is None:
+                return
+            claimed.append(job["id"])
+
+    workers = [threading.Thread(target=work, args=(f"worker-{i}",)) for i in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+
+    assert sorted(claimed) == sorted(job_ids)
+
+
+def test_only_jobs_of_workers_without_heartbeats_are_requeued(tmp_path):
+    queue, job_ids = make_queue(tmp_path, jobs=2)
+    queue.heartbeat("live")
+    queue.claim("live")
+    queue.claim("crashed")
+
+    assert queue.requeue_stale() == 1
+    assert queue.get(job_ids[0])["status"] == "running"
+    requeued = queue.get(job_ids[1])
+    assert (requeued["status"], requeued["worker"]) == ("queued", None)
+    assert queue.claim("live")["id"] == job_ids[1]
+
+
+def test_results_and_errors_are_stored_per_content_type(tmp_path):
+    queue, (job_id,) = make_queue(tmp_path, jobs=1)
+    queue.store_result(job_id, "summary", {"content": "A summary"})
+    queue.store_result(job_id, "quiz", error="Error generating quiz")
+    queue.finish(job_id)
+
+    job = queue.get(job_id)
+    assert job["status"] == "done"
+    assert job["results"] == {"summary": {"content": "A summary"}}
+    assert job["errors"] == {"quiz": "Error generating quiz"}
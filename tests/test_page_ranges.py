@@ -0,0 +1,60 @@
+import pytest
+
+from components.page_ranges import PageRangeSpec, toc_ranges
+
+
+def test_parse_merges_and_sorts_ranges():
+    spec = PageRangeSpec.parse(" 8, 1-3 ,2-5, 7")
+
+    assert spec.intervals == [(1, 5), (7, 8)]
+    assert list(spec) == [1, 2, 3, 4, 5, 7, 8]
+    assert str(spec) == "1-5,7-8"
+
+
+def test_describe_lists_the_pages_for_display():
+    assert PageRangeSpec.parse("3").describe() == "page 3"
+    assert PageRangeSpec.parse("1-5").describe() == "pages 1-5"
+    assert PageRangeSpec.parse("8, 1-5, 10-").describe() == "pages 1-5, 8 and 10-"
+    assert repr(PageRangeSpec.parse("1-5")) == "PageRangeSpec('1-5')"
+
+
+def test_reversed_and_open_ranges():
+    assert PageRangeSpec.parse("5-3").intervals == [(3, 5)]
+    assert PageRangeSpec.parse("-4").intervals == [(1, 4)]
+    assert PageRangeSpec.parse("10-").intervals == [(10, None)]
+
+
+def test_huge_range_is_never_expanded():
+    spec = PageRangeSpec.parse("1-10000000")
+
+    assert len(spec) == 10000000
+    assert 9999999 in spec
+    assert list(spec.clip(3)) == [1, 2, 3]
+
+
+def test_clip_closes_open_ranges_and_drops_pages_past_the_end():
+    spec = PageRangeSpec.parse("2, 10-, 50-60").clip(20)
+
+    assert spec.intervals == [(2, 2), (10, 20)]
+    assert not PageRangeSpec.parse("30-").clip(20)
+
+
+def test_open_range_must_be_clipped_before_iterating():
+    with pytest.raises(ValueError):
+        list(PageRangeSpec.parse("3-"))
+
+
+@pytest.mark.parametrize("spec", ["", "0", "-0", "a-b", "1,,x", "1.5"])
+def test_invalid_specs_are_rejected(spec):
+    with pytest.raises(ValueError):
+        PageRangeSpec.parse(spec)
+
+
+def test_named_ranges_from_the_table_of_contents():
+    toc = [[1, "Introduction", 1], [1, "Chapter 1", 4], [2, "Section 1.1", 5], [1, "Chapter 2", 9]]
+    named_ranges = toc_ranges(toc, 12)
+
+    assert named_ranges == {
+        "Introduction": (1, 3), "Chapter 1": (4, 8), "Section 1.1": (5, 8), "Chapter 2": (9, 12)
+    }
+    assert PageRangeSpec.parse("chapter 1, 12", named_ranges).intervals == [(4, 8), (12, 12)]
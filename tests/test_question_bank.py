@@ -0,0 +1,71 @@
+import json
+
+from components import question_bank as question_bank_module
+from components.question_bank import BANK_BATCH_SIZE, QuestionBank, make_bank_key, sample_quiz
+from components.scheduler import use_session
+
+TEXT = "--- Page 1 ---\nThe mitochondria is the powerhouse of the cell."
+
+
+def make_questions(count, difficulty="medium"):
+    return [
+        {
+            "question": f"Question {i} about {difficulty} cells?",
+            "options": ["A. one", "B. two", "C. three", "D. four"],
+            "correct_answer": "A",
+            "difficulty": difficulty,
+            "page": 1
+        }
+        for i in range(count)
+    ]
+
+
+def question_texts(quiz):
+    return {question["question"] for question in quiz["content"]["questions"]}
+
+
+def test_sampled_questions_never_repeat_for_a_user(tmp_path):
+    bank = QuestionBank(str(tmp_path / "bank.sqlite3"))
+    bank.add("bank", make_questions(6))
+
+    first = bank.sample("bank", "student", 3)
+    second = bank.sample("bank", "student", 3)
+
+    assert len({q["question"] for q in first + second}) == 6
+    assert bank.sample("bank", "student", 3) == []
+    assert bank.remaining("bank", "student") == 0
+    assert len(bank.sample("bank", "classmate", 6)) == 6
+
+
+def test_sample_filters_by_difficulty(tmp_path):
+    bank = QuestionBank(str(tmp_path / "bank.sqlite3"))
+    bank.add("bank", make_questions(3, "easy") + make_questions(3, "hard"))
+
+    assert {q["difficulty"] for q in bank.sample("bank", "student", 3, "hard")} == {"hard"}
+
+
+def test_repeated_questions_are_not_added_again(tmp_path):
+    bank = QuestionBank(str(tmp_path / "bank.sqlite3"))
+    assert bank.add("bank", make_questions(3)) == 3
+
+    repeated = [{**question, "question": question["question"].upper()} for question in make_questions(3)]
+    assert bank.add("bank", repeated) == 0
+    assert bank.size("bank") == 3
+
+
+def test_quizzes_are_sampled_from_one_generated_batch(tmp_path, monkeypatch, fake_model):
+    monkeypatch.setattr(question_bank_module, "_bank", QuestionBank(str(tmp_path / "bank.sqlite3")))
+    model, prompts = fake_model
+    model.responses = [json.dumps({"questions": make_questions(BANK_BATCH_SIZE)})]
+
+    with use_session("student"):
+        first = sample_quiz(TEXT)
+        second = sample_quiz(TEXT)
+    with use_session("classmate"):
+        other = sample_quiz(TEXT)
+
+    assert len(prompts) == 1
+    assert not question_texts(first) & question_texts(second)
+    assert len(question_texts(other)) == 3
+    assert second["metadata"]["bank_key"] == make_bank_key(TEXT)
+    assert second["metadata"]["cached"]
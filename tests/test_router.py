@@ -0,0 +1,112 @@
+import time
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+from components.router import ProviderRouter, ProviderStats
+from components.scheduler import LLMScheduler
+
+PROMPT = ChatPromptTemplate.from_messages([HumanMessage(content="question")])
+
+
+def failing(error):
+    def fail(_):
+        raise error
+    return RunnableLambda(fail)
+
+
+def make_router(models, **kwargs):
+    """Router over fake models keyed by provider, without rate limits."""
+    return ProviderRouter(
+        providers=list(models),
+        llm_factory=lambda provider, model=None, **llm_kwargs: models[provider],
+        scheduler=LLMScheduler(limits={}),
+        **kwargs
+    )
+
+
+def test_retriable_error_fails_over_to_the_next_provider():
+    router = make_router({
+        "openai": failing(TimeoutError("read timed out")),
+        "groq": FakeListChatModel(responses=["from groq"]),
+    }, hedge_delay=None)
+
+    response, provider = router.invoke(PROMPT, "openai")
+
+    assert (response.content, provider) == ("from groq", "groq")
+    assert router.snapshot()["openai"]["failures"] == 1
+
+
+def test_other_errors_are_raised_without_failover():
+    router = make_router({
+        "openai": failing(ValueError("bad request")),
+        "groq": FakeListChatModel(responses=["from groq"]),
+    }, hedge_delay=None)
+
+    with pytest.raises(ValueError):
+        router.invoke(PROMPT, "openai")
+    assert router.snapshot()["groq"]["requests"] == 0
+
+
+def test_slow_provider_is_hedged_on_the_next_one():
+    router = make_router({
+        "openai": FakeListChatModel(responses=["from openai"], sleep=2.0),
+        "groq": FakeListChatModel(responses=["from groq"]),
+    }, hedge_delay=0.05)
+
+    start = time.monotonic()
+    response, provider = router.invoke(PROMPT, "openai")
+
+    assert (response.content, provider) == ("from groq", "groq")
+    assert time.monotonic() - start < 1.0
+
+
+def test_timed_out_provider_is_recorded_as_failed():
+    router = make_router({
+        "openai": FakeListChatModel(responses=["from openai"], sleep=1.0),
+        "groq": FakeListChatModel(responses=["from groq"]),
+    }, hedge_delay=None, timeout=0.1)
+
+    response, provider = router.invoke(PROMPT, "openai")
+
+    assert provider == "groq"
+    assert router.snapshot()["openai"]["failures"] == 1
+
+
+def test_latency_is_an_exponentially_weighted_average():
+    stats = ProviderStats(alpha=0.2)
+    stats.record(1.0, True)
+    stats.record(2.0, True)
+
+    assert stats.latency == pytest.approx(1.2)
+    assert stats.error_rate == 0.0
+
+
+def test_auto_ranks_the_fastest_provider_first():
+    router = make_router({"openai": None, "groq": None})
+    router.record("openai", 5.0, True)
+    router.record("groq", 1.0, True)
+
+    assert router.rank("auto") == ["groq", "openai"]
+    assert router.rank("openai") == ["openai", "groq"]
+
+
+def test_failing_provider_drops_behind_a_slower_one():
+    router = make_router({"openai": None, "groq": None})
+    router.record("openai", 2.0, True)
+    router.record("groq", 1.0, True)
+    assert router.rank("auto")[0] == "groq"
+
+    for _ in range(5):
+        router.record("groq", 1.0, False)
+
+    assert router.rank("auto") == ["openai", "groq"]
+
+
+def test_unconfigured_provider_falls_through_to_the_others():
+    router = make_router({"openai": None})
+
+    assert router.rank("groq") == ["openai"]
@@ -0,0 +1,94 @@
+import threading
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+from components import scheduler as scheduler_module
+from components.scheduler import LLMScheduler, SlidingWindowBudget
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def test_requests_per_minute_window():
+    budget = SlidingWindowBudget(rpm=2, tpm=1000)
+    budget.admit(10, now=0.0)
+    budget.admit(10, now=1.0)
+
+    assert budget.wait_time(10, now=2.0) == pytest.approx(58.0)
+    assert budget.wait_time(10, now=60.0) == 0.0
+
+
+def test_tokens_per_minute_window():
+    budget = SlidingWindowBudget(rpm=100, tpm=100)
+    budget.admit(60, now=0.0)
+    budget.admit(30, now=10.0)
+
+    assert budget.wait_time(10, now=20.0) == 0.0
+    assert budget.wait_time(50, now=20.0) == pytest.approx(40.0)
+    # Larger than the whole budget: admitted once the window is empty
+    assert budget.wait_time(500, now=20.0) == pytest.approx(50.0)
+
+
+def test_sessions_are_admitted_round_robin(monkeypatch):
+    monkeypatch.setattr(scheduler_module, "WINDOW_SECONDS", 0.1)
+    scheduler = LLMScheduler(limits={"openai": {"rpm": 1, "tpm": 10 ** 6}})
+    scheduler.acquire("openai", 1, "busy")
+    admitted = []
+
+    def call(session_id, name):
+        scheduler.acquire("openai", 1, session_id)
+        admitted.append(name)
+
+    threads = []
+    for session_id, name in [("busy", "busy 1"), ("busy", "busy 2"), ("busy", "busy 3"), ("other", "other")]:
+        thread = threading.Thread(target=call, args=(session_id, name))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert admitted == ["busy 1", "other", "busy 2", "busy 3"]
+
+
+def test_cancel_withdraws_a_queued_call():
+    scheduler = LLMScheduler(limits={"openai": {"rpm": 1, "tpm": 10 ** 6}})
+    scheduler.acquire("openai", 1, "session")
+    cancelled = threading.Event()
+    outcome = []
+
+    def call():
+        try:
+            scheduler.acquire("openai", 1, "session", cancelled)
+            outcome.append("admitted")
+        except CancelledError:
+            outcome.append("cancelled")
+
+    thread = threading.Thread(target=call)
+    thread.start()
+    time.sleep(0.05)
+    assert scheduler.metrics()["queue_depth"] == {"openai": 1}
+
+    scheduler.cancel(cancelled)
+    thread.join(timeout=5)
+
+    assert outcome == ["cancelled"]
+    assert scheduler.metrics()["queue_depth"] == {"openai": 0}
+    assert scheduler.metrics()["admitted"] == 1
+
+
+def test_rate_limited_calls_are_retried():
+    scheduler = LLMScheduler(limits={}, base_backoff=0.01)
+    calls = []
+
+    def call():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise RateLimitError("slow down")
+        return "done"
+
+    assert scheduler.run("openai", call, 1, "session") == "done"
+    assert scheduler.metrics()["retries"] == 1
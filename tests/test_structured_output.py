@@ -0,0 +1,73 @@
+import json
+
+import pytest
+from langchain_core.messages import HumanMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+from components.structured_output import StructuredOutputError, invoke_structured, parse_structured
+
+SCHEMA = {
+    "type": "object",
+    "required": ["questions"],
+    "properties": {
+        "questions": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["question", "correct_answer"],
+                "properties": {
+                    "question": {"type": "string"},
+                    "correct_answer": {"type": "string", "enum": ["A", "B", "C", "D"]}
+                }
+            }
+        }
+    }
+}
+VALID = {"questions": [{"question": "What is 2 + 2?", "correct_answer": "B"}]}
+PROMPT = ChatPromptTemplate.from_messages([HumanMessage(content="Create a quiz")])
+
+
+def test_valid_output_is_parsed():
+    assert parse_structured(json.dumps(VALID), SCHEMA) == VALID
+
+
+def test_fences_trailing_commas_and_smart_quotes_are_repaired_locally():
+    text = '```json\n{“questions”: [{"question": "What is 2 + 2?", "correct_answer": "B",},],}\n```'
+
+    assert parse_structured(text, SCHEMA) == VALID
+
+
+def test_schema_violations_are_reported():
+    invalid = {"questions": [{"question": "What is 2 + 2?", "correct_answer": "E"}]}
+
+    with pytest.raises(StructuredOutputError):
+        parse_structured(json.dumps(invalid), SCHEMA)
+    with pytest.raises(StructuredOutputError):
+        parse_structured("no JSON here", SCHEMA)
+
+
+def test_locally_repaired_output_needs_no_second_call(fake_model):
+    model, prompts = fake_model
+    model.responses = ["Here is the quiz: " + json.dumps(VALID) + " Good luck!"]
+
+    assert invoke_structured(PROMPT, SCHEMA, "openai") == (VALID, "openai")
+    assert len(prompts) == 1
+
+
+def test_model_is_asked_once_to_fix_invalid_output(fake_model):
+    model, prompts = fake_model
+    model.responses = ['{"questions": [{"question": "What is 2 + 2?"}]}', json.dumps(VALID)]
+
+    assert invoke_structured(PROMPT, SCHEMA, "openai") == (VALID, "openai")
+    assert len(prompts) == 2
+    repair_request = prompts[1].to_messages()[-1].content
+    assert "correct_answer" in repair_request and "What is 2 + 2?" in repair_request
+
+
+def test_invalid_repair_is_raised(fake_model):
+    model, _ = fake_model
+    model.responses = ["not JSON", "still not JSON"]
+
+    with pytest.raises(StructuredOutputError):
+        invoke_structured(PROMPT, SCHEMA, "openai")
@@ -0,0 +1,68 @@
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessageChunk
+from langchain_core.runnables import RunnableLambda
+
+from components import router as router_module
+from components import summarizer
+from components.router import ProviderRouter, set_router
+from components.scheduler import LLMScheduler
+from components.summarizer import stream_summary
+
+
+def failing(error):
+    def fail(_):
+        raise error
+    return RunnableLambda(fail)
+
+
+@pytest.fixture
+def providers():
+    """Route summaries to fake models keyed by provider."""
+    previous = router_module._router
+    models = {}
+    set_router(ProviderRouter(
+        providers=["openai", "groq"], llm_factory=lambda provider, model=None, **llm_kwargs: models[provider],
+        hedge_delay=None, scheduler=LLMScheduler(limits={})
+    ))
+    yield models
+    set_router(previous)
+
+
+def test_stream_fails_over_before_the_first_token(providers):
+    providers["openai"] = failing(TimeoutError("connect timed out"))
+    providers["groq"] = FakeListChatModel(responses=["Cells make energy."])
+    result = {}
+
+    streamed = "".join(stream_summary("Text about cells, streamed after a failover.", "openai", result))
+
+    assert streamed == result["content"] == "Cells make energy."
+    assert result["metadata"]["provider"] == "groq"
+    assert router_module.get_router().snapshot()["openai"]["failures"] == 1
+
+
+def test_stream_error_after_the_first_token_is_raised(providers):
+    def stream_then_fail(_):
+        yield AIMessageChunk(content="Cells")
+        raise TimeoutError("read timed out")
+
+    providers["openai"] = RunnableLambda(stream_then_fail)
+    providers["groq"] = FakeListChatModel(responses=["Cells make energy."])
+
+    with pytest.raises(Exception, match="read timed out"):
+        list(stream_summary("Text about cells, failing while streamed.", "openai"))
+
+
+def test_large_text_is_announced_before_it_is_collapsed(providers, monkeypatch):
+    monkeypatch.setattr(summarizer, "MAP_REDUCE_THRESHOLD_TOKENS", 10)
+    collapsed = []
+    monkeypatch.setattr(summarizer, "collapse_text", lambda text, **kwargs: collapsed.append(text) or "Partials")
+    providers["openai"] = FakeListChatModel(responses=["Summary."])
+    result = {}
+
+    stream = stream_summary("A long text about cells " * 20, "openai", result)
+    status = next(stream)
+
+    assert "section by section" in status and not collapsed
+    assert "".join(stream) == "Summary."
+    assert result["content"] == "Summary."
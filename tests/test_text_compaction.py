@@ -0,0 +1,45 @@
+from components.text_compaction import compact_text, split_pages
+
+
+def make_text(pages):
+    return "".join(f"\n\n--- Page {i + 1} ---\n" + "\n".join(lines) + "\n" for i, lines in enumerate(pages)).strip()
+
+
+def test_short_pages_keep_all_lines():
+    # Slide-like pages whose lines differ only in their numbers
+    pages = [
+        [f"Slide {i}", f"The mean of sample {i} is {40 + i}.", f"The variance is {i}.{i}",
+         f"Sample size {10 * i}", f"Result {i}", f"See figure {i}"]
+        for i in range(1, 9)
+    ]
+    result = compact_text(make_text(pages))
+
+    assert result["removed_lines"] == 0
+    compacted = split_pages(result["text"])
+    assert len(compacted) == 8
+    assert all(page_text.strip().split("\n") == lines for (_, page_text), lines in zip(compacted, pages))
+
+
+def test_running_header_and_footer_are_removed():
+    pages = [
+        ["Statistics Handbook", f"Chapter {i}"] + [f"Body line {j} about topic {3 * i + j}." for j in range(6)]
+        + ["Confidential", f"Page {i}"]
+        for i in range(1, 9)
+    ]
+    result = compact_text(make_text(pages))
+    text = result["text"]
+
+    assert "Statistics Handbook" not in text
+    assert "Confidential" not in text
+    assert "Body line 0 about topic 3." in text
+    assert all(page_text.strip() for _, page_text in split_pages(text))
+
+
+def test_header_text_in_body_position_is_kept():
+    # A line repeated at the top of pages is not a footer at the bottom of another
+    pages = [["Summary", "Intro"] + [f"Line {j} of page {i}." for j in range(6)] for i in range(1, 5)]
+    pages.append([f"Line {j} of the last page." for j in range(6)] + ["Intro", "Summary"])
+    result = compact_text(make_text(pages))
+
+    last_page = split_pages(result["text"])[-1][1]
+    assert last_page.strip().split("\n")[-2:] == ["Intro", "Summary"]